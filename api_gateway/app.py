@@ -1,87 +1,92 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
-from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+import itertools
 import time
-from datetime import datetime
-from zoneinfo import ZoneInfo
+from datetime import datetime, timezone
 import os
-import jwt
+import signal
+import sys
 import requests
 
-# Importar logger y función para guardar en Mongo
-from logger import logger, log_to_mongo
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+from common.ratelimit import create_limiter
+from common.server import register_health, run
+from common import metrics
+# Importar logger (archivo de log) y función para guardar en Mongo
+from logger import log_access, log_to_mongo, log_shipper, log_writer
+from upstream import UpstreamClient, SERVER_TIMING, server_timing
+from resilience import CircuitOpenError
+from auth_context import TokenVerifier, GATEWAY_HEADERS, extract_token
+from response_cache import ResponseCache
+from registry import Service, RouteTrie
+from routes import DEFAULT_LIMITS, SERVICES, ROUTES
+
+# Cursor de paginación de los servicios: se reenvía sin cambios y se expone al navegador
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=[NEXT_CURSOR_HEADER])
 
 SECRET_KEY = os.getenv('SECRET_KEY')
 
+# ===== Verificación única del JWT por petición =====
+token_verifier = TokenVerifier(SECRET_KEY)
+
+def get_jwt_claims():
+    """Claims del JWT de la petición actual; se verifica una sola vez y se guarda en g"""
+    if '_jwt_checked' not in g:
+        g._jwt_checked = True
+        g.jwt_claims = token_verifier.verify(extract_token(request.headers))
+    return g.jwt_claims
+
 # ====== Configuración de Rate Limiter ======
 def get_user_or_ip():
     """Usar username del JWT o la IP del cliente"""
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if token:
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            return payload.get('username', get_remote_address())
-        except jwt.PyJWTError:
-            return get_remote_address()
+    claims = get_jwt_claims()
+    if claims:
+        return claims.get('username', get_remote_address())
     return get_remote_address()
 
-limiter = Limiter(
+# Contadores compartidos entre workers (RATELIMIT_STORAGE_URI, ver common/ratelimit.py)
+limiter = create_limiter(
+    app,
     get_user_or_ip,  # clave para el rate limit
-    app=app,
-    default_limits=["100 per minute"]  # Límite por defecto
+    default_limits=DEFAULT_LIMITS,  # Límite por defecto
+    key_prefix='api-gateway'
 )
+# Métricas Prometheus en /metrics y profiler en /debug/profile
+metrics.init_app(app, 'api-gateway', limiter)
 
 # ===== Middleware de Logging =====
 @app.before_request
 def start_timer():
-    request.start_time = time.time()
+    request.start_time = time.perf_counter()
 
 @app.before_request
 def extract_user_from_jwt():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    user = 'anonymous'
-    if token:
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            user = payload.get('username', 'anonymous')
-        except jwt.PyJWTError:
-            user = 'anonymous'
+    claims = get_jwt_claims()
+    user = claims.get('username', 'anonymous') if claims else 'anonymous'
     request.headers.environ['HTTP_X_USER'] = user
 
 @app.after_request
 def log_request(response):
-    duration = time.time() - request.start_time
-    duration_ms = int(duration * 1000)
-
-    timestamp = datetime.now(
-        ZoneInfo("America/Mexico_City")).strftime('%Y-%m-%d %H:%M:%S')
+    # Fecha nativa en UTC (índices, TTL y orden correcto) y duración con precisión de µs
+    duration_ms = round((time.perf_counter() - request.start_time) * 1000, 3)
+    timestamp = datetime.now(timezone.utc)
     method = request.method
     path = request.path
     status = response.status_code
 
-    if path.startswith('/auth'):
-        service = 'auth-service'
-    elif path.startswith('/user'):
-        service = 'user-service'
-    elif path.startswith('/tasks'):
-        service = 'task-service'
-    elif path.startswith('/logs'):
-        service = 'logs-service'
-    else:
-        service = 'unknown'
+    route = route_trie.match(path)
+    service = route['service'] if route else 'unknown'
 
     user = request.headers.get('X-User', 'anonymous')
 
-    log_msg = (
-        f"{timestamp} | {method} {path} | "
-        f"Service: {service} | User: {user} | "
-        f"Status: {status} | Duration: {duration_ms}ms"
-    )
-    logger.info(log_msg)
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = server_timing(duration_ms, g.get('upstream_ms'))
 
     log_document = {
         "timestamp": timestamp,
@@ -92,77 +97,262 @@ def log_request(response):
         "status": status,
         "duration_ms": duration_ms
     }
+    log_access(log_document)
     log_to_mongo(log_document)
 
     return response
 
-# ===== URLs de microservicios =====
-AUTH_SERVICE_URL = 'http://localhost:5001'
-USER_SERVICE_URL = 'http://localhost:5002'
-TASK_SERVICE_URL = 'http://localhost:5003'
-LOGS_SERVICE_URL = 'http://localhost:5004'
+# ===== Registro de servicios y clientes upstream con pool keep-alive =====
+# Instancias y balanceador por servicio desde gateway.json (ver routes.py)
+upstream_clients = {
+    name: UpstreamClient(Service(name, spec['instances'], spec['balancer']))
+    for name, spec in SERVICES.items()
+}
+UPSTREAM_CLIENTS = list(upstream_clients.values())
+# Prefijo -> ruta; se resuelve por segmentos, sin recorrer toda la tabla
+route_trie = RouteTrie(ROUTES)
+
+# Cabeceras hop-by-hop que no deben reenviarse entre conexiones
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade'
+}
+
+# ===== Modo de proxy =====
+# stream: reenvía status, cabeceras y cuerpo por bloques sin decodificarlos
+# json: comportamiento anterior (parsear y volver a serializar el JSON)
+PROXY_MODE = os.getenv('GATEWAY_PROXY_MODE', 'stream').lower()
+STREAM_CHUNK_SIZE = int(os.getenv('GATEWAY_STREAM_CHUNK_SIZE', '65536'))
 
 def filter_headers(headers):
-    return {key: value for key, value in headers.items() if key.lower() != 'host'}
+    # Las cabeceras de identidad del gateway solo las puede poner el propio gateway
+    return {key: value for key, value in headers.items()
+            if key.lower() != 'host' and key.lower() not in HOP_BY_HOP_HEADERS
+            and key.lower() not in GATEWAY_HEADERS}
 
-# ===== Rutas proxy con rate limit personalizado =====
+def filter_response_headers(headers):
+    # Date y Server los pone el propio servidor del gateway
+    return [(key, value) for key, value in headers.items()
+            if key.lower() not in HOP_BY_HOP_HEADERS and key.lower() not in ('date', 'server')]
 
-@app.route('/auth/<path:path>', methods=['POST'])
-@limiter.limit("10 per minute")  # Solo 10 solicitudes por minuto a /auth
-def auth_proxy(path):
-    url = f"{AUTH_SERVICE_URL}/{path}"
-    headers = filter_headers(request.headers)
-    resp = requests.post(
-        url,
-        json=request.get_json(silent=True),
-        headers=headers
-    )
-    return jsonify(resp.json()), resp.status_code
+def proxy_response(resp, rewrite_json=None, chunks=None):
+    """Devuelve la respuesta upstream al cliente.
+
+    Por defecto el cuerpo se transmite tal cual (sin decodificar ni descomprimir).
+    Solo se parsea el JSON si la ruta pasa ``rewrite_json`` o el modo es 'json'.
+    ``chunks`` es el cuerpo ya empezado a leer (iterador de bloques), si lo hay.
+    """
+    if (rewrite_json is not None or PROXY_MODE == 'json') and chunks is None:
+        try:
+            data = resp.json()
+        except ValueError:
+            # El servicio no devolvió JSON (p. ej. una página de error): se reenvía tal cual
+            return Response(resp.content, status=resp.status_code,
+                            content_type=resp.headers.get('Content-Type'))
+        finally:
+            resp.close()
+        if rewrite_json is not None:
+            data = rewrite_json(data)
+        response = jsonify(data)
+        response.status_code = resp.status_code
+        if NEXT_CURSOR_HEADER in resp.headers:
+            response.headers[NEXT_CURSOR_HEADER] = resp.headers[NEXT_CURSOR_HEADER]
+        return response
+
+    def generate():
+        completed = False
+        try:
+            for chunk in chunks if chunks is not None else resp.raw.stream(STREAM_CHUNK_SIZE, decode_content=False):
+                yield chunk
+            completed = True
+        finally:
+            if completed:
+                # Cuerpo leído completo: la conexión vuelve al pool
+                resp.raw.release_conn()
+            else:
+                resp.close()
+
+    return Response(generate(), status=resp.status_code,
+                    headers=filter_response_headers(resp.raw.headers))
+
+# ===== Caché de respuestas GET =====
+response_cache = ResponseCache()
+
+def cache_identity():
+    """user_id del JWT ('' sin token); None si el token no lo trae y no se puede cachear"""
+    claims = get_jwt_claims()
+    if not claims:
+        return ''
+    user_id = claims.get('user_id')
+    return str(user_id) if user_id is not None else None
+
+def cache_key(identity):
+    """Identidad + ruta + query normalizada: un usuario nunca ve respuestas de otro"""
+    query = '&'.join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    return (identity, request.path, query)
+
+def cache_namespace(service, scope, identity):
+    """Namespace que invalida una escritura: todo el servicio o solo los datos del usuario"""
+    if scope != 'user':
+        return service
+    # Datos de cada usuario: una escritura solo invalida las copias de quien la hace
+    return f"{service}/user/{identity}" if identity else None
+
+def is_cacheable(resp):
+    cache_control = resp.headers.get('Cache-Control', '').lower()
+    return resp.status_code == 200 and 'no-store' not in cache_control and 'private' not in cache_control
+
+def cached_response(entry, cache_status):
+    """Respuesta desde la caché; 304 si el cliente ya tiene esa versión"""
+    if request.if_none_match.contains(entry.etag.strip('"')):
+        response_cache.count_not_modified()
+        response = Response(status=304)
+    else:
+        response = Response(entry.body, status=entry.status, headers=entry.headers)
+    response.headers['ETag'] = entry.etag
+    response.headers['X-Cache'] = cache_status
+    return response
+
+def forward(client, upstream_path, rewrite_json=None, cache_ttl=0, cache_service=None, cache_scope='shared',
+            invalidates=()):
+    """Reenvía la petición actual (método, query, cabeceras y cuerpo) al servicio.
+
+    Con ``cache_ttl`` los GET se sirven desde la caché de respuestas; cualquier
+    otro método invalida las entradas de su namespace (``cache_namespace``) y,
+    si tiene éxito, las de los servicios de ``invalidates``.
+    """
+    is_write = request.method not in ('GET', 'HEAD', 'OPTIONS')
+    identity = cache_identity() if cache_service else None
+    namespace = cache_namespace(cache_service, cache_scope, identity) if cache_service else None
+    cacheable = (cache_ttl > 0 and request.method == 'GET' and rewrite_json is None
+                 and response_cache.enabled and identity is not None and namespace is not None)
+    if cacheable:
+        key = cache_key(identity)
+        if 'no-cache' not in request.headers.get('Cache-Control', ''):
+            entry = response_cache.get(key)
+            if entry is not None:
+                return cached_response(entry, 'HIT')
+        generation = response_cache.generation(namespace)
 
-@app.route('/user/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
-@limiter.limit("50 per minute")  # 50 solicitudes/min para /user
-def user_proxy(path):
-    url = f"{USER_SERVICE_URL}/{path}"
-    headers = filter_headers(request.headers)
-    resp = requests.request(
-        method=request.method,
-        url=url,
-        json=request.get_json(silent=True),
-        headers=headers
-    )
-    return jsonify(resp.json()), resp.status_code
-
-@app.route('/tasks', methods=['GET', 'POST'])
-@app.route('/tasks/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
-@limiter.limit("200 per hour")  # 200 solicitudes/hora para /tasks
-def task_proxy(path=None):
-    url = f"{TASK_SERVICE_URL}/tasks"
-    if path:
-        url += f"/{path}"
-    headers = filter_headers(request.headers)
-    resp = requests.request(
-        method=request.method,
-        url=url,
-        json=request.get_json(silent=True),
-        headers=headers
-    )
-    return jsonify(resp.json()), resp.status_code
-
-@app.route('/logs', methods=['GET'])
-@app.route('/logs/<path:path>', methods=['GET'])
-@limiter.limit("20 per minute")  # 20 solicitudes/min para /logs
-def logs_proxy(path=None):
-    url = f"{LOGS_SERVICE_URL}/logs"
-    if path:
-        url += f"/{path}"
     headers = filter_headers(request.headers)
-    resp = requests.request(
-        method=request.method,
-        url=url,
-        json=request.get_json(silent=True),
-        headers=headers
+    claims = get_jwt_claims()
+    if claims:
+        # Identidad ya verificada: los servicios pueden evitar decodificar el JWT otra vez
+        headers.update(token_verifier.identity_headers(claims))
+    if cacheable:
+        # La revalidación la resuelve el gateway con el ETag de la copia guardada
+        headers.pop('If-None-Match', None)
+    upstream_start = time.perf_counter()
+    resp = client.request(
+        request.method,
+        upstream_path,
+        params=request.query_string or None,
+        data=request.get_data(),
+        headers=headers,
+        stream=True
     )
-    return jsonify(resp.json()), resp.status_code
+    g.upstream_ms = (time.perf_counter() - upstream_start) * 1000
+
+    if is_write:
+        # Después de que el servicio aplicó la escritura: las lecturas en vuelo no se guardan
+        if namespace:
+            response_cache.invalidate(namespace)
+        if resp.status_code < 400:
+            # Escrituras que cambian datos de otro servicio (p. ej. /auth/register crea un usuario)
+            for service in invalidates:
+                response_cache.invalidate(service)
+    if cacheable and is_cacheable(resp):
+        limit = response_cache.max_entry_bytes
+        length = resp.headers.get('Content-Length', '')
+        if length.isdigit() and int(length) > limit:
+            # No cabe en la caché: se transmite sin leerlo entero en memoria
+            response_cache.count_oversized()
+            return proxy_response(resp)
+        # Sin Content-Length (p. ej. chunked) se lee por bloques hasta pasar del máximo
+        chunks = resp.raw.stream(STREAM_CHUNK_SIZE, decode_content=False)
+        body = b''
+        try:
+            for chunk in chunks:
+                body += chunk
+                if len(body) > limit:
+                    response_cache.count_oversized()
+                    # Lo leído y el resto del cuerpo se transmiten sin guardarlos
+                    return proxy_response(resp, chunks=itertools.chain([body], chunks))
+        except Exception:
+            resp.close()
+            raise
+        resp.raw.release_conn()
+        entry = response_cache.put(key, namespace, generation, resp.status_code,
+                                   filter_response_headers(resp.raw.headers), body, cache_ttl)
+        return cached_response(entry, 'MISS')
+    return proxy_response(resp, rewrite_json=rewrite_json)
+
+@app.errorhandler(requests.Timeout)
+def upstream_timeout(e):
+    return jsonify({"error": "El servicio no respondió a tiempo", "detalle": str(e)}), 504
+
+@app.errorhandler(requests.ConnectionError)
+def upstream_unavailable(e):
+    return jsonify({"error": "No se pudo conectar con el servicio", "detalle": str(e)}), 502
+
+@app.errorhandler(CircuitOpenError)
+def circuit_open(e):
+    # Respuesta inmediata: el servicio no se llama mientras el circuito está abierto
+    response = jsonify({"error": "Servicio no disponible temporalmente", "servicio": e.service,
+                        "motivo": e.reason})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(max(1, int(e.retry_after + 0.999)))
+    return response
+
+# Estadísticas de uso de los pools para dimensionarlos
+@app.route('/gateway/stats/upstream', methods=['GET'])
+@metrics.internal_endpoint(limiter)
+def upstream_stats():
+    return jsonify([client.stats() for client in UPSTREAM_CLIENTS])
+
+@app.route('/gateway/stats/jwt-cache', methods=['GET'])
+@metrics.internal_endpoint(limiter)
+def jwt_cache_stats():
+    return jsonify(token_verifier.stats())
+
+@app.route('/gateway/stats/log-shipper', methods=['GET'])
+@metrics.internal_endpoint(limiter)
+def log_shipper_stats():
+    return jsonify(log_shipper.stats())
+
+@app.route('/gateway/stats/log-file', methods=['GET'])
+@metrics.internal_endpoint(limiter)
+def log_file_stats():
+    return jsonify(log_writer.stats())
+
+@app.route('/gateway/stats/response-cache', methods=['GET'])
+@metrics.internal_endpoint(limiter)
+def response_cache_stats():
+    return jsonify(response_cache.stats())
+
+# ===== Rutas proxy con rate limit personalizado =====
+def make_proxy(route):
+    client = upstream_clients[route['service']]
+
+    def proxy(path=None):
+        upstream_path = '/'.join(p for p in (route['upstream_prefix'], path) if p)
+        invalidates = route['invalidates'].get('/' + (path or '').strip('/'), ())
+        return forward(client, upstream_path, cache_ttl=route['cache_ttl'], cache_service=route['service'],
+                       cache_scope=route['cache_scope'], invalidates=invalidates)
+    # flask-limiter asocia el límite al nombre de la función: uno distinto por ruta
+    proxy.__name__ = proxy.__qualname__ = route['endpoint']
+    return limiter.limit(route['limit'])(proxy)
+
+for route in ROUTES:
+    view = make_proxy(route)
+    if route['upstream_prefix']:
+        app.add_url_rule(route['prefix'], route['endpoint'], view, methods=route['methods'])
+    app.add_url_rule(route['prefix'] + '/<path:path>', route['endpoint'], view, methods=route['methods'])
+
+# Disponibilidad del gateway (start_services.sh espera a este endpoint)
+register_health(app, limiter)
 
 if __name__ == '__main__':
-    app.run(port=5000, debug=True)
+    # SIGTERM (stop_services.sh) termina con sys.exit para que atexit vacíe la cola de logs
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    run(app, 5000)
@@ -0,0 +1,377 @@
+"""API Gateway asíncrono (ASGI).
+
+Mantiene la misma tabla de rutas y los mismos límites que ``app.py`` pero cada
+petición en vuelo hacia un microservicio no ocupa un hilo: se atienden muchas
+peticiones upstream concurrentes por proceso y una petición del cliente puede
+consultar varios servicios en paralelo (ver ``/dashboard``).
+
+Ejecutar con::
+
+    hypercorn asgi_app:app --bind 0.0.0.0:5000 --workers 2
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+import httpx
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import STRATEGIES
+from quart import Quart, Response, g, jsonify, request
+from quart_cors import cors
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+from common.ratelimit import RATELIMIT_ENABLED, RATELIMIT_STORAGE_URI, RATELIMIT_STRATEGY
+from common.server import server_port
+from common import metrics
+from logger import log_access, log_to_mongo
+from auth_context import TokenVerifier, GATEWAY_HEADERS, extract_token
+from registry import Service, RouteTrie
+from routes import ROUTES, SERVICES, DEFAULT_LIMITS
+from upstream import CONNECT_TIMEOUT, READ_TIMEOUT, POOL_MAXSIZE, RETRY_STATUSES, SERVER_TIMING, server_timing
+from resilience import (
+    CircuitBreaker, CircuitOpenError, RetryBudget, IDEMPOTENT_METHODS, RETRY_MAX_ATTEMPTS, RETRY_BACKOFF
+)
+
+app = Quart(__name__)
+app = cors(app, expose_headers=['X-Next-Cursor'])
+
+SECRET_KEY = os.getenv('SECRET_KEY')
+
+# Peticiones upstream simultáneas por servicio y proceso (no hay un hilo por petición)
+MAX_CONNECTIONS = int(os.getenv('ASGI_UPSTREAM_MAX_CONNECTIONS', '200'))
+
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade'
+}
+
+# Clientes httpx por servicio (un pool por instancia); se crean dentro del event loop del worker
+clients = {}
+# Instancias y balanceador por servicio (misma configuración que app.py)
+services = {name: Service(name, spec['instances'], spec['balancer']) for name, spec in SERVICES.items()}
+route_trie = RouteTrie(ROUTES)
+# Circuit breaker y presupuesto de reintentos por servicio (mismos umbrales que app.py)
+breakers = {name: CircuitBreaker(name) for name in services}
+retry_budgets = {name: RetryBudget() for name in services}
+
+# ====== Configuración de Rate Limiter ======
+# Mismo almacenamiento compartido que el gateway WSGI y los servicios
+rate_limit_storage = storage_from_string(RATELIMIT_STORAGE_URI)
+rate_limiter = STRATEGIES[RATELIMIT_STRATEGY](rate_limit_storage)
+
+def get_remote_address():
+    return request.remote_addr or '127.0.0.1'
+
+token_verifier = TokenVerifier(SECRET_KEY)
+
+def decode_token():
+    """Claims del JWT de la petición actual; se verifica una sola vez y se guarda en g"""
+    if '_jwt_checked' not in g:
+        g._jwt_checked = True
+        g.jwt_claims = token_verifier.verify(extract_token(request.headers))
+    return g.jwt_claims
+
+def get_user_or_ip():
+    """Usar username del JWT o la IP del cliente"""
+    payload = decode_token()
+    if payload:
+        return payload.get('username', get_remote_address())
+    return get_remote_address()
+
+def rate_limited(limit_values, scope):
+    """Aplica los límites (mismo formato que flask-limiter) antes de la vista"""
+    items = [parse(value) for value in limit_values]
+
+    def decorator(f):
+        @wraps(f)
+        async def wrapper(*args, **kwargs):
+            if not RATELIMIT_ENABLED:
+                return await f(*args, **kwargs)
+            key = get_user_or_ip()
+            for item in items:
+                # El backend es síncrono (SQLite/Redis): se consulta fuera del event loop
+                if not await asyncio.to_thread(rate_limiter.hit, item, 'api-gateway', scope, key):
+                    return jsonify({"error": f"Límite de solicitudes excedido: {item}"}), 429
+            return await f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def internal_endpoint(limit, scope):
+    """Como ``metrics.internal_endpoint``: 403 si no es una petición interna, y límite propio"""
+    def decorator(f):
+        @wraps(f)
+        async def wrapper(*args, **kwargs):
+            if not metrics.internal_allowed(request.headers, request.remote_addr):
+                return jsonify({"error": "Endpoint interno"}), 403
+            return await f(*args, **kwargs)
+        return rate_limited([limit], scope)(wrapper)
+    return decorator
+
+# ===== Ciclo de vida de los clientes upstream =====
+@app.before_serving
+async def create_clients():
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS,
+                          max_keepalive_connections=POOL_MAXSIZE)
+    timeout = httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+    for name in services:
+        clients[name] = httpx.AsyncClient(limits=limits, timeout=timeout, trust_env=False)
+
+@app.after_serving
+async def close_clients():
+    for client in clients.values():
+        await client.aclose()
+    clients.clear()
+
+# ===== Métricas (mismas series que common.metrics.init_app en los servicios Flask) =====
+metrics.REGISTRY.service = 'api-gateway-asgi'
+
+@app.before_request
+async def metrics_start():
+    g._metrics_start = time.perf_counter()
+    g._metrics_in_flight = True
+    metrics.REQUESTS_IN_FLIGHT.inc()
+
+@app.after_request
+async def metrics_record(response):
+    start = g.pop('_metrics_start', None)
+    if start is not None and metrics.METRICS_ENABLED:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.REQUEST_DURATION.observe(time.perf_counter() - start, route, request.method,
+                                         response.status_code)
+    return response
+
+@app.teardown_request
+async def metrics_finish(exc):
+    if g.pop('_metrics_in_flight', False):
+        metrics.REQUESTS_IN_FLIGHT.dec()
+
+# ===== Middleware de Logging =====
+@app.before_request
+async def start_timer():
+    g.start_time = time.perf_counter()
+    payload = decode_token()
+    g.user = payload.get('username', 'anonymous') if payload else 'anonymous'
+
+@app.after_request
+async def log_request(response):
+    # Fecha nativa en UTC (índices, TTL y orden correcto) y duración con precisión de µs
+    duration_ms = round((time.perf_counter() - g.start_time) * 1000, 3)
+    timestamp = datetime.now(timezone.utc)
+    method = request.method
+    path = request.path
+    status = response.status_code
+
+    route = route_trie.match(path)
+    service = route['service'] if route else 'unknown'
+
+    user = g.get('user', 'anonymous')
+
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = server_timing(duration_ms, g.get('upstream_ms'))
+
+    log_document = {
+        "timestamp": timestamp,
+        "method": method,
+        "path": path,
+        "service": service,
+        "user": user,
+        "status": status,
+        "duration_ms": duration_ms
+    }
+    log_access(log_document)
+    # Solo encola: el envío a Mongo lo hace el hilo del log shipper
+    log_to_mongo(log_document)
+
+    return response
+
+# ===== Proxy =====
+def filter_headers(headers):
+    headers = {key: value for key, value in headers.items()
+               if key.lower() != 'host' and key.lower() not in HOP_BY_HOP_HEADERS
+               and key.lower() not in GATEWAY_HEADERS}
+    claims = decode_token()
+    if claims:
+        headers.update(token_verifier.identity_headers(claims))
+    return headers
+
+def filter_response_headers(headers):
+    return [(key, value) for key, value in headers.multi_items()
+            if key.lower() not in HOP_BY_HOP_HEADERS and key.lower() not in ('date', 'server')]
+
+async def send_with_retries(service, method, url, content, headers):
+    """Envía la petición; reintenta errores de conexión y 502/503 si el método es idempotente.
+
+    La instancia se elige en cada intento, así un reintento puede ir a otra.
+    """
+    client = clients[service]
+    budget = retry_budgets[service]
+    budget.record_request()
+    idempotent = method in IDEMPOTENT_METHODS
+    attempt = 0
+    while True:
+        can_retry = idempotent and attempt < RETRY_MAX_ATTEMPTS
+        instance = services[service].acquire()
+        upstream_request = client.build_request(
+            method, f"{instance.url}/{url}", content=content, headers=headers
+        )
+        attempt_start = time.perf_counter()
+        try:
+            resp = await client.send(upstream_request, stream=True)
+        except (httpx.ConnectError, httpx.ConnectTimeout):
+            services[service].release(instance, failed=True)
+            metrics.count_http_call(service, 'connection_error')
+            if not (can_retry and budget.try_retry()):
+                raise
+        except httpx.HTTPError as e:
+            services[service].release(instance, failed=True)
+            metrics.count_http_call(service, 'timeout' if isinstance(e, httpx.TimeoutException) else 'error')
+            raise
+        else:
+            metrics.observe_stage('upstream', time.perf_counter() - attempt_start)
+            metrics.count_http_call(service, resp.status_code)
+            services[service].release(instance, failed=resp.status_code >= 500)
+            if resp.status_code not in RETRY_STATUSES or not (can_retry and budget.try_retry()):
+                return resp
+            await resp.aclose()
+        await asyncio.sleep(RETRY_BACKOFF * (2 ** attempt) * (0.5 + random.random()))
+        attempt += 1
+
+async def call_upstream(service, method, url, content, headers):
+    """Petición al servicio pasando por su circuit breaker (lanza ``CircuitOpenError``)"""
+    breaker = breakers[service]
+    probe = breaker.before_call()
+    failed = True
+    start = time.perf_counter()
+    try:
+        resp = await send_with_retries(service, method, url, content, headers)
+        failed = resp.status_code >= 500
+        return resp
+    finally:
+        breaker.after_call(failed, (time.perf_counter() - start) * 1000, probe)
+
+async def forward(service, upstream_path):
+    """Reenvía la petición actual y transmite la respuesta por bloques"""
+    url = upstream_path
+    if request.query_string:
+        url += '?' + request.query_string.decode('latin-1')
+    content = await request.get_data()
+    headers = filter_headers(request.headers)
+
+    start = time.perf_counter()
+    try:
+        resp = await call_upstream(service, request.method, url, content, headers)
+        g.upstream_ms = (time.perf_counter() - start) * 1000
+    except CircuitOpenError as e:
+        response = jsonify({"error": "Servicio no disponible temporalmente", "servicio": e.service,
+                            "motivo": e.reason})
+        return response, 503, {'Retry-After': str(max(1, int(e.retry_after + 0.999)))}
+    except httpx.TimeoutException as e:
+        return jsonify({"error": "El servicio no respondió a tiempo", "detalle": str(e)}), 504
+    except httpx.TransportError as e:
+        return jsonify({"error": "No se pudo conectar con el servicio", "detalle": str(e)}), 502
+
+    async def generate():
+        try:
+            async for chunk in resp.aiter_raw():
+                yield chunk
+        finally:
+            await resp.aclose()
+
+    return Response(generate(), status=resp.status_code,
+                    headers=filter_response_headers(resp.headers))
+
+def make_proxy(route):
+    # Mismo scope que el gateway WSGI: un contador por ruta, no por servicio
+    @rate_limited([route['limit']], route['endpoint'])
+    async def proxy(path=None):
+        upstream_path = '/'.join(p for p in (route['upstream_prefix'], path) if p)
+        return await forward(route['service'], upstream_path)
+    return proxy
+
+# ===== Rutas proxy (misma tabla que el gateway WSGI) =====
+for route in ROUTES:
+    view = make_proxy(route)
+    if route['upstream_prefix']:
+        app.add_url_rule(route['prefix'], route['endpoint'], view, methods=route['methods'])
+    app.add_url_rule(route['prefix'] + '/<path:path>', route['endpoint'], view, methods=route['methods'])
+
+@app.route('/gateway/stats/circuits', methods=['GET'])
+@internal_endpoint(metrics.INTERNAL_RATE_LIMIT, 'gateway-stats')
+async def circuit_stats():
+    return jsonify({service: {"circuit": breaker.stats(), "retry_budget": retry_budgets[service].stats(),
+                              "instances": services[service].stats()["instances"]}
+                    for service, breaker in breakers.items()})
+
+# ===== Dashboard: consulta a varios servicios en paralelo =====
+async def fetch_json(service, path, headers):
+    """GET al servicio con el mismo breaker y reintentos que el proxy"""
+    try:
+        resp = await call_upstream(service, 'GET', path, None, headers)
+    except CircuitOpenError as e:
+        return {"status": 503, "error": f"Circuito abierto: {e.reason}"}
+    except httpx.HTTPError as e:
+        return {"status": 502, "error": str(e)}
+    try:
+        await resp.aread()
+        return {"status": resp.status_code, "data": resp.json()}
+    except (httpx.HTTPError, ValueError) as e:
+        return {"status": 502, "error": str(e)}
+    finally:
+        await resp.aclose()
+
+@app.route('/dashboard', methods=['GET'])
+@rate_limited(DEFAULT_LIMITS, 'dashboard')
+async def dashboard():
+    payload = decode_token()
+    if not payload:
+        return jsonify({"error": "Token es requerido"}), 401
+
+    headers = {'Authorization': request.headers['Authorization']}
+    headers.update(token_verifier.identity_headers(payload))
+    user, tasks, total, status_count = await asyncio.gather(
+        fetch_json('user-service', f"users/{payload.get('user_id')}", headers),
+        fetch_json('task-service', 'tasks', headers),
+        fetch_json('logs-service', 'logs/total', headers),
+        fetch_json('logs-service', 'logs/status-count', headers),
+    )
+    return jsonify({
+        "user": user,
+        "tasks": tasks,
+        "logs": {"total": total, "status_count": status_count}
+    })
+
+@app.route('/metrics', methods=['GET'])
+@internal_endpoint(metrics.INTERNAL_RATE_LIMIT, 'metrics')
+async def metrics_endpoint():
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/debug/profile', methods=['GET'])
+@internal_endpoint(metrics.PROFILE_RATE_LIMIT, 'debug-profile')
+async def debug_profile():
+    if not metrics.PROFILER_ENABLED:
+        return jsonify({"error": "Profiler desactivado (METRICS_PROFILER_ENABLED=false)"}), 404
+    try:
+        seconds = float(request.args.get('seconds', '5'))
+    except ValueError:
+        return jsonify({"error": "seconds debe ser un número"}), 400
+    # El muestreo bloquea: en un hilo aparte para no parar el event loop (que es lo que se mide)
+    result = await asyncio.to_thread(metrics.profile, seconds,
+                                     include_idle=request.args.get('idle') == 'true')
+    if result is None:
+        return jsonify({"error": "Ya hay un muestreo en curso en este proceso"}), 409
+    return Response(result, content_type='text/plain; charset=utf-8')
+
+# Disponibilidad del gateway (start_services.sh espera a este endpoint)
+@app.route('/health', methods=['GET'])
+async def health():
+    return jsonify({"status": "ok"})
+
+if __name__ == '__main__':
+    app.run(port=server_port(5000))
@@ -0,0 +1,112 @@
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+
+from common.metrics import stage
+
+# ===== Configuración de la caché de tokens verificados =====
+JWT_CACHE_SIZE = int(os.getenv('JWT_CACHE_SIZE', '10000'))
+JWT_CACHE_TTL = float(os.getenv('JWT_CACHE_TTL', '300'))  # segundos
+
+# Cabeceras con la identidad ya verificada que el gateway envía a los servicios
+GATEWAY_USER_HEADER = 'X-Gateway-User'
+GATEWAY_USER_ID_HEADER = 'X-Gateway-User-Id'
+GATEWAY_EXP_HEADER = 'X-Gateway-Token-Exp'
+GATEWAY_SIGNATURE_HEADER = 'X-Gateway-Signature'
+GATEWAY_HEADERS = {
+    GATEWAY_USER_HEADER.lower(), GATEWAY_USER_ID_HEADER.lower(),
+    GATEWAY_EXP_HEADER.lower(), GATEWAY_SIGNATURE_HEADER.lower()
+}
+
+
+def extract_token(headers):
+    return headers.get('Authorization', '').replace('Bearer ', '')
+
+
+class TokenVerifier:
+    """Verifica JWT una sola vez y guarda los claims en una caché LRU con TTL.
+
+    La clave es el hash SHA-256 del token (no se guarda el token en claro) y una
+    entrada nunca vive más allá del ``exp`` del propio token.
+    """
+
+    def __init__(self, secret_key, maxsize=JWT_CACHE_SIZE, ttl=JWT_CACHE_TTL):
+        self.secret_key = secret_key
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._invalid = 0
+
+    def verify(self, token):
+        """Devuelve los claims del token o None si no es válido"""
+        if not token:
+            return None
+
+        key = hashlib.sha256(token.encode()).digest()
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                claims, expires_at = entry
+                if expires_at > now:
+                    self._cache.move_to_end(key)
+                    self._hits += 1
+                    return claims
+                del self._cache[key]
+            self._misses += 1
+
+        try:
+            with stage('jwt_decode'):
+                claims = jwt.decode(token, self.secret_key, algorithms=['HS256'])
+        except jwt.PyJWTError:
+            with self._lock:
+                self._invalid += 1
+            return None
+
+        expires_at = now + self.ttl
+        if isinstance(claims.get('exp'), (int, float)):
+            expires_at = min(expires_at, claims['exp'])
+
+        with self._lock:
+            self._cache[key] = (claims, expires_at)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return claims
+
+    def identity_headers(self, claims):
+        """Cabeceras firmadas (HMAC) con la identidad verificada para los servicios"""
+        username = str(claims.get('username') or '')
+        exp = claims.get('exp')
+        # Un token sin exp no se delega: el servicio verificará el JWT él mismo
+        if not username or not isinstance(exp, (int, float)):
+            return {}
+        user_id = str(claims.get('user_id') or '')
+        exp = str(exp)
+        message = f"{username}|{user_id}|{exp}".encode()
+        signature = hmac.new(self.secret_key.encode(), message, hashlib.sha256).hexdigest()
+        return {
+            GATEWAY_USER_HEADER: username,
+            GATEWAY_USER_ID_HEADER: user_id,
+            GATEWAY_EXP_HEADER: exp,
+            GATEWAY_SIGNATURE_HEADER: signature,
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._cache),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "invalid": self._invalid,
+            }
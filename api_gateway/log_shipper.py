@@ -0,0 +1,325 @@
+import atexit
+import fcntl
+import os
+import queue
+import random
+import threading
+import time
+
+from common.metrics import count_db_call, stage
+
+# ===== Configuración del envío de logs a MongoDB =====
+LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', '200'))
+LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL', '1.0'))    # segundos
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+# drop: descartar si la cola está llena | block: esperar hasta LOG_BLOCK_TIMEOUT
+# sample: a partir de LOG_SAMPLE_THRESHOLD de ocupación solo entra LOG_SAMPLE_RATE de los registros
+LOG_OVERFLOW_POLICY = os.getenv('LOG_OVERFLOW_POLICY', 'drop').lower()
+LOG_BLOCK_TIMEOUT = float(os.getenv('LOG_BLOCK_TIMEOUT', '0.05'))
+LOG_SAMPLE_THRESHOLD = float(os.getenv('LOG_SAMPLE_THRESHOLD', '0.8'))
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '0.1'))
+LOG_SPILL_FILE = os.getenv('LOG_SPILL_FILE', 'logs/mongo_spill.jsonl')
+# Tras un fallo de Mongo no se reintenta durante este tiempo (los lotes van al archivo)
+LOG_RETRY_INTERVAL = float(os.getenv('LOG_RETRY_INTERVAL', '5'))
+DUPLICATE_KEY_ERROR = 11000
+
+
+class LogShipper:
+    """Envía documentos de log a MongoDB en segundo plano y por lotes.
+
+    Las peticiones solo encolan el documento. Un hilo vacía la cola con
+    ``insert_many`` cuando se junta un lote o vence el intervalo. Si Mongo no
+    está disponible los lotes se guardan en un archivo local (JSON lines) que se
+    reenvía cuando Mongo vuelve a responder.
+
+    ``connect()`` devuelve la colección de destino. Se llama desde el hilo de
+    envío, así que conectar a Mongo (e importar pymongo) no retrasa el arranque.
+    Si falla se trata igual que un Mongo caído.
+
+    Todos los workers comparten el archivo de spill: escribirlo y renombrarlo para
+    reenviarlo se hace con ``flock`` y solo un worker a la vez lo reenvía. Cada
+    documento se guarda con su ``_id``, así que repetir un reenvío interrumpido no
+    duplica logs (Mongo rechaza los que ya tiene).
+    """
+
+    def __init__(self, connect, logger, batch_size=LOG_BATCH_SIZE,
+                 flush_interval=LOG_FLUSH_INTERVAL, max_queue=LOG_QUEUE_SIZE,
+                 overflow_policy=LOG_OVERFLOW_POLICY, spill_file=LOG_SPILL_FILE):
+        if overflow_policy not in ('drop', 'block', 'sample'):
+            raise ValueError(f"LOG_OVERFLOW_POLICY no válida: {overflow_policy}")
+
+        self.connect = connect
+        self.logger = logger
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        self.spill_file = spill_file
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+        self._retry_after = 0.0
+
+        self._enqueued = 0
+        self._shipped = 0
+        self._dropped = 0
+        self._spilled = 0
+        self._replayed = 0
+        self._duplicates = 0
+        self._failed_batches = 0
+        self._malformed = 0
+        self._worker_errors = 0
+        self._worker_restarts = 0
+
+        atexit.register(self.stop)
+
+    # ===== Lado de las peticiones =====
+    def submit(self, document):
+        """Encola un documento; nunca espera a Mongo"""
+        self._ensure_worker()
+
+        if self.overflow_policy == 'sample':
+            fill = self._queue.qsize() / self.max_queue
+            if fill >= LOG_SAMPLE_THRESHOLD and random.random() >= LOG_SAMPLE_RATE:
+                self._count('_dropped')
+                return False
+
+        try:
+            if self.overflow_policy == 'block':
+                self._queue.put(document, timeout=LOG_BLOCK_TIMEOUT)
+            else:
+                self._queue.put_nowait(document)
+        except queue.Full:
+            self._count('_dropped')
+            return False
+
+        self._count('_enqueued')
+        return True
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def _worker_running(self):
+        return self._thread is not None and self._pid == os.getpid() and self._thread.is_alive()
+
+    def _ensure_worker(self):
+        # Tras un fork (workers de gunicorn) el hilo no existe en el proceso hijo;
+        # si el hilo terminó por un error inesperado se vuelve a lanzar
+        if self._worker_running():
+            return
+        with self._lock:
+            if self._worker_running():
+                return
+            if self._pid == os.getpid() and self._stopping.is_set():
+                return    # apagándose: stop() vacía la cola
+            if self._pid is not None and self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_queue)
+            elif self._thread is not None:
+                self._worker_restarts += 1
+                self.logger.error("El hilo de envío de logs terminó inesperadamente; se reinicia")
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='log-shipper', daemon=True)
+            self._thread.start()
+
+    # ===== Hilo de envío =====
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                batch = self._next_batch()
+                if batch:
+                    self._ship(batch)
+            except Exception as e:
+                # Un error inesperado (p. ej. de disco) no debe detener el envío de los siguientes lotes
+                self._count('_worker_errors')
+                self.logger.error(f"Error en el hilo de envío de logs: {e!r}")
+                self._stopping.wait(self.flush_interval)
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _ship(self, batch):
+        # Imports diferidos: pymongo/bson solo se cargan en el hilo de envío
+        from pymongo.errors import BulkWriteError, PyMongoError
+
+        if time.monotonic() < self._retry_after:
+            self._spill(batch)
+            return
+        try:
+            collection = self.connect()
+            count_db_call('mongo', 'insert_many')
+            with stage('mongo_insert'):
+                collection.insert_many(batch, ordered=False)
+            self._count('_shipped', len(batch))
+        except BulkWriteError as e:
+            # Documentos rechazados por Mongo (no es un problema de disponibilidad)
+            inserted = e.details.get('nInserted', 0)
+            self._count('_shipped', inserted)
+            self._count('_dropped', len(batch) - inserted)
+            self.logger.error(f"MongoDB rechazó {len(batch) - inserted} logs: {e}")
+            return
+        except (PyMongoError, ValueError) as e:   # ValueError: MONGO_URI sin definir
+            self._count('_failed_batches')
+            self._retry_after = time.monotonic() + LOG_RETRY_INTERVAL
+            self.logger.error(f"Error insertando logs en MongoDB, se guardan en {self.spill_file}: {e}")
+            self._spill(batch)
+            return
+
+        if self._spill_pending():
+            self._replay_spill()
+
+    def _spill_pending(self):
+        return os.path.exists(self.spill_file) or os.path.exists(self.spill_file + '.replay')
+
+    def _flock(self, suffix, operation):
+        """Archivo de bloqueo junto al spill con flock aplicado (None si está ocupado)"""
+        os.makedirs(os.path.dirname(self.spill_file) or '.', exist_ok=True)
+        lock_file = open(self.spill_file + suffix, 'a')
+        try:
+            fcntl.flock(lock_file, operation)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _spill(self, batch):
+        from bson import ObjectId, json_util
+
+        try:
+            with self._flock('.lock', fcntl.LOCK_EX), open(self.spill_file, 'a', encoding='utf-8') as f:
+                for document in batch:
+                    # insert_many ya le puso _id si llegó a intentarse; se conserva para el reenvío
+                    document.setdefault('_id', ObjectId())
+                    f.write(json_util.dumps(document) + '\n')
+            self._count('_spilled', len(batch))
+        except OSError as e:
+            self.logger.error(f"No se pudieron guardar logs en {self.spill_file}: {e}")
+            self._count('_dropped', len(batch))
+
+    def _replay_spill(self):
+        """Reenvía a Mongo, por lotes, los logs guardados mientras no estaba disponible"""
+        from bson import json_util
+
+        try:
+            replay_lock = self._flock('.replay.lock', fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as e:
+            self.logger.error(f"No se pudo bloquear {self.spill_file} para reenviarlo: {e}")
+            return
+        if replay_lock is None:
+            return    # otro worker lo está reenviando
+
+        with replay_lock:
+            replay_file = self.spill_file + '.replay'
+            # Si quedó un .replay de un reenvío interrumpido se termina ese primero (no se pisa)
+            if not os.path.exists(replay_file):
+                with self._flock('.lock', fcntl.LOCK_EX):
+                    try:
+                        os.replace(self.spill_file, replay_file)
+                    except FileNotFoundError:
+                        return
+
+            with open(replay_file, encoding='utf-8') as f:
+                chunk = []
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        chunk.append(json_util.loads(line))
+                    except (ValueError, TypeError):
+                        # Línea corrupta (p. ej. escritura cortada): se descarta y se cuenta
+                        self._count('_malformed')
+                        continue
+                    if len(chunk) < self.batch_size:
+                        continue
+                    if not self._replay_chunk(chunk):
+                        # El .replay se queda: el siguiente reenvío empieza de nuevo y
+                        # los documentos que ya llegaron se rechazan por _id duplicado
+                        return
+                    chunk = []
+                if chunk and not self._replay_chunk(chunk):
+                    return
+            os.remove(replay_file)
+
+    def _replay_chunk(self, chunk):
+        from pymongo.errors import BulkWriteError, PyMongoError
+
+        try:
+            count_db_call('mongo', 'insert_many')
+            self.connect().insert_many(chunk, ordered=False)
+            self._count('_replayed', len(chunk))
+        except BulkWriteError as e:
+            # _id duplicado: el documento ya llegó en un reenvío anterior interrumpido
+            errors = e.details.get('writeErrors', [])
+            duplicates = sum(1 for error in errors if error.get('code') == DUPLICATE_KEY_ERROR)
+            self._count('_replayed', e.details.get('nInserted', 0))
+            self._count('_duplicates', duplicates)
+            self._count('_dropped', len(errors) - duplicates)
+            if len(errors) > duplicates:
+                self.logger.error(f"MongoDB rechazó {len(errors) - duplicates} logs guardados: {e}")
+        except PyMongoError as e:
+            self._retry_after = time.monotonic() + LOG_RETRY_INTERVAL
+            self.logger.error(f"Error reenviando logs guardados: {e}")
+            return False
+        return True
+
+    # ===== Apagado =====
+    def flush(self):
+        """Envía lo que quede en la cola (se usa al apagar el gateway)"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._ship(batch)
+                batch = []
+        if batch:
+            self._ship(batch)
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        if self._worker_running():
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                # El hilo sigue enviando o guardando: vaciar la cola desde aquí lo haría en paralelo
+                self.logger.error(f"El envío de logs no terminó en {timeout} s; quedan {self._queue.qsize()} en cola")
+                return
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "overflow_policy": self.overflow_policy,
+                "enqueued": self._enqueued,
+                "shipped": self._shipped,
+                "dropped": self._dropped,
+                "spilled": self._spilled,
+                "replayed": self._replayed,
+                "duplicates_skipped": self._duplicates,
+                "failed_batches": self._failed_batches,
+                "malformed_spill_lines": self._malformed,
+                "worker_errors": self._worker_errors,
+                "worker_restarts": self._worker_restarts,
+                "spill_pending": self._spill_pending(),
+            }
@@ -0,0 +1,174 @@
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# ===== Archivo de log del gateway =====
+# {pid} en la ruta da un archivo por worker (varios procesos no deben rotar el mismo archivo).
+# gunicorn exporta SERVER_SOFTWARE a sus workers: ahí el valor por defecto ya lleva {pid}
+UNDER_GUNICORN = os.getenv('SERVER_SOFTWARE', '').startswith('gunicorn')
+LOG_FILE = os.getenv('LOG_FILE', 'logs/api_gateway-{pid}.log' if UNDER_GUNICORN else 'logs/api_gateway.log')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()                    # text | json
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(50 * 1024 * 1024)))  # 0 = sin rotación por tamaño
+LOG_ROTATE_INTERVAL = int(os.getenv('LOG_ROTATE_INTERVAL', '86400'))    # segundos; 0 = sin rotación por tiempo
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '7'))
+LOG_COMPRESS = os.getenv('LOG_COMPRESS', 'true').lower() == 'true'
+LOG_FILE_QUEUE_SIZE = int(os.getenv('LOG_FILE_QUEUE_SIZE', '10000'))
+LOG_CONSOLE = os.getenv('LOG_CONSOLE', 'true').lower() == 'true'
+
+# Campos del log de acceso (mismo documento que se envía a Mongo)
+ACCESS_FIELDS = ('timestamp', 'method', 'path', 'service', 'user', 'status', 'duration_ms')
+
+
+def access_line(access):
+    timestamp = access['timestamp']
+    return (
+        f"{timestamp.isoformat(timespec='milliseconds')} | {access['method']} {access['path']} | "
+        f"Service: {access['service']} | User: {access['user']} | "
+        f"Status: {access['status']} | Duration: {access['duration_ms']:.3f}ms"
+    )
+
+
+class TextFormatter(logging.Formatter):
+    """Formato de siempre: ``fecha | mensaje``; el log de acceso se arma aquí, no en la petición"""
+
+    def formatMessage(self, record):
+        access = getattr(record, 'access', None)
+        if access is None:
+            return super().formatMessage(record)
+        return f"{record.asctime} | {access_line(access)}"
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Un objeto JSON compacto por línea"""
+
+    def format(self, record):
+        access = getattr(record, 'access', None)
+        if access is not None:
+            entry = {name: access.get(name) for name in ACCESS_FIELDS}
+            entry['timestamp'] = entry['timestamp'].isoformat(timespec='milliseconds')
+        else:
+            entry = {
+                "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+                "level": record.levelname,
+                "message": record.getMessage(),
+            }
+            if record.exc_info:
+                entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def gzip_rotator(source, dest):
+    # Con delay=True el archivo no existe si no se escribió nada desde la última rotación
+    if not os.path.exists(source):
+        return
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as out:
+        shutil.copyfileobj(src, out)
+    os.remove(source)
+
+
+class RotatingLogFileHandler(RotatingFileHandler):
+    """Rota por tamaño (``max_bytes``) o por tiempo (``interval`` segundos).
+
+    Las copias se numeran (``.1`` la más reciente) y, con ``compress``, se
+    guardan como ``.1.gz``. Se conservan ``backup_count`` copias.
+    """
+
+    def __init__(self, filename, max_bytes=LOG_MAX_BYTES, interval=LOG_ROTATE_INTERVAL,
+                 backup_count=LOG_BACKUP_COUNT, compress=LOG_COMPRESS):
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        # Sin copias RotatingFileHandler nunca rota: al menos una
+        super().__init__(filename, maxBytes=max_bytes, backupCount=max(1, backup_count),
+                         encoding='utf-8', delay=True)
+        self.interval = interval
+        self.rollover_at = self._next_rollover(time.time())
+        if compress:
+            self.namer = lambda name: name + '.gz'
+            self.rotator = gzip_rotator
+
+    def _next_rollover(self, now):
+        # Alineado al intervalo (con 86400: a las 00:00 UTC)
+        return (int(now) // self.interval + 1) * self.interval if self.interval > 0 else None
+
+    def shouldRollover(self, record):
+        if self.rollover_at is not None and record.created >= self.rollover_at:
+            return True
+        if self.maxBytes <= 0:
+            return False
+        if self.stream is None:
+            self.stream = self._open()
+        # Sin formatear el registro dos veces: rota en cuanto el archivo pasa del límite
+        return self.stream.tell() >= self.maxBytes
+
+    def doRollover(self):
+        super().doRollover()
+        if self.rollover_at is not None:
+            self.rollover_at = self._next_rollover(time.time())
+
+
+class EnqueueOnlyHandler(QueueHandler):
+    """Handler de los hilos de las peticiones: solo encola el registro.
+
+    ``prepare`` no formatea (lo hacen los handlers en el hilo del listener) y con
+    la cola llena el registro se descarta y se cuenta, sin bloquear la petición.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+
+class LogWriter:
+    """Cola + QueueListener con el archivo rotado y, opcionalmente, la consola"""
+
+    def __init__(self, filename=LOG_FILE, fmt=LOG_FORMAT, console=LOG_CONSOLE, max_queue=LOG_FILE_QUEUE_SIZE):
+        if fmt not in ('text', 'json'):
+            raise ValueError(f"LOG_FORMAT no válido: {fmt}")
+        self.filename = filename.format(pid=os.getpid())
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.max_queue = max_queue
+        self.handler = EnqueueOnlyHandler(self.queue)
+
+        if fmt == 'json':
+            formatter = JsonLinesFormatter()
+        else:
+            formatter = TextFormatter('%(asctime)s | %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+        self.file_handler = RotatingLogFileHandler(self.filename)
+        handlers = [self.file_handler]
+        if console:
+            handlers.append(logging.StreamHandler())
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        # Vacía la cola y cierra el archivo (al apagar el gateway)
+        if self.listener._thread is not None:
+            self.listener.stop()
+        self.file_handler.close()
+
+    def stats(self):
+        return {
+            "file": self.filename,
+            "queued": self.queue.qsize(),
+            "max_queue": self.max_queue,
+            "dropped": self.handler.dropped,
+        }
@@ -1,42 +1,70 @@
+import atexit
 import logging
-from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
 
+from common.lazy import LazyResource
+from log_shipper import LogShipper
+from log_writer import LogWriter
+
 # Cargar variables del archivo .env
 load_dotenv()
 
-os.makedirs('logs', exist_ok=True)
-
 # Leer la URI desde variable de entorno
 MONGO_URI = os.getenv("MONGO_URI")
-if not MONGO_URI:
-    raise ValueError("La variable de entorno MONGO_URI no está definida")
 
-mongo_client = MongoClient(MONGO_URI)
-db = mongo_client["Logs"]       # base de datos
-logs_collection = db["Logs"]    # colección
+# Timeout corto: si Mongo no responde los logs van al archivo de spill
+MONGO_TIMEOUT_MS = int(os.getenv('MONGO_TIMEOUT_MS', '5000'))
 
 logger = logging.getLogger('api_gateway_logger')
 logger.setLevel(logging.INFO)
 
-formatter = logging.Formatter('%(asctime)s | %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+if logger.hasHandlers():
+    logger.handlers.clear()
 
-file_handler = logging.FileHandler('logs/api_gateway.log')
-file_handler.setFormatter(formatter)
+# Archivo rotado (y consola) escritos por el hilo del QueueListener; la petición solo encola
+log_writer = LogWriter()
+logger.addHandler(log_writer.handler)
+logger.propagate = False
+# Se registra antes que el log shipper: al salir se detiene después y recoge sus últimos avisos
+atexit.register(log_writer.stop)
 
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(formatter)
+def connect_logs():
+    """Colección Logs.Logs con sus índices; la crea el hilo de envío antes del primer lote"""
+    if not MONGO_URI:
+        raise ValueError("La variable de entorno MONGO_URI no está definida")
+    # Import diferido: pymongo es lo más lento de importar y el gateway no lo necesita para responder
+    from pymongo import MongoClient
+    from pymongo.errors import OperationFailure, PyMongoError
+    from common.logstore import prepare_logs_collection
 
-if logger.hasHandlers():
-    logger.handlers.clear()
+    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=MONGO_TIMEOUT_MS)
+    db = client["Logs"]       # base de datos
+    try:
+        prepare_logs_collection(db, "Logs")
+    except OperationFailure as e:
+        # Sin permisos o índices incompatibles: se avisa y los logs se siguen enviando
+        logger.error(f"No se pudo preparar la colección de logs: {e}")
+    except PyMongoError:
+        client.close()
+        raise
+    return db["Logs"]         # colección
 
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
+
+if not MONGO_URI:
+    logger.warning("MONGO_URI no está definida: los logs se guardarán en el archivo de spill")
+
+# Cliente de Mongo creado en el primer envío y reintentado si falla (common/lazy.py)
+logs_collection = LazyResource('mongo-logs', connect_logs)
+
+# Envío en segundo plano y por lotes (la petición solo encola el documento)
+log_shipper = LogShipper(logs_collection.get, logger)
 
 
 def log_to_mongo(log_data):
-    try:
-        logs_collection.insert_one(log_data)
-    except Exception as e:
-        logger.error(f"Error insertando log en MongoDB: {e}")
+    log_shipper.submit(log_data)
+
+
+def log_access(log_data):
+    # El formato (texto o JSON) lo aplica el hilo del listener, no la petición
+    logger.info('access', extra={'access': log_data})
@@ -0,0 +1,130 @@
+import itertools
+import os
+import threading
+import time
+
+# ===== Salud pasiva de las instancias =====
+# Tras N fallos seguidos (conexión, timeout o 5xx) la instancia deja de recibir
+# tráfico durante HEALTH_EJECT_SECONDS; después vuelve a probarse con tráfico real
+HEALTH_MAX_FAILURES = int(os.getenv('HEALTH_MAX_FAILURES', '3'))
+HEALTH_EJECT_SECONDS = float(os.getenv('HEALTH_EJECT_SECONDS', '10'))
+
+BALANCERS = ('round_robin', 'least_outstanding')
+
+
+class Instance:
+    """Una instancia (URL base) de un servicio"""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+
+    def available(self, now):
+        return self.ejected_until <= now
+
+    def stats(self, now):
+        return {
+            "url": self.url,
+            "healthy": self.available(now),
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections,
+        }
+
+
+class Service:
+    """Instancias de un servicio y el balanceo entre ellas.
+
+    ``acquire()`` elige instancia (round_robin o least_outstanding, saltando las
+    expulsadas) y ``release(instance, failed)`` registra el resultado para la
+    salud pasiva.
+    """
+
+    def __init__(self, name, urls, balancer='round_robin',
+                 max_failures=HEALTH_MAX_FAILURES, eject_seconds=HEALTH_EJECT_SECONDS):
+        if not urls:
+            raise ValueError(f"El servicio {name} no tiene instancias")
+        if balancer not in BALANCERS:
+            raise ValueError(f"Balanceador no válido para {name}: {balancer}")
+        self.name = name
+        self.instances = [Instance(url) for url in urls]
+        self.balancer = balancer
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self._rr = itertools.count()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        now = time.monotonic()
+        with self._lock:
+            instances = self.instances
+            if len(instances) > 1:
+                available = [i for i in instances if i.available(now)]
+                # Si todas están expulsadas se prueba igualmente (mejor que no responder)
+                candidates = available or instances
+                start = next(self._rr)
+                if self.balancer == 'least_outstanding':
+                    # Empates resueltos en round-robin para repartir la carga
+                    ordered = candidates[start % len(candidates):] + candidates[:start % len(candidates)]
+                    instance = min(ordered, key=lambda i: i.outstanding)
+                else:
+                    instance = candidates[start % len(candidates)]
+            else:
+                instance = instances[0]
+            instance.outstanding += 1
+            instance.requests += 1
+            return instance
+
+    def release(self, instance, failed):
+        with self._lock:
+            instance.outstanding -= 1
+            if not failed:
+                instance.consecutive_failures = 0
+                return
+            instance.failures += 1
+            instance.consecutive_failures += 1
+            if instance.consecutive_failures >= self.max_failures and len(self.instances) > 1:
+                instance.ejected_until = time.monotonic() + self.eject_seconds
+                instance.consecutive_failures = 0
+                instance.ejections += 1
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "service": self.name,
+                "balancer": self.balancer,
+                "instances": [instance.stats(now) for instance in self.instances],
+            }
+
+
+class RouteTrie:
+    """Prefijos de ruta por segmentos: ``match`` devuelve la ruta del prefijo más largo"""
+
+    def __init__(self, routes=()):
+        self._root = {}
+        for route in routes:
+            self.insert(route['prefix'], route)
+
+    def insert(self, prefix, value):
+        node = self._root
+        for segment in prefix.strip('/').split('/'):
+            if segment:
+                node = node.setdefault(segment, {})
+        node[None] = value
+
+    def match(self, path):
+        node = self._root
+        found = node.get(None)
+        for segment in path.strip('/').split('/'):
+            node = node.get(segment)
+            if node is None:
+                break
+            found = node.get(None, found)
+        return found
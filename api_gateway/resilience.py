@@ -0,0 +1,199 @@
+import os
+import threading
+import time
+from collections import deque
+
+# ===== Configuración de los circuit breakers =====
+CIRCUIT_WINDOW = int(os.getenv('CIRCUIT_WINDOW', '20'))                   # últimas N llamadas
+CIRCUIT_MIN_CALLS = int(os.getenv('CIRCUIT_MIN_CALLS', '10'))             # mínimo para evaluar
+CIRCUIT_FAILURE_RATE = float(os.getenv('CIRCUIT_FAILURE_RATE', '0.5'))
+CIRCUIT_SLOW_CALL_MS = float(os.getenv('CIRCUIT_SLOW_CALL_MS', '2000'))
+CIRCUIT_SLOW_RATE = float(os.getenv('CIRCUIT_SLOW_RATE', '0.8'))
+CIRCUIT_OPEN_SECONDS = float(os.getenv('CIRCUIT_OPEN_SECONDS', '10'))
+CIRCUIT_HALF_OPEN_CALLS = int(os.getenv('CIRCUIT_HALF_OPEN_CALLS', '2'))  # pruebas simultáneas
+# Peticiones simultáneas máximas por servicio: un servicio lento no acapara todos los hilos
+CIRCUIT_MAX_IN_FLIGHT = int(os.getenv('CIRCUIT_MAX_IN_FLIGHT', '50'))
+
+# ===== Configuración de los reintentos =====
+RETRY_MAX_ATTEMPTS = int(os.getenv('UPSTREAM_MAX_RETRIES', '2'))
+RETRY_BACKOFF = float(os.getenv('UPSTREAM_RETRY_BACKOFF', '0.05'))       # segundos
+# Los reintentos no pueden superar este porcentaje de las peticiones (más un mínimo por segundo)
+RETRY_BUDGET_RATIO = float(os.getenv('RETRY_BUDGET_RATIO', '0.1'))
+RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv('RETRY_BUDGET_MIN_PER_SECOND', '1'))
+RETRY_BUDGET_WINDOW = int(os.getenv('RETRY_BUDGET_WINDOW', '10'))        # segundos
+
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """El servicio está marcado como caído o saturado; se responde 503 sin llamarlo"""
+
+    def __init__(self, service, reason, retry_after):
+        super().__init__(f"{service}: {reason}")
+        self.service = service
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Circuit breaker por servicio según tasa de fallos y de llamadas lentas.
+
+    closed: las llamadas pasan y se anotan en una ventana de las últimas N.
+    open: se rechazan durante ``open_seconds``.
+    half_open: pasan unas pocas llamadas de prueba; si van bien se cierra.
+    """
+
+    def __init__(self, name, window=CIRCUIT_WINDOW, min_calls=CIRCUIT_MIN_CALLS,
+                 failure_rate=CIRCUIT_FAILURE_RATE, slow_call_ms=CIRCUIT_SLOW_CALL_MS,
+                 slow_rate=CIRCUIT_SLOW_RATE, open_seconds=CIRCUIT_OPEN_SECONDS,
+                 half_open_calls=CIRCUIT_HALF_OPEN_CALLS, max_in_flight=CIRCUIT_MAX_IN_FLIGHT):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_ms = slow_call_ms
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.max_in_flight = max_in_flight
+
+        self._calls = deque(maxlen=window)   # (fallo, lenta)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._half_open_round = 0    # cambia en cada paso a half_open: identifica las pruebas
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._rejected = 0
+        self._opened = 0
+
+    def before_call(self):
+        """Reserva un hueco para la llamada o lanza CircuitOpenError.
+
+        Devuelve el turno de prueba si la llamada entra como prueba en half_open
+        (o None); hay que pasarlo a ``after_call``.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._state == OPEN:
+                remaining = self._opened_at + self.open_seconds - now
+                if remaining > 0:
+                    self._rejected += 1
+                    raise CircuitOpenError(self.name, "circuito abierto", remaining)
+                self._state = HALF_OPEN
+                self._probes = 0
+                self._half_open_round += 1
+            if self._in_flight >= self.max_in_flight:
+                self._rejected += 1
+                raise CircuitOpenError(self.name, "demasiadas peticiones en curso", 1)
+            probe = None
+            if self._state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    self._rejected += 1
+                    raise CircuitOpenError(self.name, "circuito en prueba", self.open_seconds)
+                self._probes += 1
+                probe = self._half_open_round
+            self._in_flight += 1
+            return probe
+
+    def after_call(self, failed, duration_ms, probe=None):
+        with self._lock:
+            self._in_flight -= 1
+            slow = duration_ms >= self.slow_call_ms
+            if self._state == HALF_OPEN:
+                # Solo cuentan las pruebas de este half_open; las llamadas admitidas
+                # antes (con el circuito cerrado) o en un half_open anterior no
+                if probe != self._half_open_round:
+                    return
+                self._probes -= 1
+                if failed or slow:
+                    self._trip()
+                else:
+                    self._state = CLOSED
+                    self._calls.clear()
+                return
+            if self._state == OPEN:
+                return
+
+            self._calls.append((failed, slow))
+            total = len(self._calls)
+            if total < self.min_calls:
+                return
+            failures = sum(1 for f, _ in self._calls if f)
+            slows = sum(1 for _, s in self._calls if s)
+            if failures / total >= self.failure_rate or slows / total >= self.slow_rate:
+                self._trip()
+
+    def _trip(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._opened += 1
+        self._calls.clear()
+
+    def stats(self):
+        with self._lock:
+            total = len(self._calls)
+            return {
+                "state": self._state,
+                "in_flight": self._in_flight,
+                "max_in_flight": self.max_in_flight,
+                "window_calls": total,
+                "window_failures": sum(1 for f, _ in self._calls if f),
+                "window_slow": sum(1 for _, s in self._calls if s),
+                "times_opened": self._opened,
+                "rejected": self._rejected,
+            }
+
+
+class RetryBudget:
+    """Limita los reintentos a un porcentaje de las peticiones recientes.
+
+    Evita que, con un servicio degradado, los reintentos multipliquen la carga.
+    Cuenta peticiones y reintentos en buckets de un segundo.
+    """
+
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, min_per_second=RETRY_BUDGET_MIN_PER_SECOND,
+                 window=RETRY_BUDGET_WINDOW):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window = window
+        self._buckets = deque()      # [segundo, peticiones, reintentos]
+        self._lock = threading.Lock()
+        self._denied = 0
+
+    def _bucket(self):
+        now = int(time.monotonic())
+        while self._buckets and self._buckets[0][0] <= now - self.window:
+            self._buckets.popleft()
+        if not self._buckets or self._buckets[-1][0] != now:
+            self._buckets.append([now, 0, 0])
+        return self._buckets[-1]
+
+    def record_request(self):
+        with self._lock:
+            self._bucket()[1] += 1
+
+    def try_retry(self):
+        """True (y lo descuenta) si queda presupuesto para un reintento"""
+        with self._lock:
+            bucket = self._bucket()
+            requests = sum(b[1] for b in self._buckets)
+            retries = sum(b[2] for b in self._buckets)
+            allowed = requests * self.ratio + self.min_per_second * self.window
+            if retries + 1 > allowed:
+                self._denied += 1
+                return False
+            bucket[2] += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ratio": self.ratio,
+                "requests": sum(b[1] for b in self._buckets),
+                "retries": sum(b[2] for b in self._buckets),
+                "denied": self._denied,
+            }
@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from limits.storage import storage_from_string
+
+from common.ratelimit import RATELIMIT_STORAGE_URI, SQLiteStorage
+
+# ===== Configuración de la caché de respuestas =====
+CACHE_MAX_BYTES = int(os.getenv('GATEWAY_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+CACHE_MAX_ENTRY_BYTES = int(os.getenv('GATEWAY_CACHE_MAX_ENTRY_BYTES', str(1024 * 1024)))
+# Generación de cada namespace, compartida por todos los workers (por defecto el almacenamiento del rate limit)
+CACHE_GENERATIONS_URI = os.getenv('GATEWAY_CACHE_GENERATIONS_URI', RATELIMIT_STORAGE_URI)
+# Mayor que cualquier TTL de la caché: cuando un contador caduca ya no queda ninguna copia que lo use
+CACHE_GENERATION_EXPIRY = 86400
+# Varios workers (gunicorn exporta SERVER_SOFTWARE; WEB_CONCURRENCY es su número de workers)
+MULTIPLE_WORKERS = (os.getenv('SERVER_SOFTWARE', '').startswith('gunicorn')
+                    or int(os.getenv('WEB_CONCURRENCY', '1')) > 1)
+
+CachedResponse = namedtuple('CachedResponse', 'status headers body etag expires_at namespace generation')
+
+logger = logging.getLogger(__name__)
+
+
+def body_etag(body):
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+class SharedGenerations:
+    """Generación de cada namespace en un almacenamiento de ``limits`` (sqlite://, redis://, memory://).
+
+    Invalidar un namespace incrementa su contador. Con sqlite:// o redis:// lo
+    ven todos los workers; con memory:// solo el proceso actual.
+    """
+
+    PREFIX = 'gateway-cache/'
+
+    def __init__(self, uri=CACHE_GENERATIONS_URI, expiry=CACHE_GENERATION_EXPIRY):
+        scheme = uri.split('://', 1)[0]
+        # Sin agrupar escrituras: otro worker debe ver la invalidación en su siguiente lectura
+        self.storage = SQLiteStorage(uri, batch_ms=0) if scheme == 'sqlite' else storage_from_string(uri)
+        self.shared = scheme != 'memory'
+        self.expiry = expiry
+
+    def get(self, namespace):
+        return self.storage.get(self.PREFIX + namespace)
+
+    def bump(self, namespace):
+        self.storage.incr(self.PREFIX + namespace, self.expiry)
+
+
+class ResponseCache:
+    """Caché LRU de respuestas GET limitada por tamaño total (bytes de cuerpo).
+
+    Las claves se agrupan por ``namespace`` (servicio, o servicio y usuario) para
+    invalidarlas todas cuando una escritura pasa por el gateway. Los cuerpos se
+    guardan en cada worker, pero la generación de cada namespace está en
+    ``generations`` (compartida): una copia se sirve solo si su generación sigue
+    siendo la actual, así que una escritura atendida por otro worker también la
+    invalida. Una respuesta leída antes de una invalidación no se guarda.
+
+    Con generaciones que no se comparten (``memory://``) y varios workers la caché
+    se desactiva (``enabled``).
+    """
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, max_entry_bytes=CACHE_MAX_ENTRY_BYTES, generations=None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.generations = generations or SharedGenerations()
+        self.enabled = self.generations.shared or not MULTIPLE_WORKERS
+        if not self.enabled:
+            logger.warning("Caché de respuestas desactivada: varios workers y GATEWAY_CACHE_GENERATIONS_URI "
+                           "en memoria (usar sqlite:// o redis://)")
+        self._entries = OrderedDict()
+        self._namespaces = {}       # namespace -> claves guardadas
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._not_modified = 0
+        self._stores = 0
+        self._evictions = 0
+        self._invalidations = 0
+        self._oversized = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= now:
+                if entry is not None:
+                    self._remove(key)
+                self._misses += 1
+                return None
+
+        # Fuera del lock: la generación puede leerse de SQLite o Redis
+        current = self.generations.get(entry.namespace) == entry.generation
+        with self._lock:
+            if not current:
+                # Invalidada por una escritura atendida en otro worker
+                if self._entries.get(key) is entry:
+                    self._remove(key)
+                    self._invalidations += 1
+                self._misses += 1
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self._hits += 1
+            return entry
+
+    def count_oversized(self):
+        # Respuesta mayor que max_entry_bytes: se transmitió sin guardarla
+        with self._lock:
+            self._oversized += 1
+
+    def generation(self, namespace):
+        return self.generations.get(namespace)
+
+    def put(self, key, namespace, generation, status, headers, body, ttl):
+        """Guarda la respuesta si cabe y el namespace no se invalidó mientras tanto"""
+        etag = next((value for name, value in headers if name.lower() == 'etag'), None) or body_etag(body)
+        headers = [(name, value) for name, value in headers if name.lower() != 'etag']
+        entry = CachedResponse(status, headers, body, etag, time.monotonic() + ttl, namespace, generation)
+        if len(body) > self.max_entry_bytes:
+            return entry
+        if self.generations.get(namespace) != generation:
+            return entry
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._namespaces.setdefault(namespace, set()).add(key)
+            self._bytes += len(body)
+            self._stores += 1
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+        return entry
+
+    def invalidate(self, namespace):
+        self.generations.bump(namespace)
+        with self._lock:
+            for key in self._namespaces.pop(namespace, set()):
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._bytes -= len(entry.body)
+                    self._invalidations += 1
+
+    def count_not_modified(self):
+        with self._lock:
+            self._not_modified += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+        keys = self._namespaces.get(entry.namespace)
+        if keys is not None:
+            keys.discard(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "shared_generations": self.generations.shared,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+                "not_modified": self._not_modified,
+                "stores": self._stores,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "oversized": self._oversized,
+            }
@@ -0,0 +1,54 @@
+import json
+import os
+
+# ===== Configuración de rutas y servicios =====
+# Tabla compartida por el gateway WSGI (app.py) y el ASGI (asgi_app.py).
+# Añadir un servicio, una ruta o una instancia solo requiere editar el JSON.
+GATEWAY_CONFIG = os.getenv(
+    'GATEWAY_CONFIG', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gateway.json')
+)
+
+
+def env_key(value):
+    return value.strip('/').upper().replace('/', '_').replace('-', '_')
+
+
+def load_config(path=GATEWAY_CONFIG):
+    """Lee el JSON y aplica las variables de entorno.
+
+    - ``<SERVICIO>_URL`` (p. ej. ``AUTH_SERVICE_URL``): instancias separadas por comas.
+    - ``GATEWAY_CACHE_TTL_<PREFIJO>`` (p. ej. ``GATEWAY_CACHE_TTL_TASKS``): TTL de la caché.
+    """
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+
+    services = {}
+    for name, spec in config['services'].items():
+        urls = os.getenv(env_key(name) + '_URL')
+        instances = [url.strip() for url in urls.split(',') if url.strip()] if urls else spec['instances']
+        services[name] = {"instances": instances, "balancer": spec.get('balancer', 'round_robin')}
+
+    routes = []
+    for spec in config['routes']:
+        if spec['service'] not in services:
+            raise ValueError(f"La ruta {spec['prefix']} usa un servicio no definido: {spec['service']}")
+        cache_ttl = os.getenv('GATEWAY_CACHE_TTL_' + env_key(spec['prefix']))
+        routes.append({
+            "prefix": '/' + spec['prefix'].strip('/'),
+            "service": spec['service'],
+            "upstream_prefix": spec.get('upstream_prefix', ''),
+            "methods": spec['methods'],
+            "limit": spec['limit'],
+            # Segundos; 0 = sin caché de respuestas
+            "cache_ttl": float(cache_ttl if cache_ttl is not None else spec.get('cache_ttl', 0)),
+            # shared: una escritura invalida todo el servicio; user: solo las copias del usuario
+            "cache_scope": spec.get('cache_scope', 'shared'),
+            # Ruta bajo el prefijo -> servicios cuya caché invalida una escritura con éxito
+            "invalidates": spec.get('invalidates', {}),
+            # Nombre de la vista: el rate limit se cuenta por vista
+            "endpoint": env_key(spec['prefix']).lower() + '_proxy',
+        })
+    return config.get('default_limits', ["100 per minute"]), services, routes
+
+
+DEFAULT_LIMITS, SERVICES, ROUTES = load_config()
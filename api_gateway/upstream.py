@@ -0,0 +1,173 @@
+import os
+import random
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from common.metrics import count_http_call, observe_stage
+from resilience import (
+    CircuitBreaker, RetryBudget, IDEMPOTENT_METHODS, RETRY_MAX_ATTEMPTS, RETRY_BACKOFF
+)
+
+# ===== Configuración del cliente upstream =====
+# Timeouts en segundos (conexión, lectura) y tamaño máximo del pool por servicio
+CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', '2'))
+READ_TIMEOUT = float(os.getenv('UPSTREAM_READ_TIMEOUT', '10'))
+POOL_MAXSIZE = int(os.getenv('UPSTREAM_POOL_MAXSIZE', '20'))
+# Si es true, cuando el pool está lleno se espera una conexión libre en vez de abrir otra
+POOL_BLOCK = os.getenv('UPSTREAM_POOL_BLOCK', 'false').lower() == 'true'
+# Respuestas del servicio que se reintentan (solo métodos idempotentes)
+RETRY_STATUSES = {502, 503}
+# Cabecera Server-Timing con el tiempo propio del gateway y el del servicio
+SERVER_TIMING = os.getenv('GATEWAY_SERVER_TIMING', 'true').lower() == 'true'
+
+
+def server_timing(total_ms, upstream_ms=None):
+    """Valor de Server-Timing; upstream = hasta recibir las cabeceras del servicio"""
+    if upstream_ms is None:
+        return f"gateway;dur={total_ms:.1f}"
+    return f"gateway;dur={max(0.0, total_ms - upstream_ms):.1f}, upstream;dur={upstream_ms:.1f}"
+
+
+def _idle_connections(pool):
+    # La cola de urllib3 se rellena con None; solo cuentan las conexiones reales
+    if not pool.pool:
+        return 0
+    return sum(1 for conn in list(pool.pool.queue) if conn is not None)
+
+
+class UpstreamClient:
+    """Cliente keep-alive hacia un microservicio, con un pool por instancia.
+
+    La instancia se elige en cada intento con el balanceador del ``Service``
+    (registry.py), así un reintento puede ir a otra instancia. Cada servicio
+    tiene su circuit breaker (lanza ``CircuitOpenError`` sin llamar al servicio)
+    y su presupuesto de reintentos para métodos idempotentes.
+    """
+
+    def __init__(self, service, pool_maxsize=POOL_MAXSIZE, pool_block=POOL_BLOCK,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT):
+        self.service = service
+        self.name = service.name
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_maxsize = pool_maxsize
+
+        self.adapter = HTTPAdapter(
+            pool_connections=len(service.instances),
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            max_retries=0
+        )
+        self.session = requests.Session()
+        # No leer proxies del entorno en cada request ni compartir cookies entre clientes
+        self.session.trust_env = False
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+
+        self.breaker = CircuitBreaker(self.name)
+        self.retry_budget = RetryBudget()
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._total = 0
+        self._errors = 0
+        self._retries = 0
+
+    def _may_retry(self, method, attempt):
+        if method.upper() not in IDEMPOTENT_METHODS or attempt >= RETRY_MAX_ATTEMPTS:
+            return False
+        if not self.retry_budget.try_retry():
+            return False
+        with self._lock:
+            self._retries += 1
+        return True
+
+    def request(self, method, path, **kwargs):
+        """Envía la petición al servicio reutilizando conexiones del pool"""
+        path = path.lstrip('/')
+        kwargs.setdefault('timeout', self.timeout)
+
+        probe = self.breaker.before_call()
+        self.retry_budget.record_request()
+        with self._lock:
+            self._in_flight += 1
+            self._total += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        failed = True
+        start = time.perf_counter()
+        try:
+            attempt = 0
+            while True:
+                instance = self.service.acquire()
+                attempt_start = time.perf_counter()
+                try:
+                    resp = self.session.request(method, f"{instance.url}/{path}", **kwargs)
+                except requests.ConnectionError:
+                    count_http_call(self.name, 'connection_error')
+                    self.service.release(instance, failed=True)
+                    # Error de conexión: solo se reintentan métodos idempotentes
+                    if not self._may_retry(method, attempt):
+                        raise
+                except requests.RequestException as e:
+                    count_http_call(self.name, 'timeout' if isinstance(e, requests.Timeout) else 'error')
+                    self.service.release(instance, failed=True)
+                    raise
+                else:
+                    observe_stage('upstream', time.perf_counter() - attempt_start)
+                    count_http_call(self.name, resp.status_code)
+                    # Con stream=True la instancia se libera al recibir las cabeceras
+                    self.service.release(instance, failed=resp.status_code >= 500)
+                    if resp.status_code not in RETRY_STATUSES or not self._may_retry(method, attempt):
+                        failed = resp.status_code >= 500
+                        return resp
+                    resp.close()
+                # Backoff exponencial con jitter
+                time.sleep(RETRY_BACKOFF * (2 ** attempt) * (0.5 + random.random()))
+                attempt += 1
+        except requests.RequestException:
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            self.breaker.after_call(failed, (time.perf_counter() - start) * 1000, probe)
+            with self._lock:
+                self._in_flight -= 1
+
+    def stats(self):
+        """Uso del pool: conexiones abiertas, reutilizadas y peticiones en curso"""
+        pools = []
+        for key in list(self.adapter.poolmanager.pools.keys()):
+            pool = self.adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            pools.append({
+                "host": f"{pool.host}:{pool.port}",
+                "connections_created": pool.num_connections,
+                "requests_sent": pool.num_requests,
+                "idle_connections": _idle_connections(pool),
+            })
+
+        with self._lock:
+            return {
+                "service": self.name,
+                "balancer": self.service.balancer,
+                "pool_maxsize": self.pool_maxsize,
+                "timeout": {"connect": self.timeout[0], "read": self.timeout[1]},
+                "in_flight": self._in_flight,
+                "peak_in_flight": self._peak_in_flight,
+                "total_requests": self._total,
+                "errors": self._errors,
+                "retries": self._retries,
+                "circuit": self.breaker.stats(),
+                "retry_budget": self.retry_budget.stats(),
+                "pools": pools,
+                "instances": self.service.stats()["instances"],
+            }
+
+    def close(self):
+        self.session.close()
@@ -1,53 +1,153 @@
-from flask import Flask, request, jsonify
-import sqlite3
+from flask import Flask, Response, request, jsonify
 from dotenv import load_dotenv
 import os
+import sys
 import jwt
+import json
+import time
+import hmac
+import hashlib
+import threading
 import datetime
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeout
 from flask_cors import CORS
-import pyotp
-import qrcode
 import io
 import base64
 import requests
-from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 ENV_PATH = os.path.join(BASE_DIR, '.env')
 load_dotenv(ENV_PATH)
+sys.path.insert(0, BASE_DIR)
+
+from common.storage import Database
+from common.ratelimit import create_limiter
+from common import metrics
+from common.server import register_health, require_resources, run
+from common.lazy import LazyResource
+import qr_render
+from otp_cache import OTPVerifierCache, ReplayGuard, matching_step
 
 app = Flask(__name__)
 CORS(app)
 
 # ======== Rate Limiting ========
-limiter = Limiter(
+limiter = create_limiter(
+    app,
     get_remote_address,          # Limita por IP
-    app=app,
-    default_limits=["100 per minute"]  # Límite global
+    default_limits=["100 per minute"],  # Límite global
+    key_prefix='auth-service'
 )
+# Métricas Prometheus en /metrics y profiler en /debug/profile
+metrics.init_app(app, 'auth-service', limiter)
 
-DB_FILE = os.path.join(BASE_DIR, 'auth.db')
+DB_FILE = os.getenv('AUTH_DB_FILE', os.path.join(BASE_DIR, 'auth.db'))
+db = Database(DB_FILE)
 SECRET_KEY = os.getenv('SECRET_KEY')
-USER_SERVICE_URL = "http://localhost:5002/users"
+USER_SERVICE_URL = os.getenv('USER_SERVICE_URL', "http://localhost:5002").split(',')[0].rstrip('/') + "/users"
+USER_LOOKUP_URL = f"{USER_SERVICE_URL}/lookup"
 
 if not SECRET_KEY:
     raise ValueError("No se encontró la SECRET_KEY en .env")
 
+# ===== QR del OTP =====
+# inline: el registro devuelve el PNG en base64 | lazy: solo una referencia firmada
+# y el QR se genera bajo demanda en GET /otp-qr/<ref> (pool de procesos + caché)
+OTP_QR_MODE = os.getenv('OTP_QR_MODE', 'inline').lower()
+OTP_QR_FORMAT = os.getenv('OTP_QR_FORMAT', 'png').lower()          # png | svg
+OTP_QR_REF_TTL = int(os.getenv('OTP_QR_REF_TTL', '900'))            # segundos
+OTP_QR_CACHE_SIZE = int(os.getenv('OTP_QR_CACHE_SIZE', '256'))
+OTP_QR_RENDER_TIMEOUT = float(os.getenv('OTP_QR_RENDER_TIMEOUT', '10'))
+OTP_ISSUER = "TASK APP"
+
 # Inicializar DB de auth solo para OTP
 def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS otp_data (
-            user_id INTEGER PRIMARY KEY,
-            otp_secret TEXT NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-init_db()
+    with db.transaction() as tx:
+        tx.execute('''
+            CREATE TABLE IF NOT EXISTS otp_data (
+                user_id INTEGER PRIMARY KEY,
+                otp_secret TEXT NOT NULL
+            )
+        ''')
+        # Último paso TOTP aceptado por usuario, compartido por todos los workers
+        ReplayGuard.create_table(tx)
+
+# El esquema se crea en la primera petición (y se reintenta si falla), no al importar
+schema = LazyResource('auth-schema', init_db)
+require_resources(app, schema)
+
+def load_otp_secret(user_id):
+    row = db.query_one('SELECT otp_secret FROM otp_data WHERE user_id = ?', (user_id,))
+    if not row:
+        return None
+    secret = row[0].decode() if isinstance(row[0], (bytes, bytearray)) else str(row[0])
+    return secret.strip()
+
+# El login no consulta auth.db mientras el verificador del usuario esté en caché
+otp_verifiers = OTPVerifierCache(load_otp_secret)
+otp_replay_guard = ReplayGuard(db)
+
+def call_user_service(method, url, **kwargs):
+    """Llamada al User Service medida como etapa ``user_service_http``"""
+    status = 'error'
+    try:
+        with metrics.stage('user_service_http'):
+            resp = requests.request(method, url, **kwargs)
+        status = resp.status_code
+        return resp
+    finally:
+        metrics.count_http_call('user-service', status)
+
+def otp_uri(secret, username):
+    import pyotp
+    return pyotp.TOTP(secret).provisioning_uri(name=username, issuer_name=OTP_ISSUER)
+
+def b64(raw):
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def sign(message):
+    return b64(hmac.new(SECRET_KEY.encode(), message, hashlib.sha256).digest()[:16])
+
+def make_qr_ref(user_id, username):
+    """Referencia opaca y firmada (caduca en OTP_QR_REF_TTL) para descargar el QR"""
+    payload = json.dumps({"u": user_id, "n": username, "e": int(time.time()) + OTP_QR_REF_TTL},
+                         separators=(',', ':')).encode()
+    return f"{b64(payload)}.{sign(payload)}"
+
+def read_qr_ref(ref):
+    """(user_id, username) de una referencia válida y vigente, o None"""
+    try:
+        encoded, signature = ref.split('.')
+        payload = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+        if not hmac.compare_digest(signature, sign(payload)):
+            return None
+        data = json.loads(payload)
+    except (ValueError, TypeError):
+        return None
+    if data.get("e", 0) < time.time():
+        return None
+    return data["u"], data["n"]
+
+# Caché LRU de imágenes ya generadas: (user_id, formato) -> (etag, bytes)
+qr_cache = OrderedDict()
+qr_cache_lock = threading.Lock()
+
+def cached_qr(user_id, fmt, etag):
+    with qr_cache_lock:
+        entry = qr_cache.get((user_id, fmt))
+        if entry and entry[0] == etag:
+            qr_cache.move_to_end((user_id, fmt))
+            return entry[1]
+        return None
+
+def store_qr(user_id, fmt, etag, image):
+    with qr_cache_lock:
+        qr_cache[(user_id, fmt)] = (etag, image)
+        qr_cache.move_to_end((user_id, fmt))
+        while len(qr_cache) > OTP_QR_CACHE_SIZE:
+            qr_cache.popitem(last=False)
 
 # ===== Registro =====
 @app.route('/register', methods=['POST'])
@@ -58,41 +158,87 @@ def register():
         return jsonify({"error": "Faltan username, password o email"}), 400
 
     try:
-        resp = requests.get(USER_SERVICE_URL)
+        resp = call_user_service('GET', USER_LOOKUP_URL, params={"email": data['email']})
         resp.raise_for_status()
-        users = resp.json().get("users", [])
-        if any(u["email"] == data['email'] for u in users):
+        if resp.json().get("users"):
             return jsonify({"error": "El correo electrónico ya está registrado"}), 409
     except requests.RequestException as e:
         return jsonify({"error": "No se pudo conectar al User Service", "detalle": str(e)}), 500
 
     try:
-        resp = requests.post(USER_SERVICE_URL, json=data)
+        resp = call_user_service('POST', USER_SERVICE_URL, json=data)
         resp.raise_for_status()
         user_info = resp.json()["user"]
     except requests.RequestException as e:
         return jsonify({"error": "Error creando usuario en User Service", "detalle": str(e)}), 400
 
+    import pyotp
     otp_secret = pyotp.random_base32()
-    totp_uri = pyotp.TOTP(otp_secret).provisioning_uri(
-        name=data['username'], issuer_name="TASK APP"
-    )
+    db.execute('INSERT OR REPLACE INTO otp_data (user_id, otp_secret) VALUES (?, ?)',
+               (user_info['id'], otp_secret))
+    otp_verifiers.invalidate(user_info['id'])
+
+    if OTP_QR_MODE == 'lazy':
+        ref = make_qr_ref(user_info['id'], data['username'])
+        return jsonify({
+            "message": "Usuario registrado exitosamente",
+            "user": user_info,
+            "otp_qr_ref": ref,
+            "otp_qr_url": f"/auth/otp-qr/{ref}"
+        }), 201
+
+    # Import diferido: qrcode/PIL solo se cargan si se genera un QR en línea
+    import qrcode
     buf = io.BytesIO()
-    qrcode.make(totp_uri).save(buf)
+    with metrics.stage('qr_render'):
+        qrcode.make(otp_uri(otp_secret, data['username'])).save(buf)
     img_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
 
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute('INSERT OR REPLACE INTO otp_data (user_id, otp_secret) VALUES (?, ?)',
-                       (user_info['id'], otp_secret))
-        conn.commit()
-
     return jsonify({
         "message": "Usuario registrado exitosamente",
         "user": user_info,
         "otp_qr": img_base64
     }), 201
 
+# ===== QR del OTP bajo demanda (OTP_QR_MODE=lazy) =====
+@app.route('/otp-qr/<ref>', methods=['GET'])
+@limiter.limit("30 per minute")
+def otp_qr(ref):
+    identity = read_qr_ref(ref)
+    if not identity:
+        return jsonify({"error": "Referencia de QR inválida o caducada"}), 404
+    user_id, username = identity
+
+    fmt = request.args.get('format', OTP_QR_FORMAT).lower()
+    if fmt not in qr_render.CONTENT_TYPES:
+        return jsonify({"error": "format debe ser png o svg"}), 400
+
+    secret = load_otp_secret(user_id)
+    if not secret:
+        return jsonify({"error": "No se encontró OTP para este usuario"}), 404
+
+    uri = otp_uri(secret, username)
+    # El ETag cambia si se regenera el secreto; no revela el secreto
+    etag = hashlib.sha256(f"{uri}|{fmt}".encode()).hexdigest()[:32]
+    headers = {
+        "ETag": f'"{etag}"',
+        # Contiene el secreto del OTP: solo caché del navegador, nunca compartida
+        "Cache-Control": f"private, max-age={OTP_QR_REF_TTL}",
+    }
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+
+    image = cached_qr(user_id, fmt, etag)
+    if image is None:
+        try:
+            with metrics.stage('qr_render'):
+                image = qr_render.submit(uri, fmt).result(timeout=OTP_QR_RENDER_TIMEOUT)
+        except FutureTimeout:
+            return jsonify({"error": "No se pudo generar el QR a tiempo"}), 503
+        store_qr(user_id, fmt, etag, image)
+
+    return Response(image, mimetype=qr_render.CONTENT_TYPES[fmt], headers=headers)
+
 # ===== Login =====
 @app.route('/login', methods=['POST'])
 @limiter.limit("10 per minute")  # Máximo 10 logins por IP por minuto
@@ -106,37 +252,29 @@ def login():
     code = str(data.get('otp', '')).strip()
 
     try:
-        resp = requests.get(USER_SERVICE_URL)
+        resp = call_user_service('GET', USER_LOOKUP_URL, params={"identifier": identifier})
         resp.raise_for_status()
         users = resp.json().get("users", [])
-        user = next((u for u in users
-                     if (u.get("username") == identifier or u.get("email") == identifier)
-                     and u.get("password") == password), None)
+        user = next((u for u in users if u.get("password") == password), None)
     except Exception as e:
         return jsonify({"error": "No se pudo conectar al User Service", "detalle": str(e)}), 500
 
     if not user:
         return jsonify({"error": "Credenciales inválidas"}), 401
 
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            'SELECT otp_secret FROM otp_data WHERE user_id = ?', (user["id"],))
-        row = cursor.fetchone()
-
-    if not row:
+    totp = otp_verifiers.get(user["id"])
+    if not totp:
         return jsonify({"error": "No se encontró OTP para este usuario"}), 401
 
-    secret_raw = row[0]
-    secret = secret_raw.decode() if isinstance(secret_raw, (bytes, bytearray)) else str(secret_raw)
-    secret = secret.strip()
-
     if not code.isdigit() or len(code) != 6:
         return jsonify({"error": "Formato de OTP inválido"}), 400
 
-    totp = pyotp.TOTP(secret)
-    if not totp.verify(code, valid_window=1):
+    with metrics.stage('otp_verify'):
+        step = matching_step(totp, code)
+    if step is None:
         return jsonify({"error": "Código OTP incorrecto"}), 401
+    if not otp_replay_guard.accept(user["id"], step):
+        return jsonify({"error": "Código OTP ya utilizado"}), 401
 
     payload = {
         'user_id': user["id"],
@@ -146,5 +284,20 @@ def login():
     token = jwt.encode(payload, SECRET_KEY, algorithm='HS256')
     return jsonify({"mensaje": "Login exitoso", "token": token}), 200
 
+# ===== Estadísticas de la base de datos =====
+@app.route('/storage/stats', methods=['GET'])
+@metrics.internal_endpoint(limiter)
+def storage_stats():
+    return jsonify(db.stats())
+
+# ===== Estadísticas de la caché de OTP =====
+@app.route('/otp/stats', methods=['GET'])
+@metrics.internal_endpoint(limiter)
+def otp_stats():
+    return jsonify({"verifiers": otp_verifiers.stats(), "replay_guard": otp_replay_guard.stats()})
+
+# Disponibilidad del servicio y de su base de datos (start_services.sh espera a este endpoint)
+register_health(app, limiter, lambda: (schema.get(), db.query_one('SELECT 1')))
+
 if __name__ == '__main__':
-    app.run(port=5001, debug=True)
+    run(app, 5001)
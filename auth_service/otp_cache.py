@@ -0,0 +1,126 @@
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# ===== Caché de verificadores TOTP =====
+OTP_CACHE_SIZE = int(os.getenv('OTP_CACHE_SIZE', '10000'))
+# Otro worker puede reescribir el secreto (nuevo registro): la entrada caduca igualmente
+OTP_CACHE_TTL = float(os.getenv('OTP_CACHE_TTL', '300'))   # segundos
+OTP_VALID_WINDOW = int(os.getenv('OTP_VALID_WINDOW', '1'))  # pasos de 30 s aceptados a cada lado
+
+
+class OTPVerifierCache:
+    """LRU user_id -> ``pyotp.TOTP`` ya preparado.
+
+    ``loader(user_id)`` devuelve el secreto (o None) y solo se llama en un fallo
+    de caché. ``invalidate`` se usa cuando el registro reescribe el secreto.
+    """
+
+    def __init__(self, loader, maxsize=OTP_CACHE_SIZE, ttl=OTP_CACHE_TTL):
+        self.loader = loader
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._cache.move_to_end(user_id)
+                self._hits += 1
+                return entry[0]
+            self._misses += 1
+
+        secret = self.loader(user_id)
+        if not secret:
+            return None
+        import pyotp
+        totp = pyotp.TOTP(secret)
+
+        with self._lock:
+            self._cache[user_id] = (totp, now + self.ttl)
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return totp
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._cache.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._cache),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+
+
+def matching_step(totp, code, valid_window=OTP_VALID_WINDOW, for_time=None):
+    """Paso de tiempo (contador TOTP) al que corresponde el código, o None"""
+    now = time.time() if for_time is None else for_time
+    current = int(now // totp.interval)
+    for offset in range(-valid_window, valid_window + 1):
+        if hmac.compare_digest(totp.generate_otp(current + offset), code):
+            return current + offset
+    return None
+
+
+class ReplayGuard:
+    """Impide reutilizar un código OTP ya aceptado mientras sigue siendo válido.
+
+    Por usuario solo se guarda el último paso aceptado; un código de ese paso o
+    de uno anterior se rechaza. El paso vive en la base del servicio (tabla
+    ``otp_used_steps``) y se actualiza con un único upsert condicional, así que
+    la comprobación es atómica entre todos los workers: un código aceptado en
+    uno se rechaza en los demás. Hay una fila por usuario que ha iniciado sesión
+    y el upsert la reescribe, así que no hace falta borrar nada en la petición.
+    """
+
+    def __init__(self, db, valid_window=OTP_VALID_WINDOW, interval=30):
+        self.db = db
+        self.valid_window = valid_window
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._rejected = 0
+
+    @staticmethod
+    def create_table(tx):
+        tx.execute('''
+            CREATE TABLE IF NOT EXISTS otp_used_steps (
+                user_id INTEGER PRIMARY KEY,
+                step INTEGER NOT NULL
+            )
+        ''')
+
+    def accept(self, user_id, step):
+        """True si el código del paso ``step`` no se había usado; lo marca como usado"""
+        # Solo escribe si el paso es posterior al guardado: rowcount 0 = reutilizado
+        cursor = self.db.execute('''
+            INSERT INTO otp_used_steps (user_id, step) VALUES (?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET step = excluded.step WHERE excluded.step > step
+        ''', (user_id, step))
+        accepted = cursor.rowcount == 1
+        if not accepted:
+            with self._lock:
+                self._rejected += 1
+        return accepted
+
+    def stats(self):
+        # Solo cuentan los pasos que todavía caen en la ventana de algún código válido
+        oldest_valid = int(time.time() // self.interval) - self.valid_window
+        tracked = self.db.query_one('SELECT COUNT(*) FROM otp_used_steps WHERE step >= ?', (oldest_valid,))[0]
+        with self._lock:
+            return {
+                "tracked_users": tracked,
+                "rejected_replays": self._rejected,
+            }
@@ -0,0 +1,66 @@
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# ===== Renderizado de códigos QR fuera del hilo de la petición =====
+OTP_QR_WORKERS = int(os.getenv('OTP_QR_WORKERS', '2'))
+OTP_QR_BOX_SIZE = int(os.getenv('OTP_QR_BOX_SIZE', '6'))   # píxeles por módulo (PNG)
+# Los procesos del pool no se crean con fork: el servidor tiene hilos (locks, conexiones)
+# que no deben copiarse a medio usar. forkserver si el sistema lo tiene, si no spawn.
+OTP_QR_START_METHOD = os.getenv(
+    'OTP_QR_START_METHOD',
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+
+CONTENT_TYPES = {
+    'svg': 'image/svg+xml',
+    'png': 'image/png',
+}
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # Un fork con el lock tomado lo dejaría bloqueado para siempre en el hijo
+    global _pool_lock
+    _pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def render_qr(data, fmt):
+    """Bytes del QR en SVG (trazado único, sin fondo) o PNG de 1 bit"""
+    # Import diferido: solo los procesos del pool cargan qrcode/PIL
+    import qrcode
+    import qrcode.image.svg
+
+    qr = qrcode.QRCode(border=2, box_size=OTP_QR_BOX_SIZE,
+                       error_correction=qrcode.constants.ERROR_CORRECT_L)
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    buf = io.BytesIO()
+    if fmt == 'svg':
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buf)
+    else:
+        qr.make_image().get_image().convert('1').save(buf, format='PNG', optimize=True)
+    return buf.getvalue()
+
+
+def submit(data, fmt):
+    """Encola el renderizado en el pool de procesos; devuelve un Future"""
+    global _pool, _pool_pid
+    # Un pool creado antes de un fork no sirve en el proceso hijo
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            # Registros simultáneos: solo el primero crea el pool
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ProcessPoolExecutor(max_workers=OTP_QR_WORKERS,
+                                            mp_context=multiprocessing.get_context(OTP_QR_START_METHOD))
+                _pool_pid = os.getpid()
+    return _pool.submit(render_qr, data, fmt)
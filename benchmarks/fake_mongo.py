@@ -0,0 +1,353 @@
+"""MongoDB en memoria para la prueba de carga, sobre mongomock.
+
+El gateway y el servicio de logs son procesos distintos, así que un mongomock
+dentro de cada uno no compartiría datos: este script atiende el protocolo de
+MongoDB (OP_MSG y el saludo inicial con OP_QUERY) en un puerto local y ejecuta
+cada comando sobre una única instancia de mongomock. Cubre los comandos que
+usan el gateway, ``logs_service`` y ``common/logstore.py``; no hay sesiones,
+transacciones ni colecciones time-series.
+
+Los tiempos de MongoDB medidos con este servidor no son representativos: sirve
+para levantar el entorno sin ``mongod``, no para medir la base de datos.
+
+Uso::
+
+    python benchmarks/fake_mongo.py --port 27017
+"""
+import argparse
+import itertools
+import socketserver
+import struct
+import threading
+from datetime import datetime, timezone
+
+import bson
+import mongomock
+from bson.son import SON
+from pymongo import ReturnDocument
+
+OP_REPLY = 1
+OP_QUERY = 2004
+OP_MSG = 2013
+CHECKSUM_PRESENT = 1
+MORE_TO_COME = 1 << 1
+
+# Documentos por lote de cursor si el cliente no indica batchSize
+DEFAULT_BATCH_SIZE = 101
+# Campos genéricos del comando que no afectan a la operación
+IGNORED_FIELDS = {'$db', 'lsid', '$clusterTime', '$readPreference', 'txnNumber', 'writeConcern',
+                  'readConcern', 'apiVersion', 'apiStrict', 'apiDeprecationErrors', 'comment', 'maxTimeMS'}
+
+HELLO = {
+    "ismaster": True,
+    "isWritablePrimary": True,
+    "helloOk": True,
+    "maxBsonObjectSize": 16 * 1024 * 1024,
+    "maxMessageSizeBytes": 48000000,
+    "maxWriteBatchSize": 100000,
+    "minWireVersion": 0,
+    "maxWireVersion": 17,   # MongoDB 6.0
+    "readOnly": False,
+}
+
+
+class CommandError(Exception):
+    def __init__(self, message, code, code_name):
+        super().__init__(message)
+        self.code = code
+        self.code_name = code_name
+
+
+class FakeMongo:
+    """Ejecuta comandos de MongoDB sobre mongomock (un comando a la vez)"""
+
+    def __init__(self):
+        self.client = mongomock.MongoClient()
+        self.lock = threading.Lock()
+        self.cursors = {}
+        self._cursor_ids = itertools.count(1)
+
+    def run(self, db_name, body):
+        name = next(iter(body))
+        handler = getattr(self, 'cmd_' + name.lower(), None)
+        try:
+            if handler is None:
+                raise CommandError(f"no such command: '{name}'", 59, 'CommandNotFound')
+            with self.lock:
+                reply = handler(self.client[db_name], body)
+        except CommandError as e:
+            return {"ok": 0.0, "errmsg": str(e), "code": e.code, "codeName": e.code_name}
+        except mongomock.DuplicateKeyError as e:
+            return {"ok": 0.0, "errmsg": str(e), "code": 11000, "codeName": 'DuplicateKey'}
+        except mongomock.OperationFailure as e:
+            return {"ok": 0.0, "errmsg": str(e), "code": e.code or 8000, "codeName": 'OperationFailure'}
+        reply["ok"] = 1.0
+        return reply
+
+    # ===== Cursores =====
+    def _cursor(self, namespace, documents, batch_size, start=0):
+        """Lote del cursor; si quedan documentos se guardan para getMore"""
+        end = start + (batch_size or DEFAULT_BATCH_SIZE)
+        cursor_id = 0
+        if end < len(documents):
+            cursor_id = next(self._cursor_ids)
+            self.cursors[cursor_id] = (namespace, documents, end)
+        key = 'nextBatch' if start else 'firstBatch'
+        return {"cursor": {"id": bson.int64.Int64(cursor_id), "ns": namespace, key: documents[start:end]}}
+
+    def cmd_getmore(self, db, body):
+        namespace, documents, start = self.cursors.pop(body['getMore'], (None, None, 0))
+        if documents is None:
+            raise CommandError(f"cursor id {body['getMore']} not found", 43, 'CursorNotFound')
+        return self._cursor(namespace, documents, body.get('batchSize') or len(documents), start)
+
+    def cmd_killcursors(self, db, body):
+        for cursor_id in body.get('cursors', []):
+            self.cursors.pop(cursor_id, None)
+        return {"cursorsKilled": body.get('cursors', [])}
+
+    # ===== Conexión y administración =====
+    def cmd_hello(self, db, body):
+        return dict(HELLO, localTime=datetime.now(timezone.utc))
+
+    cmd_ismaster = cmd_hello
+
+    def cmd_ping(self, db, body):
+        return {}
+
+    def cmd_buildinfo(self, db, body):
+        return {"version": "6.0.0", "versionArray": [6, 0, 0, 0]}
+
+    def cmd_endsessions(self, db, body):
+        return {}
+
+    def cmd_listcollections(self, db, body):
+        wanted = (body.get('filter') or {}).get('name')
+        batch = [{"name": name, "type": "collection", "options": {}, "info": {"readOnly": False}}
+                 for name in db.list_collection_names() if wanted is None or name == wanted]
+        return self._cursor(f"{db.name}.$cmd.listCollections", batch, len(batch))
+
+    def cmd_create(self, db, body):
+        if body['create'] in db.list_collection_names():
+            raise CommandError(f"Collection {db.name}.{body['create']} already exists.", 48, 'NamespaceExists')
+        db.create_collection(body['create'])
+        return {}
+
+    def cmd_collmod(self, db, body):
+        return {}
+
+    def cmd_drop(self, db, body):
+        db.drop_collection(body['drop'])
+        return {}
+
+    # ===== Índices =====
+    def cmd_createindexes(self, db, body):
+        collection = db[body['createIndexes']]
+        for index in body['indexes']:
+            options = {k: v for k, v in index.items() if k not in ('key', 'v')}
+            collection.create_index(list(index['key'].items()), **options)
+        return {}
+
+    def cmd_listindexes(self, db, body):
+        collection = db[body['listIndexes']]
+        batch = []
+        for name, info in collection.index_information().items():
+            index = {k: v for k, v in info.items() if k != 'key'}
+            index.update(v=2, name=name, key=SON(info['key']))
+            batch.append(index)
+        return self._cursor(f"{db.name}.{collection.name}", batch, len(batch))
+
+    def cmd_dropindexes(self, db, body):
+        db[body['dropIndexes']].drop_index(body['index'])
+        return {}
+
+    # ===== Lecturas =====
+    def cmd_find(self, db, body):
+        collection = db[body['find']]
+        cursor = collection.find(body.get('filter') or {}, body.get('projection'))
+        if body.get('sort'):
+            cursor = cursor.sort(list(body['sort'].items()))
+        if body.get('skip'):
+            cursor = cursor.skip(body['skip'])
+        if body.get('limit'):
+            cursor = cursor.limit(abs(body['limit']))
+        documents = list(cursor)
+        batch_size = len(documents) if body.get('singleBatch') else body.get('batchSize')
+        return self._cursor(f"{db.name}.{collection.name}", documents, batch_size)
+
+    def cmd_aggregate(self, db, body):
+        collection = db[body['aggregate']]
+        documents = list(collection.aggregate(body['pipeline']))
+        return self._cursor(f"{db.name}.{collection.name}", documents,
+                            (body.get('cursor') or {}).get('batchSize'))
+
+    def cmd_count(self, db, body):
+        return {"n": db[body['count']].count_documents(body.get('query') or {})}
+
+    # ===== Escrituras =====
+    def _write(self, items, ordered, apply):
+        """Aplica cada operación; los errores se devuelven como writeErrors"""
+        reply = {"n": 0}
+        errors = []
+        for index, item in enumerate(items):
+            try:
+                apply(index, item, reply)
+            except (mongomock.DuplicateKeyError, mongomock.OperationFailure) as e:
+                code = 11000 if isinstance(e, mongomock.DuplicateKeyError) else (e.code or 8000)
+                errors.append({"index": index, "code": code, "errmsg": str(e)})
+                if ordered:
+                    break
+        if errors:
+            reply["writeErrors"] = errors
+        return reply
+
+    def cmd_insert(self, db, body):
+        collection = db[body['insert']]
+
+        def apply(index, document, reply):
+            collection.insert_one(document)
+            reply["n"] += 1
+        return self._write(body.get('documents', []), body.get('ordered', True), apply)
+
+    def cmd_update(self, db, body):
+        collection = db[body['update']]
+
+        def apply(index, item, reply):
+            query, update, upsert = item['q'], item['u'], item.get('upsert', False)
+            if isinstance(update, list) or not any(key.startswith('$') for key in update):
+                if isinstance(update, list):
+                    raise CommandError("update pipelines are not supported", 2, 'BadValue')
+                result = collection.replace_one(query, update, upsert=upsert)
+            elif item.get('multi'):
+                result = collection.update_many(query, update, upsert=upsert)
+            else:
+                result = collection.update_one(query, update, upsert=upsert)
+            reply["nModified"] = reply.get("nModified", 0) + result.modified_count
+            if result.upserted_id is not None:
+                reply["n"] += 1
+                reply.setdefault("upserted", []).append({"index": index, "_id": result.upserted_id})
+            else:
+                reply["n"] += result.matched_count
+        reply = self._write(body.get('updates', []), body.get('ordered', True), apply)
+        reply.setdefault("nModified", 0)
+        return reply
+
+    def cmd_delete(self, db, body):
+        collection = db[body['delete']]
+
+        def apply(index, item, reply):
+            if item.get('limit') == 1:
+                reply["n"] += collection.delete_one(item['q']).deleted_count
+            else:
+                reply["n"] += collection.delete_many(item['q']).deleted_count
+        return self._write(body.get('deletes', []), body.get('ordered', True), apply)
+
+    def cmd_findandmodify(self, db, body):
+        collection = db[body['findAndModify']]
+        query = body.get('query') or {}
+        sort = list(body['sort'].items()) if body.get('sort') else None
+        if body.get('remove'):
+            value = collection.find_one_and_delete(query, projection=body.get('fields'), sort=sort)
+            return {"lastErrorObject": {"n": int(value is not None)}, "value": value}
+        existing = collection.find_one(query, {"_id": 1}, sort=sort)
+        value = collection.find_one_and_update(
+            query, body['update'], projection=body.get('fields'), sort=sort,
+            upsert=body.get('upsert', False),
+            return_document=ReturnDocument.AFTER if body.get('new') else ReturnDocument.BEFORE
+        )
+        last_error = {"n": int(existing is not None or body.get('upsert', False)),
+                      "updatedExisting": existing is not None}
+        return {"lastErrorObject": last_error, "value": value}
+
+
+# ===== Protocolo =====
+def _read_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError
+        data += chunk
+    return bytes(data)
+
+
+def _decode_msg(payload):
+    """Cuerpo del OP_MSG: sección 0 más las secuencias de documentos (sección 1)"""
+    flags, = struct.unpack_from('<I', payload)
+    end = len(payload) - (4 if flags & CHECKSUM_PRESENT else 0)
+    pos = 4
+    body, sequences = None, {}
+    while pos < end:
+        kind = payload[pos]
+        pos += 1
+        size, = struct.unpack_from('<i', payload, pos)
+        if kind == 0:
+            body = bson.decode(payload[pos:pos + size])
+        else:
+            name_end = payload.index(b'\x00', pos + 4)
+            name = payload[pos + 4:name_end].decode()
+            sequences[name] = bson.decode_all(payload[name_end + 1:pos + size])
+        pos += size
+    body.update(sequences)
+    return flags, body
+
+
+def _decode_query(payload):
+    """Saludo inicial con OP_QUERY: colección, y el comando (a veces dentro de $query)"""
+    name_end = payload.index(b'\x00', 4)
+    namespace = payload[4:name_end].decode()
+    pos = name_end + 1 + 8   # numberToSkip, numberToReturn
+    size, = struct.unpack_from('<i', payload, pos)
+    query = bson.decode(payload[pos:pos + size])
+    return namespace.split('.', 1)[0], query.get('$query', query)
+
+
+def _command(body):
+    return {key: value for key, value in body.items() if key not in IGNORED_FIELDS}
+
+
+class Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server.mongo
+        try:
+            while True:
+                length, request_id, _, opcode = struct.unpack('<iiii', _read_exact(self.request, 16))
+                payload = _read_exact(self.request, length - 16)
+                if opcode == OP_MSG:
+                    flags, body = _decode_msg(payload)
+                    reply = server.run(body.get('$db', 'admin'), _command(body))
+                    if flags & MORE_TO_COME:
+                        continue
+                    data = struct.pack('<IB', 0, 0) + bson.encode(reply)
+                elif opcode == OP_QUERY:
+                    db_name, body = _decode_query(payload)
+                    reply = server.run(db_name, _command(body))
+                    data = struct.pack('<iqii', 0, 0, 0, 1) + bson.encode(reply)
+                    opcode = OP_REPLY
+                else:
+                    return
+                self.request.sendall(struct.pack('<iiii', 16 + len(data), 0, request_id, opcode) + data)
+        except ConnectionError:
+            pass
+
+
+class Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, Handler)
+        self.mongo = FakeMongo()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=27017)
+    args = parser.parse_args()
+    with Server((args.host, args.port)) as server:
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
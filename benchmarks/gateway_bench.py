@@ -0,0 +1,197 @@
+"""Benchmark: gateway WSGI (app.py) vs gateway ASGI (asgi_app.py).
+
+Levanta cuatro servicios falsos con una latencia fija (simulan auth/user/task/logs),
+arranca cada gateway apuntando a ellos y mide peticiones/segundo y latencias
+p50/p99 con N clientes concurrentes.
+
+Requisitos: MONGO_URI accesible (el gateway registra cada petición en Mongo).
+
+Uso::
+
+    python benchmarks/gateway_bench.py --concurrency 100 --duration 15 --upstream-latency-ms 50
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+GATEWAY_DIR = os.path.join(BASE_DIR, 'api_gateway')
+
+SERVICE_ENV = ['AUTH_SERVICE_URL', 'USER_SERVICE_URL', 'TASK_SERVICE_URL', 'LOGS_SERVICE_URL']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# ===== Servicios falsos =====
+def serve_fake_upstreams(ports, latency_s):
+    """Servicios HTTP mínimos con latencia fija (proceso aparte del generador de carga)"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        wbufsize = 65536
+
+        def _reply(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            if length:
+                self.rfile.read(length)
+            time.sleep(latency_s)
+            body = json.dumps({"ok": True, "path": self.path}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            self.wfile.flush()
+
+        do_GET = do_POST = do_PUT = do_DELETE = _reply
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        # El backlog por defecto (5) descarta conexiones con mucha concurrencia
+        request_queue_size = 1024
+        daemon_threads = True
+
+    servers = [Server(('127.0.0.1', port), Handler) for port in ports]
+    for server in servers[1:]:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    servers[0].serve_forever()
+
+
+# ===== Gateways =====
+def gateway_command(engine, port):
+    if engine == 'sync':
+        return [sys.executable, '-c',
+                f"import app; app.app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    return [sys.executable, '-m', 'hypercorn', 'asgi_app:app',
+            '--bind', f'127.0.0.1:{port}', '--workers', '1']
+
+
+def wait_for_port(port, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nadie escucha en el puerto {port}")
+
+
+# ===== Generador de carga =====
+async def run_load(url, concurrency, duration):
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    resp = await client.get(url)
+                    await resp.aread()
+                    if resp.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return latencies, errors, elapsed
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def bench_engine(engine, args, env):
+    port = free_port()
+    proc = subprocess.Popen(gateway_command(engine, port), cwd=GATEWAY_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        url = f"http://127.0.0.1:{port}{args.path}"
+        # Calentamiento: abre conexiones upstream antes de medir
+        asyncio.run(run_load(url, args.concurrency, 1))
+        latencies, errors, elapsed = asyncio.run(run_load(url, args.concurrency, args.duration))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+    return {
+        "engine": engine,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--engines', default='sync,asgi')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--upstream-latency-ms', type=float, default=20)
+    parser.add_argument('--path', default='/tasks')
+    parser.add_argument('--json-out', help='Guardar resultados en este archivo JSON')
+    args = parser.parse_args()
+
+    if not os.getenv('MONGO_URI'):
+        sys.exit("Define MONGO_URI (el gateway registra cada petición en MongoDB)")
+
+    env = dict(os.environ)
+    env['RATELIMIT_ENABLED'] = 'false'
+    ports = [free_port() for _ in SERVICE_ENV]
+    for name, port in zip(SERVICE_ENV, ports):
+        env[name] = f"http://127.0.0.1:{port}"
+
+    upstreams = multiprocessing.Process(
+        target=serve_fake_upstreams, args=(ports, args.upstream_latency_ms / 1000), daemon=True
+    )
+    upstreams.start()
+    try:
+        for port in ports:
+            wait_for_port(port)
+        results = [bench_engine(engine, args, env) for engine in args.engines.split(',')]
+    finally:
+        upstreams.terminate()
+
+    print(f"{'engine':<8}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for r in results:
+        print(f"{r['engine']:<8}{r['requests']:>10}{r['errors']:>8}{r['rps']:>10}"
+              f"{r['p50_ms']:>10}{r['p99_ms']:>10}")
+
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,575 @@
+"""Prueba de carga de extremo a extremo: api_gateway + los cuatro servicios reales.
+
+Arranca los cinco servicios contra bases SQLite temporales y un MongoDB local
+(``mongod`` efímero, ``--mongo-uri`` o, sin ``mongod``, ``fake_mongo.py`` sobre
+mongomock), crea N usuarios virtuales (registro + login con TOTP) y reproduce
+una mezcla ponderada de escenarios a través del gateway. Informa por ruta: peticiones/s, p50/p99 y el reparto del tiempo entre
+el gateway y el servicio (cabecera ``Server-Timing`` del gateway).
+
+Los escenarios se definen en JSONL, uno por línea (ver ``benchmarks/scenarios.jsonl``)::
+
+    {"name": "tasks_crud", "weight": 4, "steps": [
+        {"method": "POST", "path": "/tasks", "json": {"description": "Tarea {user}"},
+         "expect": [201], "save": {"task_id": "id"}},
+        {"method": "DELETE", "path": "/tasks/{task_id}"}]}
+
+En ``path`` y en los textos de ``json`` se sustituyen ``{user}``, ``{n}`` (número
+de iteración) y las variables guardadas con ``save``. ``{"action": "register"}``
+y ``{"action": "login"}`` registran un usuario nuevo e inician sesión con su OTP.
+
+Uso::
+
+    python benchmarks/loadtest.py --users 20 --duration 30 --save
+    python benchmarks/loadtest.py --server gunicorn --workers 2 --save --compare benchmarks/results/base.json
+    python benchmarks/loadtest.py --compare benchmarks/results/a.json benchmarks/results/b.json
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import re
+import secrets
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from contextlib import closing
+from datetime import datetime, timezone
+
+import httpx
+import pyotp
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_SCENARIOS = os.path.join(BASE_DIR, 'benchmarks', 'scenarios.jsonl')
+RESULTS_DIR = os.path.join(BASE_DIR, 'benchmarks', 'results')
+
+# (nombre, carpeta, variable con la URL para el gateway)
+SERVICES = [
+    ('auth_service', 'auth_service', 'AUTH_SERVICE_URL'),
+    ('user_service', 'user_service', 'USER_SERVICE_URL'),
+    ('task_service', 'task_service', 'TASK_SERVICE_URL'),
+    ('logs_service', 'logs_service', 'LOGS_SERVICE_URL'),
+]
+# El JWT caduca a los 5 minutos: se renueva antes
+TOKEN_REFRESH_SECONDS = 240
+# --rate-limit: el limiter del gateway comprueba y registra cada petición, pero con
+# este límite en todas las rutas la carga nunca recibe un 429
+BENCH_RATE_LIMIT = '1000000 per minute'
+
+SERVER_TIMING_RE = re.compile(r'(\w+);dur=([\d.]+)')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+# ===== Entorno: servicios con datos temporales =====
+class Stack:
+    """Levanta MongoDB (si hace falta) y los cinco servicios; los detiene al salir"""
+
+    def __init__(self, args):
+        self.args = args
+        self.tmp = tempfile.mkdtemp(prefix='loadtest-')
+        self.procs = []
+        self.env = dict(os.environ)
+        self.auth_db = os.path.join(self.tmp, 'auth.db')
+        self.gateway_url = None
+
+    def __enter__(self):
+        try:
+            self.start()
+        except BaseException:
+            self.stop()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start_mongo(self):
+        if self.args.mongo_uri:
+            return self.args.mongo_uri
+        port = free_port()
+        mongod = shutil.which('mongod')
+        if self.args.fake_mongo or not mongod:
+            if importlib.util.find_spec('mongomock') is None:
+                sys.exit("No se encontró mongod en el PATH ni mongomock (pip install mongomock); "
+                         "instalar uno de los dos o indicar --mongo-uri")
+            if not self.args.fake_mongo:
+                print("mongod no está en el PATH: se usa benchmarks/fake_mongo.py "
+                      "(los tiempos de logs_service no son representativos)")
+            self.spawn('mongod', [sys.executable, os.path.join(BASE_DIR, 'benchmarks', 'fake_mongo.py'),
+                                  '--port', str(port)], cwd=self.tmp)
+        else:
+            dbpath = os.path.join(self.tmp, 'mongo')
+            os.makedirs(dbpath)
+            self.spawn('mongod', [mongod, '--dbpath', dbpath, '--port', str(port),
+                                  '--bind_ip', '127.0.0.1', '--quiet'], cwd=self.tmp)
+        wait_for_port(port)
+        return f"mongodb://127.0.0.1:{port}"
+
+    def spawn(self, name, command, cwd, env=None):
+        log = open(os.path.join(self.tmp, f'{name}.log'), 'wb')
+        proc = subprocess.Popen(command, cwd=cwd, env=env or self.env, stdout=log, stderr=subprocess.STDOUT)
+        self.procs.append((name, proc, log))
+        return proc
+
+    def service_command(self, service_dir, script, port):
+        path = os.path.join(BASE_DIR, service_dir)
+        if self.args.server == 'dev':
+            return [sys.executable, os.path.join(path, script), '--port', str(port)]
+        module = script[:-3] + ':app'
+        if script == 'asgi_app.py':
+            return [sys.executable, '-m', 'hypercorn', module, '--bind', f'127.0.0.1:{port}',
+                    '--workers', str(self.args.workers)]
+        return [sys.executable, '-m', 'gunicorn', module, '--bind', f'127.0.0.1:{port}',
+                '--workers', str(self.args.workers), '--threads', str(self.args.threads)]
+
+    def start_service(self, name, service_dir, script, port, extra_env=None):
+        env = dict(self.env)
+        # Módulos planos de cada servicio (rollups, upstream, ...); el cwd es la carpeta temporal
+        env['PYTHONPATH'] = os.path.join(BASE_DIR, service_dir)
+        env.update(extra_env or {})
+        self.spawn(name, self.service_command(service_dir, script, port), cwd=self.tmp, env=env)
+
+    def start(self):
+        self.env.update({
+            'MONGO_URI': self.start_mongo(),
+            'SECRET_KEY': self.env.get('SECRET_KEY') or secrets.token_hex(16),
+            'AUTH_DB_FILE': self.auth_db,
+            'USER_DB_FILE': os.path.join(self.tmp, 'users.db'),
+            'TASK_DB_FILE': os.path.join(self.tmp, 'tasks.db'),
+            'RATELIMIT_STORAGE_URI': f"sqlite:///{os.path.join(self.tmp, 'ratelimit.db')}",
+            'RATELIMIT_ENABLED': 'false',
+            'FLASK_DEBUG': 'false',
+            'OTP_QR_MODE': 'lazy',
+            'GATEWAY_SERVER_TIMING': 'true',
+        })
+        ports = {}
+        for name, _, url_env in SERVICES:
+            ports[name] = free_port()
+            self.env[url_env] = f"http://127.0.0.1:{ports[name]}"
+        for name, service_dir, _ in SERVICES:
+            self.start_service(name, service_dir, 'app.py', ports[name])
+        for name, _, _ in SERVICES:
+            self.wait_ready(name, ports[name])
+
+        gateway_port = free_port()
+        script = 'asgi_app.py' if self.args.engine == 'asgi' else 'app.py'
+        gateway_env = self.rate_limited_gateway() if self.args.rate_limit else None
+        self.start_service('api_gateway', 'api_gateway', script, gateway_port, gateway_env)
+        self.wait_ready('api_gateway', gateway_port)
+        self.gateway_url = f"http://127.0.0.1:{gateway_port}"
+
+    def rate_limited_gateway(self):
+        """Entorno del gateway con el limiter activo (SQLite compartido) y límites inalcanzables.
+
+        Los servicios siguen sin límites: sus límites por IP (todo llega desde el
+        gateway) rechazarían la carga en segundos.
+        """
+        with open(os.path.join(BASE_DIR, 'api_gateway', 'gateway.json'), encoding='utf-8') as f:
+            config = json.load(f)
+        config['default_limits'] = [BENCH_RATE_LIMIT]
+        for route in config['routes']:
+            route['limit'] = BENCH_RATE_LIMIT
+        path = os.path.join(self.tmp, 'gateway.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(config, f)
+        return {'RATELIMIT_ENABLED': 'true', 'GATEWAY_CONFIG': path}
+
+    def wait_ready(self, name, port, timeout=60):
+        """Espera a GET /health = 200; si el proceso termina se muestra su log"""
+        proc = next(p for n, p, _ in self.procs if n == name)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if proc.poll() is not None:
+                break
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health", timeout=2).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        with open(os.path.join(self.tmp, f'{name}.log'), errors='replace') as f:
+            tail = f.read()[-2000:]
+        raise RuntimeError(f"{name} no está listo en el puerto {port}:\n{tail}")
+
+    def otp_secret(self, user_id):
+        # La prueba controla la base de Auth: el secreto se lee en vez de decodificar el QR
+        with closing(sqlite3.connect(self.auth_db, timeout=10)) as conn:
+            row = conn.execute('SELECT otp_secret FROM otp_data WHERE user_id = ?', (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def stop(self):
+        for _, proc, _ in reversed(self.procs):
+            proc.terminate()
+        for name, proc, log in reversed(self.procs):
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            log.close()
+        if self.args.keep_tmp:
+            print(f"Datos y logs de la prueba en {self.tmp}")
+        else:
+            shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nadie escucha en el puerto {port}")
+
+
+# ===== Escenarios =====
+def load_scenarios(path, only=None):
+    scenarios = []
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                scenario = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{number}: JSON inválido ({e})")
+            if not scenario.get('steps'):
+                raise ValueError(f"{path}:{number}: el escenario no tiene steps")
+            scenario.setdefault('name', f'linea-{number}')
+            scenario.setdefault('weight', 1)
+            scenarios.append(scenario)
+    if only:
+        scenarios = [s for s in scenarios if s['name'] in only]
+    if not scenarios:
+        raise ValueError(f"No hay escenarios que ejecutar en {path}")
+    return scenarios
+
+
+def render(value, variables):
+    """Sustituye {variables} en textos, también dentro de listas y diccionarios"""
+    if isinstance(value, str):
+        return value.format_map(variables)
+    if isinstance(value, list):
+        return [render(item, variables) for item in value]
+    if isinstance(value, dict):
+        return {key: render(item, variables) for key, item in value.items()}
+    return value
+
+
+# ===== Métricas =====
+class Recorder:
+    """Latencias por ruta (plantilla del paso, no la URL ya sustituida)"""
+
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.gateway = defaultdict(list)
+        self.upstream = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+        self.scenarios = Counter()
+
+    def record(self, route, elapsed_ms, status, timing, ok):
+        self.latency[route].append(elapsed_ms)
+        self.statuses[route][str(status)] += 1
+        if not ok:
+            self.errors[route] += 1
+        durations = dict((name, float(value)) for name, value in SERVER_TIMING_RE.findall(timing or ''))
+        if 'gateway' in durations:
+            self.gateway[route].append(durations['gateway'])
+        if 'upstream' in durations:
+            self.upstream[route].append(durations['upstream'])
+
+    def summary(self, elapsed):
+        routes = {}
+        for route, values in sorted(self.latency.items()):
+            routes[route] = {
+                "requests": len(values),
+                "errors": self.errors[route],
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 50), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+                # Tiempo propio del gateway y del servicio según Server-Timing
+                "gateway_p50_ms": round(percentile(self.gateway[route], 50), 2),
+                "upstream_p50_ms": round(percentile(self.upstream[route], 50), 2),
+                "upstream_p99_ms": round(percentile(self.upstream[route], 99), 2),
+                "statuses": dict(self.statuses[route]),
+            }
+        everything = [v for values in self.latency.values() for v in values]
+        total = {
+            "requests": len(everything),
+            "errors": sum(self.errors.values()),
+            "rps": round(len(everything) / elapsed, 2),
+            "p50_ms": round(percentile(everything, 50), 2),
+            "p99_ms": round(percentile(everything, 99), 2),
+        }
+        return {"elapsed_s": round(elapsed, 2), "total": total, "routes": routes,
+                "scenarios": dict(self.scenarios)}
+
+
+# ===== Usuarios virtuales =====
+class VirtualUser:
+    def __init__(self, index, client, stack, recorder):
+        self.client = client
+        self.stack = stack
+        self.recorder = recorder
+        self.variables = {"n": 0}
+        self.token = None
+        self.login_at = 0.0
+        self.prefix = f"lt{index}-{secrets.token_hex(3)}"
+        self.registered = 0
+
+    async def request(self, route, method, path, expect=None, **kwargs):
+        headers = {'Authorization': f'Bearer {self.token}'} if self.token else {}
+        start = time.perf_counter()
+        try:
+            resp = await self.client.request(method, path, headers=headers, **kwargs)
+            await resp.aread()
+        except httpx.HTTPError:
+            self.recorder.record(route, (time.perf_counter() - start) * 1000, 'error', None, False)
+            return None
+        ok = resp.status_code in expect if expect else resp.status_code < 400
+        self.recorder.record(route, (time.perf_counter() - start) * 1000, resp.status_code,
+                             resp.headers.get('Server-Timing'), ok)
+        return resp
+
+    async def register(self):
+        self.registered += 1
+        username = f"{self.prefix}-{self.registered}"
+        body = {"username": username, "password": "loadtest", "email": f"{username}@loadtest.local"}
+        resp = await self.request('POST /auth/register', 'POST', '/auth/register', json=body, expect=[201])
+        if resp is None or resp.status_code != 201:
+            return False
+        self.variables['user'] = username
+        self.variables['user_id'] = resp.json()['user']['id']
+        self.token = None
+        return True
+
+    async def login(self):
+        secret = await asyncio.to_thread(self.stack.otp_secret, self.variables.get('user_id'))
+        if not secret:
+            return False
+        body = {"identifier": self.variables['user'], "password": "loadtest", "otp": pyotp.TOTP(secret).now()}
+        resp = await self.request('POST /auth/login', 'POST', '/auth/login', json=body, expect=[200])
+        if resp is None or resp.status_code != 200:
+            return False
+        self.token = resp.json()['token']
+        self.login_at = time.monotonic()
+        return True
+
+    async def setup(self):
+        return await self.register() and await self.login()
+
+    async def run_scenario(self, scenario):
+        self.variables['n'] += 1
+        if self.token and time.monotonic() - self.login_at > TOKEN_REFRESH_SECONDS:
+            # Un código OTP solo se acepta una vez: la renovación usa el paso de tiempo actual
+            await self.login()
+        self.recorder.scenarios[scenario['name']] += 1
+        for step in scenario['steps']:
+            action = step.get('action')
+            if action == 'register':
+                ok = await self.register()
+            elif action == 'login':
+                ok = await self.login()
+            else:
+                ok = await self.run_step(step)
+            if not ok:
+                return
+
+    async def run_step(self, step):
+        method = step.get('method', 'GET').upper()
+        route = step.get('route') or f"{method} {step['path'].split('?')[0]}"
+        try:
+            path = render(step['path'], self.variables)
+            body = render(step.get('json'), self.variables)
+        except KeyError:
+            # Falta una variable de un paso anterior que falló
+            return False
+        resp = await self.request(route, method, path, json=body, expect=step.get('expect'))
+        if resp is None:
+            return False
+        for name, field in step.get('save', {}).items():
+            try:
+                self.variables[name] = resp.json()[field]
+            except (ValueError, KeyError, TypeError):
+                return False
+        return resp.status_code < 400
+
+
+async def run_load(stack, scenarios, args):
+    # El registro inicial se mide aparte: no cuenta en las req/s de la carga
+    setup_recorder = Recorder()
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    weights = [scenario['weight'] for scenario in scenarios]
+    rng = random.Random(args.seed)
+
+    async with httpx.AsyncClient(base_url=stack.gateway_url, limits=limits, timeout=30) as client:
+        users = [VirtualUser(i, client, stack, setup_recorder) for i in range(args.users)]
+        setup_started = time.perf_counter()
+        ready = await asyncio.gather(*(user.setup() for user in users))
+        setup_elapsed = time.perf_counter() - setup_started
+        if not any(ready):
+            raise RuntimeError("Ningún usuario virtual pudo registrarse e iniciar sesión")
+        for user in users:
+            user.recorder = recorder
+
+        deadline = time.perf_counter() + args.duration
+
+        async def loop(user):
+            while time.perf_counter() < deadline:
+                await user.run_scenario(rng.choices(scenarios, weights)[0])
+                if args.think_ms:
+                    await asyncio.sleep(args.think_ms / 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(loop(user) for user, ok in zip(users, ready) if ok))
+        elapsed = time.perf_counter() - started
+    result = recorder.summary(elapsed)
+    result['setup'] = setup_recorder.summary(setup_elapsed)
+    return result
+
+
+# ===== Resultados =====
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BASE_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(dirty)
+
+
+def print_table(result):
+    print(f"{'ruta':<34}{'n':>7}{'err':>6}{'req/s':>9}{'p50':>9}{'p99':>9}{'gw p50':>9}{'up p50':>9}")
+    for route, r in result['routes'].items():
+        print(f"{route:<34}{r['requests']:>7}{r['errors']:>6}{r['rps']:>9}{r['p50_ms']:>9}"
+              f"{r['p99_ms']:>9}{r['gateway_p50_ms']:>9}{r['upstream_p50_ms']:>9}")
+    t = result['total']
+    print(f"{'TOTAL':<34}{t['requests']:>7}{t['errors']:>6}{t['rps']:>9}{t['p50_ms']:>9}{t['p99_ms']:>9}")
+
+
+def print_results(result):
+    print(f"Registro inicial de los usuarios ({result['setup']['elapsed_s']} s)")
+    print_table(result['setup'])
+    print(f"\nCarga ({result['elapsed_s']} s, escenarios: {result['scenarios']})")
+    print_table(result)
+    print("(ms; gw = tiempo propio del gateway, up = servicio, según Server-Timing;"
+          " el resto es red y cola del servidor)")
+
+
+def save_results(result, path):
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        path = os.path.join(RESULTS_DIR, f"{stamp}-{result['meta']['commit'] or 'nogit'}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {path}")
+
+
+def compare(base, new, threshold):
+    """Imprime las diferencias por ruta; devuelve las rutas con regresión"""
+    print(f"Base: {base['meta'].get('commit')}  Nuevo: {new['meta'].get('commit')}  "
+          f"(regresión: p99 o req/s empeoran más de {threshold:.0f}%)")
+    print(f"{'ruta':<34}{'p50':>17}{'p99':>17}{'req/s':>17}")
+    regressions = []
+    for route in sorted(set(base['routes']) | set(new['routes'])):
+        old, cur = base['routes'].get(route), new['routes'].get(route)
+        if old is None or cur is None:
+            print(f"{route:<34}  {'(solo en el nuevo)' if old is None else '(solo en la base)'}")
+            continue
+
+        def change(key):
+            return (cur[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+
+        worse = change('p99_ms') > threshold or change('rps') < -threshold
+        if worse:
+            regressions.append(route)
+        cells = ''.join(f"{old[k]:>7}->{cur[k]:<7}{'':>2}" for k in ('p50_ms', 'p99_ms', 'rps'))
+        print(f"{route:<34}{cells}{'  REGRESIÓN' if worse else ''}")
+    return regressions
+
+
+def load_result(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', default=DEFAULT_SCENARIOS, help='Archivo JSONL de escenarios')
+    parser.add_argument('--only', help='Escenarios a ejecutar, separados por comas')
+    parser.add_argument('--users', type=int, default=10, help='Usuarios virtuales concurrentes')
+    parser.add_argument('--duration', type=float, default=20, help='Segundos de carga (tras el registro)')
+    parser.add_argument('--think-ms', type=float, default=0, help='Pausa entre escenarios por usuario')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--engine', choices=['sync', 'asgi'], default='sync', help='Gateway WSGI o ASGI')
+    parser.add_argument('--server', choices=['dev', 'gunicorn'], default='dev',
+                        help='dev: servidor de Flask; gunicorn: como ./start_services.sh prod')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--mongo-uri', help='MongoDB a usar en vez de arrancar un mongod temporal')
+    parser.add_argument('--fake-mongo', action='store_true',
+                        help='MongoDB en memoria (benchmarks/fake_mongo.py) aunque haya mongod')
+    parser.add_argument('--rate-limit', action='store_true',
+                        help='Limiter del gateway activo (RATELIMIT_STRATEGY/RATELIMIT_BATCH_MS del entorno)')
+    parser.add_argument('--keep-tmp', action='store_true', help='Conservar bases y logs temporales')
+    parser.add_argument('--save', nargs='?', const='', metavar='RUTA',
+                        help='Guardar resultados (por defecto en benchmarks/results/)')
+    parser.add_argument('--compare', nargs='+', metavar='JSON',
+                        help='BASE [NUEVO]: comparar resultados guardados (sin NUEVO, con esta ejecución)')
+    parser.add_argument('--threshold', type=float, default=10, help='Porcentaje que cuenta como regresión')
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) == 2:
+        regressions = compare(load_result(args.compare[0]), load_result(args.compare[1]), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    only = set(args.only.split(',')) if args.only else None
+    scenarios = load_scenarios(args.scenarios, only)
+
+    with Stack(args) as stack:
+        result = asyncio.run(run_load(stack, scenarios, args))
+
+    commit, dirty = git_revision()
+    result['meta'] = {
+        "commit": commit,
+        "dirty": dirty,
+        "date": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "python": sys.version.split()[0],
+        "args": {key: value for key, value in vars(args).items() if key not in ('save', 'compare')},
+    }
+    print_results(result)
+    if args.save is not None:
+        save_results(result, args.save or None)
+    if args.compare:
+        regressions = compare(load_result(args.compare[0]), result, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
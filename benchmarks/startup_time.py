@@ -0,0 +1,211 @@
+"""Tiempo de arranque en frío de cada servicio, con un presupuesto por servicio.
+
+Para cada servicio mide, como mediana de ``--runs`` arranques:
+
+- ``import_ms``: importar ``app`` (módulos y código a nivel de módulo).
+- ``listen_ms``: desde lanzar ``python app.py`` hasta que acepta conexiones.
+- ``ready_ms``: hasta que ``GET /health`` responde 200 (crea el esquema / conecta).
+
+Los servicios usan bases SQLite temporales y no necesitan MongoDB para escuchar.
+Sin ``--mongo-uri`` el Logs Service no llega a estar listo (``ready_ms`` vacío).
+Termina con código 1 si algún ``listen_ms`` supera su presupuesto::
+
+    python benchmarks/startup_time.py
+    python benchmarks/startup_time.py --runs 10 --only auth_service --budget auth_service=600
+    python benchmarks/startup_time.py --json > startup.json
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# (nombre, carpeta, script, presupuesto de listen_ms)
+SERVICES = [
+    ('auth_service', 'auth_service', 'app.py', 1500),
+    ('user_service', 'user_service', 'app.py', 1200),
+    ('task_service', 'task_service', 'app.py', 1200),
+    ('logs_service', 'logs_service', 'app.py', 1500),
+    ('api_gateway', 'api_gateway', 'app.py', 1500),
+    ('api_gateway_asgi', 'api_gateway', 'asgi_app.py', 2000),
+]
+
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import {module}; "
+    "print((time.perf_counter() - start) * 1000)"
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def listening(port):
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+            return True
+    except OSError:
+        return False
+
+
+def health_status(port):
+    """Status de GET /health o None si no responde"""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=5) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        return None
+
+
+class Runner:
+    def __init__(self, args):
+        self.args = args
+        self.tmp = tempfile.mkdtemp(prefix='startup-')
+        self.env = dict(os.environ)
+        self.env.update({
+            'MONGO_URI': args.mongo_uri,
+            'SECRET_KEY': self.env.get('SECRET_KEY') or 'startup-benchmark',
+            'RATELIMIT_STORAGE_URI': 'memory://',
+            'FLASK_DEBUG': 'false',
+            'MONGO_TIMEOUT_MS': '500',    # /health del Logs Service sin Mongo responde pronto
+        })
+
+    def service_env(self, service_dir, run):
+        # Bases nuevas en cada arranque: se mide también la creación del esquema
+        data = os.path.join(self.tmp, f'run{run}')
+        os.makedirs(data, exist_ok=True)
+        env = dict(self.env)
+        env.update({
+            'PYTHONPATH': os.path.join(BASE_DIR, service_dir),
+            'AUTH_DB_FILE': os.path.join(data, 'auth.db'),
+            'USER_DB_FILE': os.path.join(data, 'users.db'),
+            'TASK_DB_FILE': os.path.join(data, 'tasks.db'),
+        })
+        return env, data
+
+    def import_ms(self, service_dir, script, run):
+        env, data = self.service_env(service_dir, run)
+        snippet = IMPORT_SNIPPET.format(module=script[:-3])
+        out = subprocess.run([sys.executable, '-c', snippet], cwd=data, env=env,
+                             capture_output=True, text=True, timeout=self.args.timeout)
+        if out.returncode != 0:
+            raise RuntimeError(f"No se pudo importar {service_dir}/{script}:\n{out.stderr[-2000:]}")
+        return float(out.stdout.strip().splitlines()[-1])
+
+    def boot(self, service_dir, script, run):
+        """(listen_ms, ready_ms) de un arranque; ready_ms es None si no llega a estar listo"""
+        env, data = self.service_env(service_dir, run)
+        port = free_port()
+        command = [sys.executable, os.path.join(BASE_DIR, service_dir, script), '--port', str(port)]
+        log_path = os.path.join(data, f'{script}.log')
+        with open(log_path, 'wb') as log:
+            start = time.perf_counter()
+            proc = subprocess.Popen(command, cwd=data, env=env, stdout=log, stderr=subprocess.STDOUT)
+            listen_ms = ready_ms = None
+            try:
+                deadline = start + self.args.timeout
+                while time.perf_counter() < deadline and proc.poll() is None:
+                    if listen_ms is None:
+                        if listening(port):
+                            listen_ms = (time.perf_counter() - start) * 1000
+                            # Ya escucha: solo se espera a que esté listo durante --ready-timeout
+                            deadline = min(deadline, time.perf_counter() + self.args.ready_timeout)
+                            continue
+                    elif health_status(port) == 200:
+                        ready_ms = (time.perf_counter() - start) * 1000
+                        break
+                    time.sleep(0.005)
+            finally:
+                proc.terminate()
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+        if listen_ms is None:
+            with open(log_path, errors='replace') as f:
+                raise RuntimeError(f"{service_dir}/{script} no llegó a escuchar:\n{f.read()[-2000:]}")
+        return listen_ms, ready_ms
+
+    def measure(self, name, service_dir, script):
+        imports, listens, readies = [], [], []
+        for run in range(self.args.runs):
+            imports.append(self.import_ms(service_dir, script, run))
+            listen_ms, ready_ms = self.boot(service_dir, script, run)
+            listens.append(listen_ms)
+            if ready_ms is not None:
+                readies.append(ready_ms)
+        return {
+            "service": name,
+            "import_ms": round(statistics.median(imports), 1),
+            "listen_ms": round(statistics.median(listens), 1),
+            "listen_max_ms": round(max(listens), 1),
+            # Solo si todos los arranques llegaron a estar listos
+            "ready_ms": round(statistics.median(readies), 1) if len(readies) == len(listens) else None,
+        }
+
+    def close(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+def parse_budgets(values):
+    budgets = {name: budget for name, _, _, budget in SERVICES}
+    for value in values or []:
+        name, _, ms = value.partition('=')
+        if name not in budgets or not ms:
+            raise SystemExit(f"--budget no válido: {value} (servicio=ms, servicios: {', '.join(budgets)})")
+        budgets[name] = float(ms)
+    return budgets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de arranque en frío de cada servicio")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--only', nargs='+', help='servicios a medir')
+    parser.add_argument('--budget', action='append', metavar='SERVICIO=MS',
+                        help='presupuesto de listen_ms (se puede repetir)')
+    parser.add_argument('--mongo-uri', default=os.getenv('MONGO_URI', 'mongodb://127.0.0.1:27017'))
+    parser.add_argument('--timeout', type=float, default=30, help='segundos máximos hasta escuchar')
+    parser.add_argument('--ready-timeout', type=float, default=5,
+                        help='segundos de espera a /health = 200 una vez que escucha')
+    parser.add_argument('--json', action='store_true', help='resultado en JSON')
+    args = parser.parse_args()
+
+    budgets = parse_budgets(args.budget)
+    selected = [s for s in SERVICES if not args.only or s[0] in args.only]
+    runner = Runner(args)
+    results = []
+    try:
+        for name, service_dir, script, _ in selected:
+            result = runner.measure(name, service_dir, script)
+            result["budget_ms"] = budgets[name]
+            result["over_budget"] = result["listen_ms"] > budgets[name]
+            results.append(result)
+            if not args.json:
+                ready = f"{result['ready_ms']:8.1f}" if result["ready_ms"] is not None else '       -'
+                mark = '  FUERA DE PRESUPUESTO' if result["over_budget"] else ''
+                print(f"{name:18} import {result['import_ms']:7.1f} ms  listen {result['listen_ms']:7.1f} ms  "
+                      f"ready {ready} ms  (presupuesto {budgets[name]:.0f} ms){mark}", flush=True)
+    finally:
+        runner.close()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    if any(result["over_budget"] for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+"""Módulos compartidos por los microservicios."""
@@ -0,0 +1,59 @@
+import os
+import threading
+import time
+
+# ===== Inicialización diferida de recursos (esquemas SQLite, clientes de Mongo) =====
+# Tras un fallo no se vuelve a intentar hasta pasado este tiempo (evita martillear la base)
+LAZY_RETRY_SECONDS = float(os.getenv('LAZY_RETRY_SECONDS', '2'))
+
+
+class LazyResource:
+    """Crea un recurso en su primer uso en lugar de al importar el módulo.
+
+    ``get()`` llama a ``factory`` una sola vez por proceso y guarda el resultado.
+    Si falla, la excepción se propaga y se reintenta en un ``get()`` posterior
+    (como pronto a los ``retry_seconds``); mientras tanto se relanza el último error.
+    """
+
+    def __init__(self, name, factory, retry_seconds=LAZY_RETRY_SECONDS):
+        self.name = name
+        self.factory = factory
+        self.retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        self._value = None
+        self._ready = False
+        self._pid = None
+        self._error = None
+        self._retry_at = 0.0
+        self.attempts = 0
+
+    @property
+    def ready(self):
+        return self._ready and self._pid == os.getpid()
+
+    def get(self):
+        if self.ready:
+            return self._value
+        with self._lock:
+            if self.ready:
+                return self._value
+            if self._error is not None and time.monotonic() < self._retry_at:
+                raise self._error
+            self.attempts += 1
+            try:
+                value = self.factory()
+            except Exception as e:
+                self._error = e
+                self._retry_at = time.monotonic() + self.retry_seconds
+                raise
+            # Creado en otro proceso (antes de un fork) no sirve: se vuelve a crear
+            self._value, self._ready, self._pid, self._error = value, True, os.getpid(), None
+            return value
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "ready": self.ready,
+            "attempts": self.attempts,
+            "last_error": str(self._error) if self._error is not None else None,
+        }
@@ -0,0 +1,58 @@
+import os
+
+from pymongo import ASCENDING
+from pymongo.errors import CollectionInvalid
+
+# ===== Colección de logs del gateway (Logs.Logs) =====
+# Días que se conservan los logs (caducidad sobre ``timestamp``). Por defecto 0: sin
+# caducidad; borrar logs es una decisión explícita del operador
+LOGS_RETENTION_DAYS = float(os.getenv('LOGS_RETENTION_DAYS', '0'))
+# true: si la colección aún no existe se crea como time-series (MongoDB 5.0+)
+LOGS_TIMESERIES = os.getenv('LOGS_TIMESERIES', 'false').lower() == 'true'
+
+TIMESTAMP_INDEX = 'timestamp_ttl'
+# Igualdad primero y rango al final: service, service+path y service+path+status por fecha
+QUERY_INDEX = 'service_path_status_timestamp'
+QUERY_KEYS = [("service", ASCENDING), ("path", ASCENDING), ("status", ASCENDING), ("timestamp", ASCENDING)]
+
+
+def retention_seconds():
+    return int(LOGS_RETENTION_DAYS * 86400) if LOGS_RETENTION_DAYS > 0 else None
+
+
+def prepare_logs_collection(db, name='Logs'):
+    """Crea la colección de logs con sus índices y aplica la retención configurada.
+
+    Idempotente: lo llama el gateway antes del primer envío y el script de
+    migración. Una colección normal ya existente no se convierte en time-series.
+    """
+    expire = retention_seconds()
+    if LOGS_TIMESERIES and name not in db.list_collection_names():
+        options = {"timeseries": {"timeField": "timestamp", "metaField": "service", "granularity": "seconds"}}
+        if expire:
+            options["expireAfterSeconds"] = expire
+        try:
+            db.create_collection(name, **options)
+        except CollectionInvalid:
+            pass  # la creó otro worker a la vez
+
+    collection = db[name]
+    if 'timeseries' in collection.options():
+        # En time-series la caducidad es de la colección, no de un índice
+        if collection.options().get('expireAfterSeconds') != expire:
+            db.command('collMod', name, expireAfterSeconds=expire or 'off')
+    else:
+        info = collection.index_information().get(TIMESTAMP_INDEX)
+        if info is not None and info.get('expireAfterSeconds') != expire:
+            if expire and 'expireAfterSeconds' in info:
+                db.command('collMod', name, index={"name": TIMESTAMP_INDEX, "expireAfterSeconds": expire})
+                info['expireAfterSeconds'] = expire
+            else:
+                # Activar o quitar la caducidad exige recrear el índice
+                collection.drop_index(TIMESTAMP_INDEX)
+                info = None
+        if info is None:
+            ttl = {"expireAfterSeconds": expire} if expire else {}
+            collection.create_index([("timestamp", ASCENDING)], name=TIMESTAMP_INDEX, **ttl)
+    collection.create_index(QUERY_KEYS, name=QUERY_INDEX)
+    return collection
@@ -0,0 +1,313 @@
+import hmac
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as Tally
+from contextlib import contextmanager
+from functools import wraps
+
+# ===== Métricas en formato Prometheus (sin dependencias) =====
+# Cada proceso tiene sus propios contadores: con varios workers de gunicorn cada
+# consulta a /metrics devuelve los del worker que la atiende (etiqueta ``pid``).
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+# Profiler por muestreo bajo demanda (GET /debug/profile?seconds=N); desactivado por defecto
+PROFILER_ENABLED = os.getenv('METRICS_PROFILER_ENABLED', 'false').lower() == 'true'
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '10'))
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', '60'))
+PROFILE_MAX_DEPTH = 64
+
+# Endpoints internos (/metrics, /debug/profile, estadísticas): con INTERNAL_TOKEN se
+# exige la cabecera X-Internal-Token; sin él solo se atienden peticiones desde la propia máquina
+INTERNAL_TOKEN = os.getenv('INTERNAL_TOKEN', '')
+INTERNAL_RATE_LIMIT = os.getenv('INTERNAL_RATE_LIMIT', '120 per minute')
+PROFILE_RATE_LIMIT = os.getenv('PROFILE_RATE_LIMIT', '6 per minute')
+LOOPBACK_ADDRESSES = {'127.0.0.1', '::1'}
+
+# Segundos; cubren desde una consulta SQLite hasta una llamada upstream lenta
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} espera las etiquetas {self.labelnames}")
+        return tuple(str(value) for value in labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self, const):
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_labels(const + list(zip(self.labelnames, key)))} {value}"
+                for key, value in values]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}     # etiquetas -> [conteos por bucket..., +Inf], suma
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self, const):
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = []
+        for key, counts, total in values:
+            pairs = const + list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(pairs + [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(pairs)} {total}")
+            lines.append(f"{self.name}_count{_labels(pairs)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.service = os.getenv('METRICS_SERVICE', 'unknown')
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def render(self):
+        """Texto de exposición de Prometheus (versión 0.0.4)"""
+        const = [('service', self.service), ('pid', os.getpid())]
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples(const))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# ===== Métricas comunes a todos los servicios =====
+REQUEST_DURATION = Histogram('http_request_duration_seconds',
+                             'Duración de las peticiones HTTP por ruta', ('route', 'method', 'status'))
+REQUESTS_IN_FLIGHT = Gauge('http_requests_in_flight', 'Peticiones HTTP en curso')
+STAGE_DURATION = Histogram('stage_duration_seconds',
+                           'Tiempo por etapa (sqlite, jwt_decode, upstream, mongo_insert, qr_render, ...)',
+                           ('stage',))
+DB_CALLS = Counter('db_calls_total', 'Llamadas a bases de datos', ('db', 'operation'))
+HTTP_CLIENT_CALLS = Counter('http_client_calls_total', 'Llamadas HTTP salientes', ('target', 'status'))
+
+
+def observe_stage(name, seconds):
+    if METRICS_ENABLED:
+        STAGE_DURATION.observe(seconds, name)
+
+
+@contextmanager
+def stage(name):
+    """Mide un bloque como etapa: ``with stage('jwt_decode'): ...``"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+def count_db_call(db, operation):
+    if METRICS_ENABLED:
+        DB_CALLS.inc(db, operation)
+
+
+def count_http_call(target, status):
+    if METRICS_ENABLED:
+        HTTP_CLIENT_CALLS.inc(target, status)
+
+
+# ===== Profiler por muestreo =====
+_profile_lock = threading.Lock()
+# Funciones en las que un hilo está esperando (no consume CPU)
+IDLE_FILES = ('threading.py', 'selectors.py', 'socketserver.py', 'queue.py', 'socket.py', 'ssl.py')
+
+
+def _stack(frame):
+    names = []
+    while frame is not None and len(names) < PROFILE_MAX_DEPTH:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return names
+
+
+def profile(seconds, interval_ms=PROFILE_INTERVAL_MS, include_idle=False):
+    """Muestrea las pilas de todos los hilos durante ``seconds``.
+
+    Devuelve las pilas en formato "colapsado" (``a;b;c N``), el que usan
+    flamegraph.pl y speedscope. Fuera de una sesión de muestreo no hay coste.
+    Solo se permite una sesión a la vez por proceso: None si ya hay una.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        seconds = max(0.1, min(float(seconds), PROFILE_MAX_SECONDS))
+        interval = max(0.001, interval_ms / 1000)
+        own = threading.get_ident()
+        tally = Tally()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = _stack(frame)
+                if not include_idle and stack[0].split(':', 1)[0] in IDLE_FILES:
+                    continue
+                tally[';'.join(reversed(stack))] += 1
+            samples += 1
+            time.sleep(interval)
+        lines = [f"{stack} {count}" for stack, count in tally.most_common()]
+        header = (f"# pid={os.getpid()} segundos={seconds} intervalo_ms={interval * 1000:g} "
+                  f"muestras={samples}")
+        return '\n'.join([header] + lines) + '\n'
+    finally:
+        _profile_lock.release()
+
+
+# ===== Endpoints internos =====
+def internal_allowed(headers, remote_addr):
+    """True si la petición puede ver un endpoint interno (token o loopback)"""
+    if INTERNAL_TOKEN:
+        supplied = headers.get('X-Internal-Token', '')
+        return hmac.compare_digest(supplied.encode(), INTERNAL_TOKEN.encode())
+    return remote_addr in LOOPBACK_ADDRESSES
+
+
+def internal_endpoint(limiter=None, limit=INTERNAL_RATE_LIMIT):
+    """Decorador Flask: 403 fuera de ``internal_allowed`` y límite propio del endpoint"""
+    from flask import jsonify, request
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not internal_allowed(request.headers, request.remote_addr):
+                return jsonify({"error": "Endpoint interno"}), 403
+            return view(*args, **kwargs)
+        return limiter.limit(limit)(wrapper) if limiter is not None else wrapper
+    return decorator
+
+
+# ===== Integración con Flask =====
+def init_app(app, service, limiter=None):
+    """Registra las métricas de peticiones, GET /metrics y GET /debug/profile"""
+    from flask import Response, g, jsonify, request
+
+    REGISTRY.service = service
+
+    def metrics_start():
+        g._metrics_start = time.perf_counter()
+        g._metrics_in_flight = True
+        REQUESTS_IN_FLIGHT.inc()
+    # Primero de todos: también se miden las peticiones que corta el rate limiter
+    app.before_request_funcs.setdefault(None, []).insert(0, metrics_start)
+
+    @app.after_request
+    def metrics_record(response):
+        start = g.pop('_metrics_start', None)
+        if start is not None and METRICS_ENABLED:
+            # Plantilla de la ruta (/tasks/<int:task_id>), no la URL: cardinalidad acotada
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            REQUEST_DURATION.observe(time.perf_counter() - start, route, request.method, response.status_code)
+        return response
+
+    @app.teardown_request
+    def metrics_finish(exc):
+        if g.pop('_metrics_in_flight', False):
+            REQUESTS_IN_FLIGHT.dec()
+        start = g.pop('_metrics_start', None)
+        if start is not None and METRICS_ENABLED:
+            # Excepción no controlada: after_request no llegó a ejecutarse
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            REQUEST_DURATION.observe(time.perf_counter() - start, route, request.method, 500)
+
+    @app.route('/metrics', methods=['GET'])
+    @internal_endpoint(limiter)
+    def metrics():
+        return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+    @app.route('/debug/profile', methods=['GET'])
+    @internal_endpoint(limiter, PROFILE_RATE_LIMIT)
+    def debug_profile():
+        if not PROFILER_ENABLED:
+            return jsonify({"error": "Profiler desactivado (METRICS_PROFILER_ENABLED=false)"}), 404
+        try:
+            seconds = float(request.args.get('seconds', '5'))
+        except ValueError:
+            return jsonify({"error": "seconds debe ser un número"}), 400
+        result = profile(seconds, include_idle=request.args.get('idle') == 'true')
+        if result is None:
+            return jsonify({"error": "Ya hay un muestreo en curso en este proceso"}), 409
+        return Response(result, content_type='text/plain; charset=utf-8')
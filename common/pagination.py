@@ -0,0 +1,52 @@
+import base64
+import json
+import os
+
+# ===== Paginación por cursor (keyset sobre id) =====
+PAGE_SIZE_DEFAULT = int(os.getenv('PAGE_SIZE_DEFAULT', '100'))
+PAGE_SIZE_MAX = int(os.getenv('PAGE_SIZE_MAX', '500'))
+
+# Cabecera con el cursor de la página siguiente (el gateway la reenvía sin cambios)
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def encode_cursor(last_id):
+    """Cursor opaco a partir del último id devuelto"""
+    raw = json.dumps({"id": last_id}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Último id visto; ValueError si el cursor no es válido"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded.encode()))["id"]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Cursor inválido")
+    # bool es subclase de int: {"id": true} no es un cursor
+    if type(last_id) is not int:
+        raise ValueError("Cursor inválido")
+    return last_id
+
+
+def page_params(args):
+    """(limit, after_id) a partir de los parámetros ``limit`` y ``cursor``"""
+    try:
+        limit = int(args.get('limit', PAGE_SIZE_DEFAULT))
+    except ValueError:
+        raise ValueError("limit debe ser un número entero")
+    if limit < 1:
+        raise ValueError("limit debe ser mayor que 0")
+    limit = min(limit, PAGE_SIZE_MAX)
+
+    cursor = args.get('cursor')
+    after_id = decode_cursor(cursor) if cursor else 0
+    return limit, after_id
+
+
+def split_page(rows, limit):
+    """Recibe limit + 1 filas; devuelve (filas de la página, next_cursor o None)"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1][0])
+    return rows, None
@@ -0,0 +1,233 @@
+import atexit
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+from flask_limiter import Limiter
+from limits.storage import MovingWindowSupport, Storage
+
+from common.storage import Database
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# ===== Configuración del rate limiting compartido =====
+# sqlite:///ruta.db comparte los contadores entre todos los procesos de la máquina;
+# con varias máquinas usar redis://host:6379 (cualquier backend de ``limits``)
+RATELIMIT_STORAGE_URI = os.getenv('RATELIMIT_STORAGE_URI', f"sqlite:///{os.path.join(BASE_DIR, 'ratelimit.db')}")
+RATELIMIT_STRATEGY = os.getenv('RATELIMIT_STRATEGY', 'moving-window')   # moving-window | fixed-window
+RATELIMIT_ENABLED = os.getenv('RATELIMIT_ENABLED', 'true').lower() != 'false'
+# Ventana de agrupación de escrituras (ms), en ambas estrategias. 0 = cada petición escribe en SQLite
+RATELIMIT_BATCH_MS = float(os.getenv('RATELIMIT_BATCH_MS', '50'))
+# Cada cuánto se borran contadores y entradas caducadas (segundos)
+RATELIMIT_CLEANUP_INTERVAL = float(os.getenv('RATELIMIT_CLEANUP_INTERVAL', '60'))
+
+
+class SQLiteStorage(Storage, MovingWindowSupport):
+    """Backend de ``limits`` sobre un archivo SQLite compartido (esquema ``sqlite://``).
+
+    Cada incremento y cada entrada de la ventana deslizante se aplica en una
+    transacción ``BEGIN IMMEDIATE``, así que es atómico entre procesos. Con
+    ``batch_ms`` los incrementos (ventana fija) y las entradas aceptadas
+    (ventana deslizante) se acumulan en memoria y se escriben juntos como mucho
+    cada ``batch_ms``: menos escrituras a cambio de que el límite global pueda
+    excederse en lo acumulado por cada proceso. Si la estimación local llega al
+    límite se sincroniza en el momento, así que nunca se rechaza de más.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri=None, batch_ms=RATELIMIT_BATCH_MS, **options):
+        parsed = urlparse(uri or RATELIMIT_STORAGE_URI)
+        self.path = (parsed.netloc + parsed.path) or os.path.join(BASE_DIR, 'ratelimit.db')
+        self.db = Database(self.path)
+        self.batch_interval = float(batch_ms) / 1000
+        # key -> [pendiente, último valor compartido, expires_at, momento de la última sincronización]
+        self._pending = {}
+        # key -> [entradas (ts, amount) sin escribir, usado según SQLite, momento de la última sincronización]
+        self._window_pending = {}
+        self._local_lock = threading.Lock()
+        self._next_cleanup = 0.0
+        self._init_schema()
+        atexit.register(self.flush)
+        super().__init__(uri, **options)
+
+    def _init_schema(self):
+        with self.db.transaction() as tx:
+            tx.execute('''
+                CREATE TABLE IF NOT EXISTS ratelimit_counters (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            tx.execute('''
+                CREATE TABLE IF NOT EXISTS ratelimit_window (
+                    key TEXT NOT NULL,
+                    ts REAL NOT NULL,
+                    amount INTEGER NOT NULL
+                )
+            ''')
+            tx.execute('CREATE INDEX IF NOT EXISTS idx_ratelimit_window_key_ts ON ratelimit_window (key, ts)')
+
+    # ===== Ventana fija =====
+    def _incr_shared(self, key, expiry, elastic_expiry, amount):
+        """Incremento atómico en SQLite; devuelve (valor, expires_at)"""
+        now = time.time()
+        with self.db.transaction() as tx:
+            tx.execute('''
+                INSERT INTO ratelimit_counters (key, value, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    value = CASE WHEN expires_at <= ? THEN excluded.value ELSE value + excluded.value END,
+                    expires_at = CASE WHEN expires_at <= ? OR ? THEN excluded.expires_at ELSE expires_at END
+            ''', (key, amount, now + expiry, now, now, bool(elastic_expiry)))
+            row = tx.execute('SELECT value, expires_at FROM ratelimit_counters WHERE key = ?', (key,)).fetchone()
+        self._maybe_cleanup(now)
+        return row[0], row[1]
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        if not self.batch_interval or elastic_expiry:
+            return self._incr_shared(key, expiry, elastic_expiry, amount)[0]
+
+        with self._local_lock:
+            entry = self._pending.get(key)
+            now = time.time()
+            # Se sincroniza en el primer hit, al vencer el intervalo o al cambiar de ventana
+            if entry is None or now - entry[3] >= self.batch_interval or now >= entry[2]:
+                pending = entry[0] if entry is not None and now < entry[2] else 0
+                value, expires_at = self._incr_shared(key, expiry, False, pending + amount)
+                self._pending[key] = [0, value, expires_at, now]
+                return value
+            entry[0] += amount
+            return entry[1] + entry[0]
+
+    def flush(self):
+        """Escribe los incrementos y las entradas acumulados en memoria"""
+        with self._local_lock:
+            now = time.time()
+            for key, entry in list(self._pending.items()):
+                if entry[0] and now < entry[2]:
+                    self._incr_shared(key, entry[2] - now, False, entry[0])
+                self._pending.pop(key, None)
+            rows = [(key, ts, n) for key, entry in self._window_pending.items() for ts, n in entry[0]]
+            self._window_pending.clear()
+            if rows:
+                with self.db.transaction() as tx:
+                    tx.executemany('INSERT INTO ratelimit_window (key, ts, amount) VALUES (?, ?, ?)', rows)
+
+    def get(self, key):
+        row = self.db.query_one('SELECT value, expires_at FROM ratelimit_counters WHERE key = ?', (key,))
+        value = row[0] if row and row[1] > time.time() else 0
+        with self._local_lock:
+            entry = self._pending.get(key)
+            if entry is not None and time.time() < entry[2]:
+                value += entry[0]
+        return value
+
+    def get_expiry(self, key):
+        row = self.db.query_one('SELECT expires_at FROM ratelimit_counters WHERE key = ?', (key,))
+        return int(row[0]) if row else int(time.time())
+
+    # ===== Ventana deslizante (moving-window) =====
+    def _acquire_shared(self, key, limit, expiry, pending, amount):
+        """Escribe las entradas pendientes y, si cabe, la nueva; devuelve (aceptada, usado)"""
+        now = time.time()
+        with self.db.transaction() as tx:
+            tx.execute('DELETE FROM ratelimit_window WHERE key = ? AND ts < ?', (key, now - expiry))
+            if pending:
+                # Ya aceptadas en este proceso: se escriben aunque el total pase del límite
+                tx.executemany('INSERT INTO ratelimit_window (key, ts, amount) VALUES (?, ?, ?)',
+                               [(key, ts, n) for ts, n in pending if ts >= now - expiry])
+            used = tx.execute(
+                'SELECT COALESCE(SUM(amount), 0) FROM ratelimit_window WHERE key = ?', (key,)
+            ).fetchone()[0]
+            accepted = used + amount <= limit
+            if accepted:
+                tx.execute('INSERT INTO ratelimit_window (key, ts, amount) VALUES (?, ?, ?)', (key, now, amount))
+                used += amount
+        self._maybe_cleanup(now)
+        return accepted, used
+
+    def acquire_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        if not self.batch_interval:
+            return self._acquire_shared(key, limit, expiry, (), amount)[0]
+
+        with self._local_lock:
+            now = time.time()
+            entry = self._window_pending.get(key)
+            # Dentro del intervalo y con hueco según la última lectura: solo se anota en memoria
+            if entry is not None and now - entry[2] < self.batch_interval:
+                if entry[1] + sum(n for _, n in entry[0]) + amount <= limit:
+                    entry[0].append((now, amount))
+                    return True
+            pending = entry[0] if entry is not None else []
+            accepted, used = self._acquire_shared(key, limit, expiry, pending, amount)
+            self._window_pending[key] = [[], used, now]
+            return accepted
+
+    def get_moving_window(self, key, limit, expiry):
+        now = time.time()
+        row = self.db.query_one(
+            'SELECT MIN(ts), COALESCE(SUM(amount), 0) FROM ratelimit_window WHERE key = ? AND ts >= ?',
+            (key, now - expiry)
+        )
+        entries = [(row[0], row[1])] if row[0] is not None else []
+        with self._local_lock:
+            entry = self._window_pending.get(key)
+            if entry is not None:
+                entries.extend((ts, n) for ts, n in entry[0] if ts >= now - expiry)
+        start = min((ts for ts, _ in entries), default=now)
+        return int(start), sum(n for _, n in entries)
+
+    # ===== Mantenimiento =====
+    def _maybe_cleanup(self, now):
+        if now < self._next_cleanup:
+            return
+        self._next_cleanup = now + RATELIMIT_CLEANUP_INTERVAL
+        self.db.execute('DELETE FROM ratelimit_counters WHERE expires_at <= ?', (now,))
+        # Ninguna ventana de las usadas en los servicios pasa de un día
+        self.db.execute('DELETE FROM ratelimit_window WHERE ts < ?', (now - 86400,))
+
+    def check(self):
+        try:
+            self.db.query_one('SELECT 1')
+            return True
+        except Exception:
+            return False
+
+    def reset(self):
+        with self._local_lock:
+            self._pending.clear()
+            self._window_pending.clear()
+        with self.db.transaction() as tx:
+            removed = tx.execute('DELETE FROM ratelimit_counters').rowcount
+            removed += tx.execute('DELETE FROM ratelimit_window').rowcount
+        return removed
+
+    def clear(self, key):
+        with self._local_lock:
+            self._pending.pop(key, None)
+            self._window_pending.pop(key, None)
+        with self.db.transaction() as tx:
+            tx.execute('DELETE FROM ratelimit_counters WHERE key = ?', (key,))
+            tx.execute('DELETE FROM ratelimit_window WHERE key = ?', (key,))
+
+
+def create_limiter(app, key_func, default_limits, key_prefix, **kwargs):
+    """Limiter de flask-limiter con el almacenamiento compartido configurado por entorno.
+
+    ``key_prefix`` (nombre del servicio) separa las claves de cada servicio
+    dentro del mismo almacenamiento.
+    """
+    return Limiter(
+        key_func,
+        app=app,
+        default_limits=default_limits,
+        storage_uri=RATELIMIT_STORAGE_URI,
+        strategy=RATELIMIT_STRATEGY,
+        key_prefix=key_prefix,
+        enabled=RATELIMIT_ENABLED,
+        **kwargs
+    )
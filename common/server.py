@@ -0,0 +1,64 @@
+import argparse
+import os
+
+from flask import jsonify, request
+
+# ===== Arranque de los servicios =====
+# Con start_services.sh en modo prod los servicios corren bajo gunicorn y este
+# módulo solo aporta /health; ``run`` es el servidor de desarrollo de Flask.
+FLASK_DEBUG = os.getenv('FLASK_DEBUG', 'true').lower() == 'true'
+
+
+def server_port(default):
+    """Puerto de ``--port``, de la variable PORT o el del servicio"""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--port', type=int)
+    args, _ = parser.parse_known_args()
+    return args.port or int(os.getenv('PORT', default))
+
+
+def register_health(app, limiter, check=None):
+    """GET /health: 200 si el servicio puede atender peticiones, 503 si no.
+
+    ``check`` comprueba las dependencias (SQLite, MongoDB) y lanza una
+    excepción si alguna no responde. start_services.sh espera a este endpoint.
+    """
+    @app.route('/health', methods=['GET'])
+    @limiter.exempt
+    def health():
+        try:
+            if check is not None:
+                check()
+        except Exception as e:
+            return jsonify({"status": "unavailable", "error": str(e)}), 503
+        return jsonify({"status": "ok"})
+    return health
+
+
+# Endpoints que responden aunque la base de datos aún no esté disponible
+UNGUARDED_ENDPOINTS = ('health', 'metrics', 'debug_profile')
+
+
+def require_resources(app, *resources):
+    """Inicializa los ``LazyResource`` (common/lazy.py) antes de cada petición.
+
+    Mientras alguno falle la petición recibe 503 y se reintenta en la
+    siguiente; el proceso arranca y escucha sin esperar a la base de datos.
+    """
+    @app.before_request
+    def ensure_resources():
+        if request.endpoint in UNGUARDED_ENDPOINTS:
+            return None
+        for resource in resources:
+            try:
+                resource.get()
+            except Exception as e:
+                return jsonify({"error": "Servicio no disponible temporalmente", "recurso": resource.name,
+                                "detalle": str(e)}), 503
+        return None
+    return ensure_resources
+
+
+def run(app, default_port):
+    """Servidor de desarrollo (python app.py [--port N])"""
+    app.run(host=os.getenv('HOST', '127.0.0.1'), port=server_port(default_port), debug=FLASK_DEBUG)
@@ -0,0 +1,195 @@
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from common.metrics import count_db_call, observe_stage
+
+# ===== Configuración de SQLite (variables de entorno) =====
+SQLITE_POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', '8'))
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')        # OFF | NORMAL | FULL
+SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', '-16000'))      # negativo = KiB
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', '268435456'))     # bytes
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+SQLITE_STATEMENT_CACHE = int(os.getenv('SQLITE_STATEMENT_CACHE', '256'))
+SQLITE_MAX_RETRIES = int(os.getenv('SQLITE_MAX_RETRIES', '5'))
+SQLITE_RETRY_BACKOFF = float(os.getenv('SQLITE_RETRY_BACKOFF', '0.02'))  # segundos
+
+
+def _is_busy(error):
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+class Transaction:
+    """Conexión en uso dentro de ``Database.transaction()``"""
+
+    def __init__(self, db, conn):
+        self._db = db
+        self.connection = conn
+
+    def execute(self, sql, params=()):
+        return self._db._timed(sql, lambda: self.connection.execute(sql, params))
+
+    def executemany(self, sql, seq_of_params):
+        return self._db._timed(sql, lambda: self.connection.executemany(sql, seq_of_params))
+
+
+class Database:
+    """Acceso a un archivo SQLite compartido por todos los hilos del servicio.
+
+    - Pool de conexiones reutilizables (cada una conserva su caché de sentencias
+      preparadas).
+    - Modo WAL y pragmas configurables (synchronous, cache_size, mmap_size).
+    - Reintentos con backoff cuando la base está bloqueada por otro escritor.
+    - Conteo de consultas y latencias por tipo de sentencia (``stats()``).
+    """
+
+    def __init__(self, path, pool_size=SQLITE_POOL_SIZE, synchronous=SQLITE_SYNCHRONOUS,
+                 cache_size=SQLITE_CACHE_SIZE, mmap_size=SQLITE_MMAP_SIZE,
+                 busy_timeout_ms=SQLITE_BUSY_TIMEOUT_MS, max_retries=SQLITE_MAX_RETRIES):
+        self.path = path
+        # Nombre en las métricas: "sqlite:tasks", "sqlite:ratelimit", ...
+        self.metrics_name = 'sqlite:' + os.path.splitext(os.path.basename(path))[0]
+        self.pool_size = pool_size
+        self.synchronous = synchronous
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.max_retries = max_retries
+
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._connections_created = 0
+        self._busy_retries = 0
+        self._busy_errors = 0
+
+    # ===== Conexiones =====
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            isolation_level=None,               # transacciones explícitas
+            check_same_thread=False,            # la conexión cambia de hilo al volver al pool
+            cached_statements=SQLITE_STATEMENT_CACHE
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        conn.execute(f'PRAGMA cache_size={int(self.cache_size)}')
+        conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        with self._lock:
+            self._connections_created += 1
+        return conn
+
+    def _acquire(self):
+        # Las conexiones no se comparten entre procesos (workers tras un fork)
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pool = queue.LifoQueue(maxsize=self.pool_size)
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    # ===== Ejecución con reintentos y métricas =====
+    def _retry(self, operation):
+        attempt = 0
+        while True:
+            try:
+                return operation()
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e) or attempt >= self.max_retries:
+                    if _is_busy(e):
+                        with self._lock:
+                            self._busy_errors += 1
+                    raise
+                # Backoff exponencial con jitter
+                delay = SQLITE_RETRY_BACKOFF * (2 ** attempt) * (0.5 + random.random())
+                with self._lock:
+                    self._busy_retries += 1
+                time.sleep(delay)
+                attempt += 1
+
+    def _timed(self, sql, operation):
+        kind = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else 'OTHER'
+        start = time.perf_counter()
+        try:
+            return self._retry(operation)
+        finally:
+            elapsed = time.perf_counter() - start
+            elapsed_ms = elapsed * 1000
+            observe_stage(self.metrics_name, elapsed)
+            count_db_call(self.metrics_name, kind)
+            with self._lock:
+                entry = self._stats.setdefault(kind, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+                entry["count"] += 1
+                entry["total_ms"] += elapsed_ms
+                entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+
+    def query_all(self, sql, params=()):
+        with self.connection() as conn:
+            return self._timed(sql, lambda: conn.execute(sql, params).fetchall())
+
+    def query_one(self, sql, params=()):
+        with self.connection() as conn:
+            return self._timed(sql, lambda: conn.execute(sql, params).fetchone())
+
+    def execute(self, sql, params=()):
+        """Escritura en autocommit; devuelve el cursor (lastrowid / rowcount)"""
+        with self.connection() as conn:
+            return self._timed(sql, lambda: conn.execute(sql, params))
+
+    @contextmanager
+    def transaction(self):
+        """Transacción de escritura (BEGIN IMMEDIATE): COMMIT al salir, ROLLBACK si hay error"""
+        with self.connection() as conn:
+            self._timed('BEGIN', lambda: conn.execute('BEGIN IMMEDIATE'))
+            try:
+                yield Transaction(self, conn)
+            except BaseException:
+                conn.rollback()
+                raise
+            self._timed('COMMIT', lambda: conn.execute('COMMIT'))
+
+    def stats(self):
+        with self._lock:
+            queries = {
+                kind: {
+                    "count": entry["count"],
+                    "avg_ms": round(entry["total_ms"] / entry["count"], 3) if entry["count"] else 0,
+                    "max_ms": round(entry["max_ms"], 3),
+                }
+                for kind, entry in self._stats.items()
+            }
+            return {
+                "path": self.path,
+                "pool_size": self.pool_size,
+                "idle_connections": self._pool.qsize(),
+                "connections_created": self._connections_created,
+                "busy_retries": self._busy_retries,
+                "busy_errors": self._busy_errors,
+                "queries": queries,
+            }
@@ -1,87 +1,298 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request, abort, make_response
 from flask_cors import CORS
-from pymongo import MongoClient
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from pymongo.errors import PyMongoError
+from bson import ObjectId
 from dotenv import load_dotenv
+from collections import namedtuple
+from datetime import datetime, timezone
+import json
 import os
+import sys
 from pathlib import Path
-from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
 # Cargar variables de entorno
 env_path = Path(__file__).parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
+sys.path.insert(0, str(env_path.parent))
+
+from common.ratelimit import create_limiter
+from common import metrics
+from rollups import LogRollups
+from sketch import DEFAULT_QUANTILES, SKETCH_RELATIVE_ACCURACY, quantile_label
+from common.server import register_health, require_resources, run
+from common.lazy import LazyResource
 
 MONGO_URI = os.getenv("MONGO_URI")
 if not MONGO_URI:
     raise ValueError("No se encontró MONGO_URI en .env")
 
-# Conexión a MongoDB
-client = MongoClient(MONGO_URI)
-db = client["Logs"]        
-logs_collection = db["Logs"]  
+# Timeout corto: con Mongo caído /health y los endpoints fallan rápido en vez de esperar 30 s
+MONGO_TIMEOUT_MS = int(os.getenv('MONGO_TIMEOUT_MS', '5000'))
+
+MongoStore = namedtuple('MongoStore', 'client logs rollups')
+
+def connect_mongo():
+    """Conexión a MongoDB; se crea en la primera petición (y se reintenta si falla)"""
+    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=MONGO_TIMEOUT_MS)
+    db = client["Logs"]
+    # Buckets pre-agregados; los endpoints ya no recorren toda la colección de logs
+    log_rollups = LogRollups(db["Logs"], db["LogRollups"], db["LogRollupState"])
+    # La consolidación (y el backfill inicial) corre en un hilo de fondo, no en las peticiones
+    log_rollups.start()
+    return MongoStore(client, db["Logs"], log_rollups)
+
+mongo = LazyResource('mongo', connect_mongo)
 
 app = Flask(__name__)
 CORS(app)
 
 # ==== Rate Limiting ====
-limiter = Limiter(
+limiter = create_limiter(
+    app,
     get_remote_address,
-    app=app,
-    default_limits=["60 per minute"]  # Límite global
+    default_limits=["60 per minute"],  # Límite global
+    key_prefix='logs-service'
 )
+# Métricas Prometheus en /metrics y profiler en /debug/profile
+metrics.init_app(app, 'logs-service', limiter)
+require_resources(app, mongo)
+
+def rollups():
+    return mongo.get().rollups
+
+def parse_time(name):
+    """Parámetro de fecha ISO 8601 (sin zona = UTC) como datetime UTC naive"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def time_range():
+    """(from, to) de la query; 400 si alguna fecha no es válida"""
+    try:
+        return parse_time('from'), parse_time('to')
+    except ValueError as e:
+        abort(make_response(jsonify({"error": "Rango de fechas inválido (usar ISO 8601)", "detalle": str(e)}), 400))
 
 # Endpoint: Conteo por status code
 @app.route("/logs/status-count", methods=["GET"])
 @limiter.limit("10 per minute")
 def get_status_count():
-    pipeline = [
-        {"$group": {"_id": "$status", "total": {"$sum": 1}}},
-        {"$sort": {"_id": 1}}
-    ]
-    result = list(logs_collection.aggregate(pipeline))
+    totals = rollups().totals('status', *time_range())
+    result = [{"_id": status, "total": stats["count"]} for status, stats in totals.items()]
+    result.sort(key=lambda row: (row["_id"] is not None, row["_id"]))
     return jsonify(result)
 
 # Endpoint: Response time promedio
 @app.route("/logs/average-response", methods=["GET"])
 @limiter.limit("10 per minute")
 def get_average_response():
-    pipeline = [
-        {"$group": {"_id": None, "promedio_ms": {"$avg": "$duration_ms"}}}
-    ]
-    result = list(logs_collection.aggregate(pipeline))
-    return jsonify(result[0] if result else {})
+    stats = rollups().totals(None, *time_range()).get(None)
+    if not stats or not stats["count"]:
+        return jsonify({})
+    promedio = stats["sum_ms"] / stats["n_ms"] if stats["n_ms"] else None
+    return jsonify({"_id": None, "promedio_ms": promedio})
 
 # Endpoint: Response time más rápido y más lento
 @app.route("/logs/minmax-response", methods=["GET"])
 @limiter.limit("10 per minute")
 def get_minmax_response():
-    pipeline = [
-        {"$group": {
-            "_id": None,
-            "mas_rapido": {"$min": "$duration_ms"},
-            "mas_lento": {"$max": "$duration_ms"}
-        }}
-    ]
-    result = list(logs_collection.aggregate(pipeline))
-    return jsonify(result[0] if result else {})
+    stats = rollups().totals(None, *time_range()).get(None)
+    if not stats or not stats["count"]:
+        return jsonify({})
+    return jsonify({"_id": None, "mas_rapido": stats["min_ms"], "mas_lento": stats["max_ms"]})
 
 # Endpoint: API más y menos consumida
 @app.route("/logs/api-usage", methods=["GET"])
 @limiter.limit("10 per minute")
 def get_api_usage():
-    pipeline = [
-        {"$group": {"_id": "$path", "total": {"$sum": 1}}},
-        {"$sort": {"total": -1}}
-    ]
-    result = list(logs_collection.aggregate(pipeline))
+    totals = rollups().totals('path', *time_range())
+    result = [{"_id": path, "total": stats["count"]} for path, stats in totals.items()]
+    result.sort(key=lambda row: row["total"], reverse=True)
     return jsonify(result)
 
 # Endpoint: Total de logs
 @app.route("/logs/total", methods=["GET"])
 @limiter.limit("10 per minute")
 def get_total_logs():
-    total = logs_collection.count_documents({})
-    return jsonify({"total_logs": total})
+    stats = rollups().totals(None, *time_range()).get(None)
+    return jsonify({"total_logs": stats["count"] if stats else 0})
+
+def dimension_filters():
+    """Filtros opcionales ?service= y ?path= para percentiles e histogramas"""
+    return {name: request.args[name] for name in ('service', 'path') if request.args.get(name)}
+
+def requested_quantiles():
+    """?q=50,99,99.9 (percentiles) o los de siempre: p50, p90, p95, p99, p999"""
+    value = request.args.get('q')
+    if not value:
+        return DEFAULT_QUANTILES
+    try:
+        qs = tuple(float(part) / 100 for part in value.split(','))
+    except ValueError:
+        abort(make_response(jsonify({"error": "q debe ser una lista de percentiles, p. ej. 50,99,99.9"}), 400))
+    if any(not 0 <= q <= 1 for q in qs):
+        abort(make_response(jsonify({"error": "Los percentiles deben estar entre 0 y 100"}), 400))
+    return qs
+
+def requested_group():
+    group_by = request.args.get('group_by')
+    if group_by not in (None, 'service', 'path'):
+        abort(make_response(jsonify({"error": "group_by debe ser service o path"}), 400))
+    return group_by
+
+# Endpoint: Percentiles de latencia (por servicio, ruta y ventana de tiempo)
+@app.route("/logs/percentiles", methods=["GET"])
+@limiter.limit("10 per minute")
+def get_percentiles():
+    group_by = requested_group()
+    qs = requested_quantiles()
+    sketches = rollups().histograms(group_by, *time_range(), filters=dimension_filters())
+
+    def summary(sketch):
+        return {"count": sketch.count, **sketch.quantiles(qs)}
+
+    if group_by is None:
+        sketch = sketches.get(None)
+        return jsonify(summary(sketch) if sketch else {"count": 0, **{quantile_label(q): None for q in qs}})
+    result = [{"_id": key, **summary(sketch)} for key, sketch in sketches.items()]
+    result.sort(key=lambda row: row["count"], reverse=True)
+    return jsonify(result)
+
+# Endpoint: Histograma de latencias (buckets logarítmicos, para dashboards)
+@app.route("/logs/histogram", methods=["GET"])
+@limiter.limit("10 per minute")
+def get_histogram():
+    sketch = rollups().histograms(None, *time_range(), filters=dimension_filters()).get(None)
+    return jsonify({
+        "count": sketch.count if sketch else 0,
+        "relative_accuracy": SKETCH_RELATIVE_ACCURACY,
+        "buckets": sketch.buckets() if sketch else []
+    })
+
+# ===== Consulta de logs sin agregar (NDJSON) =====
+QUERY_FIELDS = ('timestamp', 'method', 'path', 'service', 'user', 'status', 'duration_ms')
+QUERY_BATCH_SIZE = int(os.getenv('LOGS_QUERY_BATCH_SIZE', '500'))
+QUERY_MAX_BATCH_SIZE = 5000
+# Bytes que se juntan antes de escribir al socket (evita un write por documento)
+QUERY_CHUNK_SIZE = 64 * 1024
+
+def int_arg(name, default=None, minimum=0, maximum=None):
+    value = request.args.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        abort(make_response(jsonify({"error": f"{name} debe ser un entero"}), 400))
+    if number < minimum or (maximum is not None and number > maximum):
+        abort(make_response(jsonify({"error": f"{name} fuera de rango ({minimum}..{maximum or ''})"}), 400))
+    return number
+
+def log_query():
+    """Filtro de Mongo a partir de la query; usa los índices de common/logstore.py"""
+    query = {name: request.args[name] for name in ('service', 'path', 'user', 'method')
+             if request.args.get(name)}
+    statuses = request.args.get('status')
+    if statuses:
+        try:
+            codes = [int(code) for code in statuses.split(',')]
+        except ValueError:
+            abort(make_response(jsonify({"error": "status debe ser un código o una lista, p. ej. 500,502"}), 400))
+        query['status'] = codes[0] if len(codes) == 1 else {"$in": codes}
+    min_duration = request.args.get('min_duration_ms')
+    if min_duration:
+        try:
+            query['duration_ms'] = {"$gte": float(min_duration)}
+        except ValueError:
+            abort(make_response(jsonify({"error": "min_duration_ms debe ser un número"}), 400))
+    start, end = time_range()
+    if start is not None or end is not None:
+        query['timestamp'] = {}
+        if start is not None:
+            query['timestamp']['$gte'] = start
+        if end is not None:
+            query['timestamp']['$lt'] = end
+    return query
+
+def log_projection():
+    fields = request.args.get('fields')
+    names = fields.split(',') if fields else QUERY_FIELDS
+    unknown = [name for name in names if name not in QUERY_FIELDS]
+    if unknown:
+        abort(make_response(jsonify({"error": f"Campos no válidos: {', '.join(unknown)}",
+                                     "campos": QUERY_FIELDS}), 400))
+    return {"_id": 0, **{name: 1 for name in names}}
+
+def to_json(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+# Endpoint: Logs sin agregar como NDJSON (un documento JSON por línea)
+@app.route("/logs/query", methods=["GET"])
+@limiter.limit("10 per minute")
+def query_logs():
+    query = log_query()
+    projection = log_projection()
+    batch_size = int_arg('batch_size', QUERY_BATCH_SIZE, minimum=1, maximum=QUERY_MAX_BATCH_SIZE)
+    limit = int_arg('limit', 0)
+    order = DESCENDING if request.args.get('order') == 'desc' else ASCENDING
+
+    # Cursor del servidor: en memoria solo hay un lote de batch_size documentos a la vez
+    metrics.count_db_call('mongo', 'find')
+    cursor = mongo.get().logs.find(query, projection).sort('timestamp', order).batch_size(batch_size)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    def generate():
+        chunk = []
+        size = 0
+        try:
+            for document in cursor:
+                line = json.dumps(document, default=to_json, ensure_ascii=False) + '\n'
+                chunk.append(line)
+                size += len(line)
+                if size >= QUERY_CHUNK_SIZE:
+                    yield ''.join(chunk)
+                    chunk, size = [], 0
+            if chunk:
+                yield ''.join(chunk)
+        except PyMongoError as e:
+            # El status 200 ya se envió: la última línea indica que el resultado está incompleto
+            yield ''.join(chunk) + json.dumps({"error": "Consulta interrumpida", "detalle": str(e)}) + '\n'
+        finally:
+            cursor.close()
+
+    # no-store: el gateway no lo guarda en su caché y lo transmite sin acumularlo
+    return Response(generate(), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-store'})
+
+# Endpoint: Consolidar ahora los logs pendientes (p. ej. tras una carga masiva)
+@app.route("/logs/rollups/refresh", methods=["POST"])
+@limiter.limit("6 per minute")
+def refresh_rollups():
+    # ?rebuild=true vuelve a consolidar todo (p. ej. tras cambiar SKETCH_RELATIVE_ACCURACY)
+    if request.args.get('rebuild') == 'true':
+        try:
+            folded = rollups().rebuild()
+        except RuntimeError as e:
+            return jsonify({"error": str(e)}), 409
+    else:
+        folded = rollups().refresh(force=True)
+    return jsonify({"folded": folded, "watermark": str(rollups().watermark())})
+
+# Disponibilidad del servicio y de su base de datos (start_services.sh espera a este endpoint)
+register_health(app, limiter, lambda: mongo.get().client.admin.command('ping'))
 
 if __name__ == "__main__":
-    app.run(port=5004, debug=True)
+    run(app, 5004)
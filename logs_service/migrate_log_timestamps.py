@@ -0,0 +1,78 @@
+"""Convierte los timestamps de texto de Logs.Logs en fechas UTC y crea los índices.
+
+Los logs antiguos guardaban ``timestamp`` como texto en hora local
+(``LOGS_TIMEZONE``, America/Mexico_City). Con texto no sirven los índices por
+fecha, el orden falla en los cambios de horario y el TTL no los borra.
+
+    python logs_service/migrate_log_timestamps.py --dry-run
+    python logs_service/migrate_log_timestamps.py
+
+Se puede ejecutar con el gateway en marcha y repetir sin efectos: solo toca los
+documentos que aún tienen el timestamp como texto. Los rollups no cambian (ya
+convertían el texto al consolidar). Solo con ``LOGS_RETENTION_DAYS`` mayor que 0
+el índice tiene caducidad: entonces Mongo borra los logs más antiguos.
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+env_path = Path(__file__).parent.parent / '.env'
+load_dotenv(dotenv_path=env_path)
+sys.path.insert(0, str(env_path.parent))
+
+from common.logstore import LOGS_TIMESERIES, prepare_logs_collection, retention_seconds
+from rollups import log_time
+
+
+def migrate(collection, batch_size, dry_run=False):
+    query = {"timestamp": {"$type": "string"}}
+    if dry_run:
+        return collection.count_documents(query)
+    converted = 0
+    while True:
+        # Siempre desde el principio: los ya convertidos dejan de cumplir el filtro
+        batch = list(collection.find(query, {"timestamp": 1}).limit(batch_size))
+        if not batch:
+            return converted
+        collection.bulk_write([
+            UpdateOne({"_id": document["_id"], "timestamp": document["timestamp"]},
+                      {"$set": {"timestamp": log_time(document)}})
+            for document in batch
+        ], ordered=False)
+        converted += len(batch)
+        print(f"{converted} documentos convertidos", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mongo-uri', default=os.getenv('MONGO_URI'))
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--dry-run', action='store_true', help='solo cuenta los documentos a convertir')
+    parser.add_argument('--skip-indexes', action='store_true', help='no crea índices ni retención')
+    args = parser.parse_args()
+    if not args.mongo_uri:
+        parser.error("Falta MONGO_URI (variable de entorno o --mongo-uri)")
+
+    db = MongoClient(args.mongo_uri)["Logs"]
+    if args.dry_run:
+        print(f"{migrate(db['Logs'], args.batch_size, dry_run=True)} documentos con timestamp de texto")
+        return
+
+    converted = migrate(db["Logs"], args.batch_size)
+    print(f"Conversión terminada: {converted} documentos")
+    if args.skip_indexes:
+        return
+    if LOGS_TIMESERIES and 'timeseries' not in db["Logs"].options() and "Logs" in db.list_collection_names():
+        print("Aviso: Logs.Logs ya existe como colección normal; LOGS_TIMESERIES solo aplica al crearla")
+    prepare_logs_collection(db, "Logs")
+    expire = retention_seconds()
+    retention = f"{expire // 86400} días" if expire else "sin límite"
+    print(f"Índices creados; retención: {retention}")
+
+
+if __name__ == '__main__':
+    main()
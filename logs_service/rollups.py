@@ -0,0 +1,504 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from common.metrics import count_db_call, stage
+from sketch import LatencySketch, bucket_key, bucket_key_expression
+
+# ===== Configuración de los rollups =====
+# Los logs más recientes que este margen no se consolidan todavía: el gateway los
+# envía por lotes y un lote puede llegar con _id algo anteriores al último visto
+ROLLUP_LAG_SECONDS = float(os.getenv('ROLLUP_LAG_SECONDS', '60'))
+# Cada cuánto consolida la cola el hilo de fondo (las consultas ya no consolidan)
+ROLLUP_REFRESH_INTERVAL = float(os.getenv('ROLLUP_REFRESH_INTERVAL', '10'))
+# Un solo proceso consolida a la vez: el que tiene la concesión (se renueva en cada lote)
+ROLLUP_LEASE_SECONDS = float(os.getenv('ROLLUP_LEASE_SECONDS', '60'))
+# Lecturas que coinciden con un lote a medio consolidar se repiten (hasta N veces)
+ROLLUP_READ_ATTEMPTS = int(os.getenv('ROLLUP_READ_ATTEMPTS', '5'))
+ROLLUP_READ_BACKOFF = 0.05
+ROLLUP_BATCH_SIZE = int(os.getenv('ROLLUP_BATCH_SIZE', '5000'))
+# Máximo de logs consolidados por refresco (el resto se suma como cola)
+ROLLUP_MAX_FOLD = int(os.getenv('ROLLUP_MAX_FOLD', '100000'))
+# Zona horaria de los timestamps antiguos guardados como texto
+LOGS_TIMEZONE = ZoneInfo(os.getenv('LOGS_TIMEZONE', 'America/Mexico_City'))
+
+GRANULARITIES = ('minute', 'hour')
+DIMENSIONS = ('service', 'path', 'status')
+STATE_ID = 'logs'
+DUPLICATE_KEY = 11000
+
+logger = logging.getLogger(__name__)
+
+
+def floor_to(moment, granularity):
+    if granularity == 'minute':
+        return moment.replace(second=0, microsecond=0)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def ceil_to(moment, granularity):
+    floored = floor_to(moment, granularity)
+    if floored == moment:
+        return moment
+    return floored + (timedelta(minutes=1) if granularity == 'minute' else timedelta(hours=1))
+
+
+def log_time(document):
+    """Momento del log en UTC (naive); acepta timestamp como texto o como fecha"""
+    value = document.get('timestamp')
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+    if isinstance(value, str):
+        try:
+            local = datetime.strptime(value, '%Y-%m-%d %H:%M:%S').replace(tzinfo=LOGS_TIMEZONE)
+            return local.astimezone(timezone.utc).replace(tzinfo=None)
+        except ValueError:
+            pass
+    # Sin timestamp utilizable: momento de creación del _id
+    return document['_id'].generation_time.replace(tzinfo=None)
+
+
+def empty_stats():
+    # hist: conteos por bucket del histograma de latencias (ver sketch.py)
+    return {"count": 0, "n_ms": 0, "sum_ms": 0, "min_ms": None, "max_ms": None, "hist": {}}
+
+
+def add_sample(stats, duration):
+    stats["count"] += 1
+    # Igual que $avg/$min/$max: los valores no numéricos no cuentan
+    if isinstance(duration, (int, float)) and not isinstance(duration, bool):
+        stats["n_ms"] += 1
+        stats["sum_ms"] += duration
+        stats["min_ms"] = duration if stats["min_ms"] is None else min(stats["min_ms"], duration)
+        stats["max_ms"] = duration if stats["max_ms"] is None else max(stats["max_ms"], duration)
+        key = bucket_key(duration)
+        stats["hist"][key] = stats["hist"].get(key, 0) + 1
+
+
+def merge_stats(stats, other):
+    stats["count"] += other["count"]
+    stats["n_ms"] += other["n_ms"]
+    stats["sum_ms"] += other["sum_ms"]
+    for key, pick in (("min_ms", min), ("max_ms", max)):
+        if other[key] is not None:
+            stats[key] = other[key] if stats[key] is None else pick(stats[key], other[key])
+    for key, count in other["hist"].items():
+        stats["hist"][key] = stats["hist"].get(key, 0) + count
+
+
+class LogRollups:
+    """Buckets por minuto y por hora (service, path, status) con count, sum, min y max.
+
+    Cada bucket guarda además el histograma de latencias (``hist.<idx>``), que se
+    combina sumando conteos y permite calcular percentiles sin ordenar logs.
+
+    Los logs se consolidan de forma incremental siguiendo el ``_id`` (marca de
+    agua guardada en ``state``), en un hilo de fondo (``start()``). Las consultas
+    leen los buckets y suman en memoria solo la cola de logs que todavía no se ha
+    consolidado.
+
+    Cada bucket guarda el último lote que se le sumó (``wm``): repetir un lote
+    tras una caída no lo cuenta dos veces. ``state`` lleva además el lote en curso
+    (``pending``) y una ``version`` por lote terminado, para que los lectores
+    detecten que leyeron los buckets a mitad de un lote y repitan la lectura.
+
+    Mientras no hay nada consolidado (primer arranque, ``rebuild()``) o si no se
+    consigue una lectura estable, la consulta se agrega en Mongo sobre los logs.
+    """
+
+    def __init__(self, logs, rollups, state):
+        self.logs = logs
+        self.rollups = rollups
+        self.state = state
+        self.owner = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._indexes_ready = False
+        self._last_refresh = 0.0
+        self._thread = None
+
+    def ensure_indexes(self):
+        if self._indexes_ready:
+            return
+        self.rollups.create_index(
+            [("granularity", ASCENDING), ("bucket", ASCENDING)]
+            + [(name, ASCENDING) for name in DIMENSIONS],
+            unique=True, name="rollup_key"
+        )
+        self._indexes_ready = True
+
+    def _state(self):
+        return self.state.find_one({"_id": STATE_ID}) or {}
+
+    def watermark(self):
+        return self._state().get("watermark")
+
+    # ===== Consolidación en segundo plano =====
+    def start(self):
+        """Lanza el hilo que consolida cada ROLLUP_REFRESH_INTERVAL (uno por proceso)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='rollup-fold', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                folded = self.refresh(force=True)
+            except Exception as e:
+                logger.error(f"Error consolidando los rollups de logs: {e!r}")
+                folded = 0
+            # Backfill (p. ej. el primer arranque): sigue sin esperar mientras haya lotes llenos
+            if folded < ROLLUP_MAX_FOLD:
+                time.sleep(ROLLUP_REFRESH_INTERVAL)
+
+    # ===== Concesión entre procesos =====
+    def _acquire_lease(self):
+        now = datetime.now(timezone.utc)
+        try:
+            self.state.find_one_and_update(
+                {"_id": STATE_ID, "$or": [{"lease_until": {"$lt": now}},
+                                          {"lease_until": {"$exists": False}},
+                                          {"lease_owner": self.owner}]},
+                {"$set": {"lease_owner": self.owner, "lease_until": now + timedelta(seconds=ROLLUP_LEASE_SECONDS)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False   # la tiene otro proceso
+        return True
+
+    def _renew_lease(self, pending):
+        """Renueva la concesión y marca el lote en curso; False si se perdió"""
+        until = datetime.now(timezone.utc) + timedelta(seconds=ROLLUP_LEASE_SECONDS)
+        result = self.state.update_one({"_id": STATE_ID, "lease_owner": self.owner},
+                                       {"$set": {"lease_until": until, "pending": pending}})
+        return result.matched_count == 1
+
+    def _release_lease(self):
+        self.state.update_one({"_id": STATE_ID, "lease_owner": self.owner},
+                              {"$set": {"lease_until": datetime.now(timezone.utc)}})
+
+    # ===== Consolidación =====
+    def refresh(self, force=False):
+        """Consolida los logs pendientes si toca; nunca bloquea a otra consulta"""
+        if not force and time.monotonic() - self._last_refresh < ROLLUP_REFRESH_INTERVAL:
+            return 0
+        if not self._lock.acquire(blocking=force):
+            return 0
+        try:
+            self.ensure_indexes()
+            if not self._acquire_lease():
+                return 0
+            try:
+                with stage('rollup_fold'):
+                    folded = self._fold()
+            finally:
+                self._release_lease()
+            self._last_refresh = time.monotonic()
+            return folded
+        finally:
+            self._lock.release()
+
+    def _fold(self):
+        cutoff = ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(seconds=ROLLUP_LAG_SECONDS))
+        # Tras una caída a mitad de lote se parte de la misma marca de agua: los buckets
+        # que ya tienen ese lote (wm) lo ignoran
+        watermark = self.watermark()
+        folded = 0
+        while folded < ROLLUP_MAX_FOLD:
+            id_range = {"$lt": cutoff}
+            if watermark is not None:
+                id_range["$gt"] = watermark
+            batch = list(self.logs.find(
+                {"_id": id_range},
+                {"timestamp": 1, "service": 1, "path": 1, "status": 1, "duration_ms": 1}
+            ).sort("_id", ASCENDING).limit(ROLLUP_BATCH_SIZE))
+            if not batch:
+                break
+
+            buckets = {}
+            for document in batch:
+                moment = log_time(document)
+                dims = tuple(document.get(name) for name in DIMENSIONS)
+                for granularity in GRANULARITIES:
+                    key = (granularity, floor_to(moment, granularity)) + dims
+                    add_sample(buckets.setdefault(key, empty_stats()), document.get('duration_ms'))
+
+            end = batch[-1]["_id"]
+            if not self._renew_lease(pending=end):
+                break   # otro proceso tomó la concesión (esta expiró)
+            self._apply(buckets, end)
+            self.state.update_one({"_id": STATE_ID, "lease_owner": self.owner},
+                                  {"$set": {"watermark": end, "pending": None}, "$inc": {"version": 1}})
+            watermark = end
+            folded += len(batch)
+        return folded
+
+    def _apply(self, buckets, end):
+        try:
+            self.rollups.bulk_write([self._upsert(key, stats, end) for key, stats in buckets.items()],
+                                    ordered=False)
+        except BulkWriteError as e:
+            # Clave duplicada = el bucket ya tiene este lote (reintento tras una caída)
+            errors = [error for error in e.details.get('writeErrors', []) if error.get('code') != DUPLICATE_KEY]
+            if errors or e.details.get('writeConcernErrors'):
+                raise
+
+    @staticmethod
+    def _upsert(key, stats, end):
+        granularity, bucket, *dims = key
+        update = {
+            "$inc": {"count": stats["count"], "n_ms": stats["n_ms"], "sum_ms": stats["sum_ms"]},
+            "$set": {"wm": end},
+        }
+        for key, count in stats["hist"].items():
+            update["$inc"][f"hist.{key}"] = count
+        if stats["min_ms"] is not None:
+            update["$min"] = {"min_ms": stats["min_ms"]}
+            update["$max"] = {"max_ms": stats["max_ms"]}
+        # Solo si el bucket no tiene ya este lote; si lo tiene, el upsert choca con rollup_key
+        selector = {"granularity": granularity, "bucket": bucket, **dict(zip(DIMENSIONS, dims)),
+                    "wm": {"$not": {"$gte": end}}}
+        return UpdateOne(selector, update, upsert=True)
+
+    def rebuild(self):
+        """Borra los buckets y vuelve a consolidar todos los logs"""
+        with self._lock:
+            self.ensure_indexes()
+            deadline = time.monotonic() + ROLLUP_LEASE_SECONDS
+            while not self._acquire_lease():
+                if time.monotonic() >= deadline:
+                    raise RuntimeError("Otro proceso está consolidando los rollups")
+                time.sleep(1)
+            try:
+                self.rollups.delete_many({})
+                self.state.update_one({"_id": STATE_ID}, {"$set": {"watermark": None, "pending": None},
+                                                          "$inc": {"version": 1}})
+            finally:
+                self._release_lease()
+            self._last_refresh = 0.0
+        return self.refresh(force=True)
+
+    def _consistent_read(self, read_buckets):
+        """(resultado de los buckets, marca de agua) leídos sobre el mismo estado, o None.
+
+        Si durante la lectura había un lote a medio consolidar o terminó uno, los
+        buckets no corresponden a la marca de agua leída y se repite la lectura.
+        Devuelve None si todavía no hay marca de agua o si ninguna lectura fue estable.
+        """
+        for attempt in range(ROLLUP_READ_ATTEMPTS):
+            before = self._state()
+            if before.get("watermark") is None:
+                return None
+            result = read_buckets()
+            after = self._state()
+            if (before.get("pending") is None and after.get("pending") is None
+                    and before.get("version") == after.get("version")
+                    and before.get("watermark") == after.get("watermark")):
+                return result, before["watermark"]
+            if attempt + 1 < ROLLUP_READ_ATTEMPTS:
+                time.sleep(ROLLUP_READ_BACKOFF * (attempt + 1))
+        logger.warning("Rollups en plena consolidación: la consulta se agrega sobre los logs")
+        return None
+
+    # ===== Consultas =====
+    @staticmethod
+    def _range(start, end):
+        if start is not None:
+            start = floor_to(start, 'minute')
+        if end is not None:
+            end = ceil_to(end, 'minute')
+        return start, end
+
+    def _match(self, start, end, filters):
+        match = self._bucket_filter(start, end)
+        for name, value in (filters or {}).items():
+            match[name] = value
+        return match
+
+    def totals(self, group_by=None, start=None, end=None, filters=None):
+        """{valor de group_by: stats} entre start y end (UTC, resolución de un minuto)"""
+        start, end = self._range(start, end)
+
+        field = f"${group_by}" if group_by else None
+        pipeline = [
+            {"$match": self._match(start, end, filters)},
+            {"$group": {
+                "_id": field,
+                "count": {"$sum": "$count"},
+                "n_ms": {"$sum": "$n_ms"},
+                "sum_ms": {"$sum": "$sum_ms"},
+                "min_ms": {"$min": "$min_ms"},
+                "max_ms": {"$max": "$max_ms"},
+            }}
+        ]
+        def read_buckets():
+            result = {}
+            count_db_call('mongo', 'aggregate')
+            with stage('mongo_aggregate'):
+                for row in self.rollups.aggregate(pipeline):
+                    key = row.pop("_id")
+                    result[key] = {**empty_stats(), **row}
+            return result
+
+        snapshot = self._consistent_read(read_buckets)
+        if snapshot is None:
+            return self._log_totals(field, group_by, start, end, filters)
+        result, watermark = snapshot
+        for key, stats in self._tail(watermark, group_by, start, end, filters).items():
+            merge_stats(result.setdefault(key, empty_stats()), stats)
+        return result
+
+    def histograms(self, group_by=None, start=None, end=None, filters=None):
+        """{valor de group_by: LatencySketch} combinando los histogramas de los buckets"""
+        start, end = self._range(start, end)
+
+        field = f"${group_by}" if group_by else None
+        pipeline = [
+            {"$match": self._match(start, end, filters)},
+            {"$project": {"key": field or {"$literal": None}, "hist": {"$objectToArray": "$hist"}}},
+            {"$unwind": "$hist"},
+            {"$group": {"_id": {"key": "$key", "idx": "$hist.k"}, "count": {"$sum": "$hist.v"}}}
+        ]
+        def read_buckets():
+            result = {}
+            count_db_call('mongo', 'aggregate')
+            with stage('mongo_aggregate'):
+                for row in self.rollups.aggregate(pipeline):
+                    sketch = result.setdefault(row["_id"].get("key"), LatencySketch())
+                    sketch.counts[row["_id"]["idx"]] = row["count"]
+            return result
+
+        snapshot = self._consistent_read(read_buckets)
+        if snapshot is None:
+            return self._log_histograms(field, group_by, start, end, filters)
+        result, watermark = snapshot
+        for key, stats in self._tail(watermark, group_by, start, end, filters).items():
+            result.setdefault(key, LatencySketch()).merge(LatencySketch(stats["hist"]))
+        return result
+
+    # ===== Agregación directa sobre los logs (sin buckets) =====
+    @staticmethod
+    def _log_match(start, end, filters):
+        match = dict(filters or {})
+        if start is not None or end is not None:
+            moments = {}
+            if start is not None:
+                moments["$gte"] = start
+            if end is not None:
+                moments["$lt"] = end
+            # Solo los timestamps de tipo fecha; los de texto los suma _legacy_tail
+            match["timestamp"] = moments
+        return match
+
+    def _legacy_tail(self, group_by, start, end, filters):
+        """Logs con timestamp de texto (sin migrar) dentro del rango, agregados en memoria"""
+        if start is None and end is None:
+            return {}
+        return self._tail(None, group_by, start, end, filters, legacy_only=True)
+
+    def _log_totals(self, field, group_by, start, end, filters):
+        numeric = {"$isNumber": "$duration_ms"}
+        pipeline = [
+            {"$match": self._log_match(start, end, filters)},
+            {"$group": {
+                "_id": field,
+                "count": {"$sum": 1},
+                # Igual que add_sample: las duraciones no numéricas solo cuentan en count
+                "n_ms": {"$sum": {"$cond": [numeric, 1, 0]}},
+                "sum_ms": {"$sum": {"$cond": [numeric, "$duration_ms", 0]}},
+                "min_ms": {"$min": {"$cond": [numeric, "$duration_ms", None]}},
+                "max_ms": {"$max": {"$cond": [numeric, "$duration_ms", None]}},
+            }}
+        ]
+        result = {}
+        count_db_call('mongo', 'aggregate')
+        with stage('mongo_aggregate'):
+            for row in self.logs.aggregate(pipeline, allowDiskUse=True):
+                key = row.pop("_id")
+                result[key] = {**empty_stats(), **row}
+        for key, stats in self._legacy_tail(group_by, start, end, filters).items():
+            merge_stats(result.setdefault(key, empty_stats()), stats)
+        return result
+
+    def _log_histograms(self, field, group_by, start, end, filters):
+        match = self._log_match(start, end, filters)
+        match["duration_ms"] = {"$type": "number"}
+        pipeline = [
+            {"$match": match},
+            {"$group": {"_id": {"key": field, "idx": bucket_key_expression("$duration_ms")},
+                        "count": {"$sum": 1}}}
+        ]
+        result = {}
+        count_db_call('mongo', 'aggregate')
+        with stage('mongo_aggregate'):
+            for row in self.logs.aggregate(pipeline, allowDiskUse=True):
+                sketch = result.setdefault(row["_id"].get("key"), LatencySketch())
+                sketch.counts[row["_id"]["idx"]] = row["count"]
+        for key, stats in self._legacy_tail(group_by, start, end, filters).items():
+            result.setdefault(key, LatencySketch()).merge(LatencySketch(stats["hist"]))
+        return result
+
+    def _tail(self, watermark, group_by, start, end, filters=None, legacy_only=False):
+        """Logs posteriores a la marca de agua, agregados en memoria"""
+        query = dict(filters or {})
+        if watermark is not None:
+            query["_id"] = {"$gt": watermark}
+        if legacy_only:
+            query["timestamp"] = {"$not": {"$type": "date"}}
+        elif start is not None or end is not None:
+            moments = {}
+            if start is not None:
+                moments["$gte"] = start
+            if end is not None:
+                moments["$lt"] = end
+            # Los timestamps de texto (sin migrar) no se comparan con fechas: se filtran abajo
+            query["$or"] = [{"timestamp": moments}, {"timestamp": {"$not": {"$type": "date"}}}]
+        projection = {"timestamp": 1, "duration_ms": 1}
+        if group_by:
+            projection[group_by] = 1
+
+        result = {}
+        count_db_call('mongo', 'find')
+        with stage('mongo_tail_scan'):
+            for document in self.logs.find(query, projection):
+                if start is not None or end is not None:
+                    moment = log_time(document)
+                    if (start is not None and moment < start) or (end is not None and moment >= end):
+                        continue
+                key = document.get(group_by) if group_by else None
+                add_sample(result.setdefault(key, empty_stats()), document.get('duration_ms'))
+        return result
+
+    @staticmethod
+    def _bucket_filter(start, end):
+        """Horas completas desde los buckets por hora y los extremos desde los de minuto"""
+        if start is None and end is None:
+            return {"granularity": "hour"}
+
+        first_hour = ceil_to(start, 'hour') if start is not None else None
+        last_hour = floor_to(end, 'hour') if end is not None else None
+        if first_hour is not None and last_hour is not None and first_hour >= last_hour:
+            return {"granularity": "minute", "bucket": {"$gte": start, "$lt": end}}
+
+        hours = {}
+        if first_hour is not None:
+            hours["$gte"] = first_hour
+        if last_hour is not None:
+            hours["$lt"] = last_hour
+        clauses = [{"granularity": "hour", "bucket": hours}]
+        if start is not None:
+            clauses.append({"granularity": "minute", "bucket": {"$gte": start, "$lt": first_hour}})
+        if end is not None:
+            clauses.append({"granularity": "minute", "bucket": {"$gte": last_hour, "$lt": end}})
+        return {"$or": clauses}
@@ -0,0 +1,86 @@
+import math
+import os
+
+# ===== Histograma logarítmico de latencias =====
+# Buckets de ancho relativo constante (estilo DDSketch / HDR): cualquier percentil
+# se calcula con un error relativo máximo de SKETCH_RELATIVE_ACCURACY. Cambiarlo
+# invalida los histogramas ya guardados (reconstruir los rollups).
+SKETCH_RELATIVE_ACCURACY = float(os.getenv('SKETCH_RELATIVE_ACCURACY', '0.01'))
+# Valores menores (incluidos 0 y negativos) caen en el primer bucket
+SKETCH_MIN_VALUE = 0.01  # ms
+
+GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+
+DEFAULT_QUANTILES = (0.5, 0.9, 0.95, 0.99, 0.999)
+
+
+def bucket_key(value):
+    """Índice del bucket (como texto, se usa como clave en Mongo: ``hist.<idx>``)"""
+    return str(math.ceil(math.log(max(value, SKETCH_MIN_VALUE)) / LOG_GAMMA))
+
+
+def bucket_key_expression(field):
+    """bucket_key como expresión de agregación de Mongo sobre ``field`` (valores numéricos)"""
+    log_value = {"$ln": {"$max": [field, SKETCH_MIN_VALUE]}}
+    return {"$toString": {"$toLong": {"$ceil": {"$divide": [log_value, LOG_GAMMA]}}}}
+
+
+def bucket_bounds(key):
+    """(límite inferior, límite superior] del bucket"""
+    index = int(key)
+    return GAMMA ** (index - 1), GAMMA ** index
+
+
+def quantile_label(q):
+    """0.5 -> p50, 0.999 -> p999"""
+    return 'p' + f"{q * 100:g}".replace('.', '')
+
+
+class LatencySketch:
+    """Conteos por bucket logarítmico; dos sketches se combinan sumando conteos"""
+
+    def __init__(self, counts=None):
+        self.counts = {}
+        if counts:
+            for key, count in counts.items():
+                self.counts[key] = self.counts.get(key, 0) + count
+
+    def add(self, value, count=1):
+        key = bucket_key(value)
+        self.counts[key] = self.counts.get(key, 0) + count
+
+    def merge(self, other):
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        return self
+
+    @property
+    def count(self):
+        return sum(self.counts.values())
+
+    def quantile(self, q):
+        """Valor del cuantil q (0..1) o None si el sketch está vacío"""
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for key in sorted(self.counts, key=int):
+            seen += self.counts[key]
+            if seen > rank:
+                lower, upper = bucket_bounds(key)
+                # Punto del bucket con el mismo error relativo hacia ambos lados
+                return 2 * lower * upper / (lower + upper)
+        return bucket_bounds(max(self.counts, key=int))[1]
+
+    def quantiles(self, qs=DEFAULT_QUANTILES):
+        return {quantile_label(q): self.quantile(q) for q in qs}
+
+    def buckets(self):
+        """Buckets ordenados con conteo, para dibujar el histograma"""
+        result = []
+        for key in sorted(self.counts, key=int):
+            lower, upper = bucket_bounds(key)
+            result.append({"lower_ms": lower, "upper_ms": upper, "count": self.counts[key]})
+        return result
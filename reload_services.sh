@@ -0,0 +1,31 @@
+#!/bin/bash
+#! Script para recargar los microservicios sin cortar las peticiones en curso
+#! Solo en modo prod: gunicorn/hypercorn arrancan workers nuevos con SIGHUP y
+#! los antiguos terminan sus peticiones antes de salir
+
+# Definimos el directorio base del proyecto
+PROJECT_DIR="${PWD}"
+LOG_DIR="${PROJECT_DIR}/logs"
+
+if [ "$(cat "${LOG_DIR}/server_mode" 2>/dev/null)" != "prod" ]; then
+  echo "Error: la recarga solo está disponible en modo prod (./start_services.sh prod)"
+  exit 1
+fi
+
+# Lista de servicios (el gateway al final, cuando los servicios ya usan el código nuevo)
+SERVICES=("auth_service" "user_service" "task_service" "logs_service" "api_gateway")
+
+for SERVICE in "${SERVICES[@]}"; do
+    PID_FILE="${LOG_DIR}/${SERVICE}.pid"
+
+    if [ -f "$PID_FILE" ]; then
+        PID=$(cat "$PID_FILE")
+        if kill -HUP "$PID" > /dev/null 2>&1; then
+            echo "Servicio $SERVICE recargado (PID: $PID)"
+        else
+            echo "No se pudo recargar $SERVICE o no está en ejecución"
+        fi
+    else
+        echo "No se encontró el archivo PID para $SERVICE"
+    fi
+done
@@ -1,12 +1,38 @@
 #!/bin/bash
 #! Script para iniciar todos los microservicios del proyecto
 #! Activa el entorno virtual y ejecuta cada servicio en segundo plano 
+#! Uso: ./start_services.sh [dev|prod]   (también SERVER_MODE=prod)
 
 # Directorio base del proyecto
 PROJECT_DIR="${PWD}"
 VENV_DIR="${PROJECT_DIR}/venv"
 LOG_DIR="${PROJECT_DIR}/logs"
 
+# Modo de arranque:
+#   dev  -> servidor de desarrollo de Flask (python app.py --port N)
+#   prod -> gunicorn con varios procesos e hilos (hypercorn para el gateway ASGI)
+SERVER_MODE="${1:-${SERVER_MODE:-dev}}"
+if [ "${SERVER_MODE}" != "dev" ] && [ "${SERVER_MODE}" != "prod" ]; then
+  echo "Error: modo desconocido '${SERVER_MODE}' (usar dev o prod)"
+  exit 1
+fi
+
+# Interfaz de escucha de los servicios
+BIND_HOST="${BIND_HOST:-127.0.0.1}"
+# Segundos máximos de espera a que cada servicio responda en /health
+READY_TIMEOUT="${READY_TIMEOUT:-30}"
+# Modo prod: procesos e hilos por defecto; se ajustan por servicio con
+# <SERVICIO>_WORKERS y <SERVICIO>_THREADS (p. ej. API_GATEWAY_THREADS=32, AUTH_SERVICE_WORKERS=4)
+DEFAULT_WORKERS="${WEB_CONCURRENCY:-2}"
+DEFAULT_THREADS="${WEB_THREADS:-4}"
+# Segundos que un worker tiene para terminar sus peticiones al parar o recargar
+GRACEFUL_TIMEOUT="${GRACEFUL_TIMEOUT:-30}"
+WORKER_TIMEOUT="${WORKER_TIMEOUT:-60}"
+# Modo prod: un archivo de log del gateway por worker, así dos procesos nunca rotan el mismo
+if [ "${SERVER_MODE}" = "prod" ]; then
+  export LOG_FILE="${LOG_FILE:-"logs/api_gateway-{pid}.log"}"
+fi
+
 # Crear carpeta de logs si no existe
 mkdir -p "${LOG_DIR}"
 
@@ -35,31 +61,103 @@ check_port 5002
 check_port 5003
 check_port 5004
 
+# Valor de <SERVICIO>_<NOMBRE> (p. ej. AUTH_SERVICE_WORKERS) o el valor por defecto
+service_setting() {
+  local var
+  var="$(echo "$1" | tr '[:lower:]' '[:upper:]')_$2"
+  echo "${!var:-$3}"
+}
+
 # Función para iniciar un servicio en background con python del venv y guardar PID
 start_service() {
   local service_dir=$1
   local service_name=$2
   local port=$3
-
-  echo "Iniciando ${service_name} en el puerto ${port}..."
+  local script=${4:-app.py}
+  local default_threads=${5:-$DEFAULT_THREADS}
+  local module="${script%.py}:app"
 
   cd "${PROJECT_DIR}/${service_dir}" || { echo "No se encontró ${service_dir}"; exit 1; }
 
-  # Lanzar con python del venv, redirigir logs y poner en background
-  nohup "${VENV_DIR}/bin/python" app.py --port $port > "${LOG_DIR}/${service_name}.log" 2>&1 &
+  if [ "${SERVER_MODE}" = "prod" ]; then
+    local workers threads
+    workers=$(service_setting "${service_name}" WORKERS "${DEFAULT_WORKERS}")
+    threads=$(service_setting "${service_name}" THREADS "${default_threads}")
+    echo "Iniciando ${service_name} en el puerto ${port} (${workers} workers, ${threads} hilos)..."
+
+    if [ "${script}" = "asgi_app.py" ]; then
+      # Gateway asyncio: cada worker atiende muchas peticiones sin un hilo por petición
+      nohup "${VENV_DIR}/bin/hypercorn" "${module}" --bind "${BIND_HOST}:${port}" \
+        --workers "${workers}" --graceful-timeout "${GRACEFUL_TIMEOUT}" \
+        > "${LOG_DIR}/${service_name}.log" 2>&1 &
+    else
+      # Pre-fork: el proceso maestro (PID guardado) recarga los workers con HUP
+      nohup "${VENV_DIR}/bin/gunicorn" "${module}" --bind "${BIND_HOST}:${port}" \
+        --workers "${workers}" --threads "${threads}" \
+        --graceful-timeout "${GRACEFUL_TIMEOUT}" --timeout "${WORKER_TIMEOUT}" \
+        --access-logfile - > "${LOG_DIR}/${service_name}.log" 2>&1 &
+    fi
+  else
+    echo "Iniciando ${service_name} en el puerto ${port}..."
+    # Lanzar con python del venv, redirigir logs y poner en background
+    nohup "${VENV_DIR}/bin/python" "${script}" --port $port > "${LOG_DIR}/${service_name}.log" 2>&1 &
+  fi
 
   echo $! > "${LOG_DIR}/${service_name}.pid"
 
   cd "${PROJECT_DIR}"
 }
 
-# Iniciar servicios
-start_service "api_gateway" "api_gateway" 5000
+# Espera a que el servicio responda 200 en /health; si termina o no responde a tiempo, se aborta
+wait_ready() {
+  local service_name=$1
+  local port=$2
+  local pid
+  pid=$(cat "${LOG_DIR}/${service_name}.pid")
+  local deadline=$((SECONDS + READY_TIMEOUT))
+
+  until curl -fsS -o /dev/null --max-time 2 "http://127.0.0.1:${port}/health" 2>/dev/null; do
+    if ! kill -0 "${pid}" 2>/dev/null; then
+      echo "Error: ${service_name} terminó durante el arranque (ver ${LOG_DIR}/${service_name}.log)"
+      exit 1
+    fi
+    if [ ${SECONDS} -ge ${deadline} ]; then
+      echo "Error: ${service_name} no respondió en /health tras ${READY_TIMEOUT}s (ver ${LOG_DIR}/${service_name}.log)"
+      echo "Para detener los servicios ya iniciados, usa: ./stop_services.sh"
+      exit 1
+    fi
+    sleep 0.5
+  done
+  echo "${service_name} listo"
+}
+
+# Motor del gateway: wsgi (Flask, por defecto) o asgi (asyncio, asgi_app.py)
+GATEWAY_ENGINE="${GATEWAY_ENGINE:-wsgi}"
+if [ "${GATEWAY_ENGINE}" = "asgi" ]; then
+  GATEWAY_SCRIPT="asgi_app.py"
+else
+  GATEWAY_SCRIPT="app.py"
+fi
+
+# Iniciar servicios; el gateway solo recibe tráfico cuando todos responden
+echo "${SERVER_MODE}" > "${LOG_DIR}/server_mode"
 start_service "auth_service" "auth_service" 5001
 start_service "user_service" "user_service" 5002
 start_service "task_service" "task_service" 5003
 start_service "logs_service" "logs_service" 5004
 
-echo "Todos los servicios han sido iniciados."
+wait_ready "auth_service" 5001
+wait_ready "user_service" 5002
+wait_ready "task_service" 5003
+wait_ready "logs_service" 5004
+
+# El gateway hace proxy (espera E/S): más hilos por worker que los servicios
+start_service "api_gateway" "api_gateway" 5000 "${GATEWAY_SCRIPT}" 16
+wait_ready "api_gateway" 5000
+
+echo "Todos los servicios han sido iniciados (modo ${SERVER_MODE})."
 echo "Logs disponibles en $LOG_DIR"
 echo "Para detener los servicios, usa: ./stop_services.sh"
+if [ "${SERVER_MODE}" = "prod" ]; then
+  echo "Para recargar el código sin cortar peticiones, usa: ./reload_services.sh"
+fi
@@ -1,30 +1,45 @@
 from flask import Flask, request, jsonify
 import sqlite3
+import sys
 from datetime import datetime
 import jwt
 import os
+import hmac
+import hashlib
+import time
 from functools import wraps
 from dotenv import load_dotenv
 from flask_cors import CORS
-from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
 app = Flask(__name__)
 CORS(app)
 
-# ==== Rate Limiting ====
-limiter = Limiter(
-    get_remote_address,
-    app=app,
-    default_limits=["60 per minute"]  # Límite global por IP
-)
-
 # Cargar .env desde la raíz del proyecto (una carpeta arriba de esta)
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 ENV_PATH = os.path.join(BASE_DIR, '.env')
 load_dotenv(ENV_PATH)
+sys.path.insert(0, BASE_DIR)
+
+from common.storage import Database
+from common.pagination import page_params, split_page, NEXT_CURSOR_HEADER
+from common.ratelimit import create_limiter
+from common import metrics
+from common.server import register_health, require_resources, run
+from common.lazy import LazyResource
+
+# ==== Rate Limiting ====
+limiter = create_limiter(
+    app,
+    get_remote_address,
+    default_limits=["60 per minute"],  # Límite global por IP
+    key_prefix='task-service'
+)
+# Métricas Prometheus en /metrics y profiler en /debug/profile
+metrics.init_app(app, 'task-service', limiter)
 
-DB_FILE = 'tasks.db'
+DB_FILE = os.getenv('TASK_DB_FILE', 'tasks.db')
+db = Database(DB_FILE)
 
 SECRET_KEY = os.getenv('SECRET_KEY')
 if not SECRET_KEY:
@@ -32,28 +47,119 @@ if not SECRET_KEY:
 
 # Crear la tabla si no existe
 def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS task (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            description TEXT NOT NULL,
-            created_at TEXT NOT NULL,
-            deadline TEXT,
-            status TEXT,
-            isalive BOOLEAN,
-            created_by TEXT
-        )
+    with db.transaction() as tx:
+        tx.execute('''
+            CREATE TABLE IF NOT EXISTS task (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                description TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                deadline TEXT,
+                status TEXT,
+                isalive BOOLEAN,
+                created_by TEXT
+            )
+        ''')
+        # Índices para el listado paginado por usuario y sus filtros
+        tx.execute('CREATE INDEX IF NOT EXISTS idx_task_created_by_id ON task (created_by, id)')
+        tx.execute('''
+            CREATE INDEX IF NOT EXISTS idx_task_created_by_status_deadline
+            ON task (created_by, status, deadline)
+        ''')
+        init_summary(tx)
+
+# ===== Resumen de tareas por usuario =====
+# Contadores por (usuario, status, isalive) mantenidos por triggers: cualquier
+# INSERT/UPDATE/DELETE sobre task (también los lotes) los actualiza en su misma
+# transacción. Las vencidas dependen de la fecha, así que no se precalculan:
+# se cuentan con el índice parcial de deadlines de tareas abiertas.
+# 'done' va literal en el SQL: el índice parcial solo se usa si la consulta repite su WHERE.
+SUMMARY_KEY = "IFNULL({row}.created_by, ''), IFNULL({row}.status, ''), ({row}.isalive IS NOT NULL AND {row}.isalive <> 0)"
+
+def summary_add(row, delta):
+    return f'''
+        INSERT INTO task_summary (created_by, status, isalive, total)
+        VALUES ({SUMMARY_KEY.format(row=row)}, {delta})
+        ON CONFLICT (created_by, status, isalive) DO UPDATE SET total = total + {delta};
+    '''
+
+def init_summary(tx):
+    tx.execute('''
+        CREATE TABLE IF NOT EXISTS task_summary (
+            created_by TEXT NOT NULL,
+            status TEXT NOT NULL,
+            isalive INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            PRIMARY KEY (created_by, status, isalive)
+        ) WITHOUT ROWID
+    ''')
+    tx.execute('''
+        CREATE INDEX IF NOT EXISTS idx_task_open_deadline
+        ON task (created_by, deadline)
+        WHERE deadline IS NOT NULL AND status <> 'done' AND isalive <> 0
     ''')
-    conn.commit()
-    conn.close()
+    exists = tx.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'task_summary_insert'"
+    ).fetchone()
+    if exists:
+        return
 
-init_db()
+    tx.execute(f'''
+        CREATE TRIGGER task_summary_insert AFTER INSERT ON task
+        BEGIN {summary_add('NEW', 1)} END
+    ''')
+    tx.execute(f'''
+        CREATE TRIGGER task_summary_delete AFTER DELETE ON task
+        BEGIN {summary_add('OLD', -1)} END
+    ''')
+    tx.execute(f'''
+        CREATE TRIGGER task_summary_update AFTER UPDATE OF created_by, status, isalive ON task
+        WHEN ({SUMMARY_KEY.format(row='OLD')}) IS NOT ({SUMMARY_KEY.format(row='NEW')})
+        BEGIN {summary_add('OLD', -1)} {summary_add('NEW', 1)} END
+    ''')
+    # Primera vez (base con tareas previas): contadores desde la tabla, en la misma transacción
+    tx.execute('DELETE FROM task_summary')
+    tx.execute(f'''
+        INSERT INTO task_summary (created_by, status, isalive, total)
+        SELECT {SUMMARY_KEY.format(row='task')}, COUNT(*) FROM task GROUP BY 1, 2, 3
+    ''')
+
+# El esquema se crea en la primera petición (y se reintenta si falla), no al importar
+schema = LazyResource('task-schema', init_db)
+require_resources(app, schema)
+
+# Confiar en la identidad ya verificada por el API Gateway (cabeceras firmadas con HMAC)
+TRUST_GATEWAY_IDENTITY = os.getenv('TRUST_GATEWAY_IDENTITY', 'true').lower() == 'true'
+
+def gateway_identity():
+    """Username verificado por el gateway o None si la firma no es válida"""
+    username = request.headers.get('X-Gateway-User')
+    signature = request.headers.get('X-Gateway-Signature')
+    if not TRUST_GATEWAY_IDENTITY or not username or not signature:
+        return None
+
+    user_id = request.headers.get('X-Gateway-User-Id', '')
+    exp = request.headers.get('X-Gateway-Token-Exp', '')
+    message = f"{username}|{user_id}|{exp}".encode()
+    expected = hmac.new(SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(signature, expected):
+        return None
+    # Sin exp la identidad no caducaría nunca: se ignora y se decodifica el JWT
+    try:
+        if float(exp) < time.time():
+            return None
+    except ValueError:
+        return None
+    return username
 
 # Decorador para proteger rutas con token JWT
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
+        # Petición que llega del gateway: el JWT ya fue verificado allí
+        current_username = gateway_identity()
+        if current_username:
+            return f(current_username, *args, **kwargs)
+
         token = None
         if 'Authorization' in request.headers:
             auth_header = request.headers['Authorization']
@@ -65,7 +171,8 @@ def token_required(f):
             return jsonify({'message': 'Token es requerido'}), 401
 
         try:
-            data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+            with metrics.stage('jwt_decode'):
+                data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
             current_username = data.get('username')
             if not current_username:
                 return jsonify({'message': 'Token inválido: no contiene username'}), 401
@@ -79,12 +186,43 @@ def token_required(f):
 
     return decorated
 
+# Tipos aceptados por campo (None = no enviado); evita que sqlite3 falle con listas u objetos
+TASK_FIELD_TYPES = {
+    'description': (str,),
+    'deadline': (str,),
+    'status': (str,),
+    'isalive': (bool, int),
+}
+
+def invalid_task_fields(item):
+    """Mensaje de error si algún campo de la tarea no tiene un tipo válido, o None"""
+    for name, types in TASK_FIELD_TYPES.items():
+        value = item.get(name)
+        if value is not None and not isinstance(value, types):
+            return f"Tipo inválido en {name}"
+    return None
+
+# Altas de tareas (sueltas y en lote) comparten un presupuesto de elementos:
+# un lote de N tareas consume N, así que el lote no sirve para saltarse el límite
+TASK_CREATE_LIMIT = os.getenv('TASK_CREATE_LIMIT', '2000 per minute')
+TASK_CREATE_SCOPE = 'task-create'
+
+def create_cost():
+    """Tareas que crea la petición: 1 en POST /tasks, las del lote en POST /tasks/bulk"""
+    if request.endpoint != 'create_tasks_bulk':
+        return 1
+    items = bulk_items('tasks')
+    return max(1, len(items)) if items else 1
+
 # Ruta: Crear tarea (protegida)
 @app.route('/tasks', methods=['POST'])
 @token_required
 @limiter.limit("5 per minute")  # Límite específico
+@limiter.shared_limit(TASK_CREATE_LIMIT, scope=TASK_CREATE_SCOPE, cost=create_cost)
 def create_task(current_username):
-    data = request.get_json()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Se esperaba un objeto JSON"}), 400
     description = data.get('description')
     deadline = data.get('deadline')
     status = data.get('status', 'pending')
@@ -92,82 +230,137 @@ def create_task(current_username):
 
     if not description:
         return jsonify({"error": "Faltan campos requeridos"}), 400
+    error = invalid_task_fields(data)
+    if error:
+        return jsonify({"error": error}), 400
 
     created_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
 
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
+    cursor = db.execute('''
         INSERT INTO task (description, created_at, deadline, status, isalive, created_by)
         VALUES (?, ?, ?, ?, ?, ?)
     ''', (description, created_at, deadline, status, isalive, current_username))
-    conn.commit()
     task_id = cursor.lastrowid
-    conn.close()
 
     return jsonify({"message": "Tarea creada", "id": task_id}), 201
 
+def row_to_task(row):
+    return {
+        "id": row[0],
+        "description": row[1],
+        "created_at": row[2],
+        "deadline": row[3],
+        "status": row[4],
+        "isalive": bool(row[5]),
+        "created_by": row[6]
+    }
+
 # Ruta: Listar tareas (protegida - solo las del usuario)
+# Paginado por cursor: ?limit=&cursor=&status=&isalive=&deadline_from=&deadline_to=
 @app.route('/tasks', methods=['GET'])
 @token_required
 @limiter.limit("10 per minute")
 def get_tasks(current_username):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM task WHERE created_by = ?', (current_username,))
-    rows = cursor.fetchall()
-    conn.close()
-
-    tasks = []
-    for row in rows:
-        tasks.append({
-            "id": row[0],
-            "description": row[1],
-            "created_at": row[2],
-            "deadline": row[3],
-            "status": row[4],
-            "isalive": bool(row[5]),
-            "created_by": row[6]
-        })
-
-    return jsonify(tasks)
+    try:
+        limit, after_id = page_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conditions = ['created_by = ?', 'id > ?']
+    params = [current_username, after_id]
+    if request.args.get('status') is not None:
+        conditions.append('status = ?')
+        params.append(request.args['status'])
+    if request.args.get('isalive') is not None:
+        conditions.append('isalive = ?')
+        params.append(request.args['isalive'].lower() in ('1', 'true'))
+    if request.args.get('deadline_from') is not None:
+        conditions.append('deadline >= ?')
+        params.append(request.args['deadline_from'])
+    if request.args.get('deadline_to') is not None:
+        conditions.append('deadline <= ?')
+        params.append(request.args['deadline_to'])
+    params.append(limit + 1)
+
+    rows = db.query_all(f'''
+        SELECT * FROM task
+        WHERE {' AND '.join(conditions)}
+        ORDER BY id
+        LIMIT ?
+    ''', params)
+    rows, next_cursor = split_page(rows, limit)
+
+    # El cuerpo sigue siendo la lista de tareas; el cursor va en la cabecera
+    response = jsonify([row_to_task(row) for row in rows])
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
+
+# Ruta: Resumen de tareas del usuario (protegida) -> totales por status, vivas y vencidas
+# ?as_of=YYYY-MM-DD: vencidas = deadline anterior a esa fecha (por defecto hoy, UTC)
+@app.route('/tasks/summary', methods=['GET'])
+@token_required
+@limiter.limit("30 per minute")
+def get_tasks_summary(current_username):
+    as_of = request.args.get('as_of') or datetime.utcnow().strftime('%Y-%m-%d')
+    try:
+        datetime.fromisoformat(as_of)
+    except ValueError:
+        return jsonify({"error": "as_of debe ser una fecha ISO 8601 (YYYY-MM-DD)"}), 400
+
+    # Unas pocas filas por usuario (una por status e isalive), no una por tarea; sin status = ''
+    rows = db.query_all(
+        'SELECT status, isalive, total FROM task_summary WHERE created_by = ? AND total > 0',
+        (current_username,)
+    )
+    by_status = {}
+    total = alive = 0
+    for status, isalive, count in rows:
+        entry = by_status.setdefault(status, {"total": 0, "alive": 0})
+        entry["total"] += count
+        total += count
+        if isalive:
+            entry["alive"] += count
+            alive += count
+
+    # Recorre solo el rango de deadlines vencidos de las tareas abiertas (idx_task_open_deadline)
+    overdue = db.query_one('''
+        SELECT COUNT(*) FROM task
+        WHERE created_by = ? AND deadline > '' AND deadline < ?
+          AND status <> 'done' AND isalive <> 0
+    ''', (current_username, as_of))[0]
+
+    return jsonify({
+        "total": total,
+        "alive": alive,
+        "pending": by_status.get('pending', {}).get("total", 0),
+        "done": by_status.get('done', {}).get("total", 0),
+        "overdue": overdue,
+        "as_of": as_of,
+        "by_status": by_status,
+    })
 
 # Ruta: Obtener una tarea
 @app.route('/tasks/<int:task_id>', methods=['GET'])
 @limiter.limit("15 per minute")
 def get_task(task_id):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM task WHERE id = ?', (task_id,))
-    row = cursor.fetchone()
-    conn.close()
+    row = db.query_one('SELECT * FROM task WHERE id = ?', (task_id,))
 
     if row:
-        task = {
-            "id": row[0],
-            "description": row[1],
-            "created_at": row[2],
-            "deadline": row[3],
-            "status": row[4],
-            "isalive": bool(row[5]),
-            "created_by": row[6]
-        }
-        return jsonify(task)
+        return jsonify(row_to_task(row))
     return jsonify({"error": "Tarea no encontrada"}), 404
 
 # Ruta: Actualizar tarea
 @app.route('/tasks/<int:task_id>', methods=['PUT'])
 @limiter.limit("5 per minute")
 def update_task(task_id):
-    data = request.get_json()
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM task WHERE id = ?', (task_id,))
-    if not cursor.fetchone():
-        conn.close()
-        return jsonify({"error": "Tarea no encontrada"}), 404
-
-    cursor.execute('''
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Se esperaba un objeto JSON"}), 400
+    error = invalid_task_fields(data)
+    if error:
+        return jsonify({"error": error}), 400
+    cursor = db.execute('''
         UPDATE task SET
             description = COALESCE(?, description),
             deadline = COALESCE(?, deadline),
@@ -176,8 +369,8 @@ def update_task(task_id):
         WHERE id = ?
     ''', (data.get('description'), data.get('deadline'), data.get('status'),
           data.get('isalive'), task_id))
-    conn.commit()
-    conn.close()
+    if cursor.rowcount == 0:
+        return jsonify({"error": "Tarea no encontrada"}), 404
 
     return jsonify({"message": "Tarea actualizada"}), 200
 
@@ -185,17 +378,210 @@ def update_task(task_id):
 @app.route('/tasks/<int:task_id>', methods=['DELETE'])
 @limiter.limit("5 per minute")
 def delete_task(task_id):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM task WHERE id = ?', (task_id,))
-    conn.commit()
+    cursor = db.execute('DELETE FROM task WHERE id = ?', (task_id,))
     deleted = cursor.rowcount
-    conn.close()
 
     if deleted == 0:
         return jsonify({"error": "Tarea no encontrada"}), 404
 
     return jsonify({"message": "Tarea eliminada"}), 200
 
+# ===== Operaciones en lote =====
+# Cada lote se aplica en una sola transacción con executemany y cuenta contra
+# el límite por número de elementos, no por llamada
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', '1000'))
+BULK_ITEMS_LIMIT = os.getenv('BULK_ITEMS_LIMIT', '2000 per minute')
+# SQLite limita el número de parámetros por sentencia
+SQL_IN_CHUNK = 500
+
+def bulk_items(key):
+    """Elementos del lote: lista en el cuerpo o en el campo ``key``"""
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get(key)
+    return data if isinstance(data, list) else None
+
+def bulk_cost(key):
+    def cost():
+        items = bulk_items(key)
+        return max(1, len(items)) if items else 1
+    return cost
+
+def bulk_response(results, ok_status):
+    failed = sum(1 for r in results if r["status"] == "error")
+    if failed == 0:
+        status = ok_status
+    elif failed == len(results):
+        status = 400
+    else:
+        status = 207  # Multi-Status: éxito parcial
+    return jsonify({
+        "total": len(results),
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "results": results
+    }), status
+
+def invalid_batch(items):
+    if items is None:
+        return jsonify({"error": "Se esperaba una lista de elementos"}), 400
+    if not items:
+        return jsonify({"error": "El lote está vacío"}), 400
+    if len(items) > BULK_MAX_ITEMS:
+        return jsonify({"error": f"Máximo {BULK_MAX_ITEMS} elementos por lote"}), 413
+    return None
+
+def is_task_id(value):
+    """Id entero de tarea (bool es subclase de int: true no es el id 1)"""
+    return type(value) is int
+
+def owned_task_ids(tx, username, ids):
+    """Ids de la lista que existen y pertenecen al usuario"""
+    found = set()
+    ids = list(set(ids))
+    for start in range(0, len(ids), SQL_IN_CHUNK):
+        chunk = ids[start:start + SQL_IN_CHUNK]
+        placeholders = ','.join('?' * len(chunk))
+        rows = tx.execute(
+            f'SELECT id FROM task WHERE created_by = ? AND id IN ({placeholders})',
+            [username, *chunk]
+        ).fetchall()
+        found.update(row[0] for row in rows)
+    return found
+
+# Ruta: Crear tareas en lote (protegida) -> {"tasks": [{description, deadline, status, isalive}, ...]}
+@app.route('/tasks/bulk', methods=['POST'])
+@token_required
+@limiter.limit(BULK_ITEMS_LIMIT, cost=bulk_cost('tasks'))
+@limiter.shared_limit(TASK_CREATE_LIMIT, scope=TASK_CREATE_SCOPE, cost=create_cost)
+def create_tasks_bulk(current_username):
+    items = bulk_items('tasks')
+    error = invalid_batch(items)
+    if error:
+        return error
+
+    created_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    results = []
+    rows = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get('description'):
+            results.append({"index": index, "status": "error", "error": "Faltan campos requeridos"})
+            continue
+        error = invalid_task_fields(item)
+        if error:
+            results.append({"index": index, "status": "error", "error": error})
+            continue
+        results.append({"index": index, "status": "created"})
+        rows.append((item['description'], created_at, item.get('deadline'),
+                     item.get('status', 'pending'), item.get('isalive', True), current_username))
+
+    if rows:
+        try:
+            with db.transaction() as tx:
+                tx.executemany('''
+                    INSERT INTO task (description, created_at, deadline, status, isalive, created_by)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', rows)
+                # La transacción tiene el bloqueo de escritura: los ids son consecutivos
+                last_id = tx.execute('SELECT last_insert_rowid()').fetchone()[0]
+        except sqlite3.Error as e:
+            return jsonify({"error": "No se pudo crear el lote", "detalle": str(e)}), 500
+
+        next_id = last_id - len(rows) + 1
+        for result in results:
+            if result["status"] == "created":
+                result["id"] = next_id
+                next_id += 1
+
+    return bulk_response(results, 201)
+
+# Ruta: Actualizar tareas en lote (protegida) -> {"tasks": [{id, description, deadline, status, isalive}, ...]}
+@app.route('/tasks/bulk', methods=['PATCH'])
+@token_required
+@limiter.limit(BULK_ITEMS_LIMIT, cost=bulk_cost('tasks'))
+def update_tasks_bulk(current_username):
+    items = bulk_items('tasks')
+    error = invalid_batch(items)
+    if error:
+        return error
+
+    results = []
+    valid = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not is_task_id(item.get('id')):
+            results.append({"index": index, "status": "error", "error": "Falta el id de la tarea"})
+            continue
+        error = invalid_task_fields(item)
+        if error:
+            results.append({"index": index, "id": item['id'], "status": "error", "error": error})
+            continue
+        results.append({"index": index, "id": item['id'], "status": "updated"})
+        valid.append((index, item))
+
+    try:
+        with db.transaction() as tx:
+            owned = owned_task_ids(tx, current_username, [item['id'] for _, item in valid])
+            rows = []
+            for index, item in valid:
+                if item['id'] not in owned:
+                    results[index].update(status="error", error="Tarea no encontrada")
+                    continue
+                rows.append((item.get('description'), item.get('deadline'), item.get('status'),
+                             item.get('isalive'), item['id']))
+            if rows:
+                tx.executemany('''
+                    UPDATE task SET
+                        description = COALESCE(?, description),
+                        deadline = COALESCE(?, deadline),
+                        status = COALESCE(?, status),
+                        isalive = COALESCE(?, isalive)
+                    WHERE id = ?
+                ''', rows)
+    except sqlite3.Error as e:
+        return jsonify({"error": "No se pudo actualizar el lote", "detalle": str(e)}), 500
+
+    return bulk_response(results, 200)
+
+# Ruta: Eliminar tareas en lote (protegida) -> {"ids": [1, 2, 3]}
+@app.route('/tasks/bulk', methods=['DELETE'])
+@token_required
+@limiter.limit(BULK_ITEMS_LIMIT, cost=bulk_cost('ids'))
+def delete_tasks_bulk(current_username):
+    ids = bulk_items('ids')
+    error = invalid_batch(ids)
+    if error:
+        return error
+
+    results = []
+    valid_ids = []
+    for index, task_id in enumerate(ids):
+        if not is_task_id(task_id):
+            results.append({"index": index, "status": "error", "error": "Id inválido"})
+            continue
+        results.append({"index": index, "id": task_id, "status": "deleted"})
+        valid_ids.append(task_id)
+
+    try:
+        with db.transaction() as tx:
+            owned = owned_task_ids(tx, current_username, valid_ids)
+            for result in results:
+                if result["status"] == "deleted" and result["id"] not in owned:
+                    result.update(status="error", error="Tarea no encontrada")
+            if owned:
+                tx.executemany('DELETE FROM task WHERE id = ?', [(task_id,) for task_id in owned])
+    except sqlite3.Error as e:
+        return jsonify({"error": "No se pudo eliminar el lote", "detalle": str(e)}), 500
+
+    return bulk_response(results, 200)
+
+# Ruta: Estadísticas de la base de datos (consultas y latencias)
+@app.route('/storage/stats', methods=['GET'])
+@metrics.internal_endpoint(limiter)
+def storage_stats():
+    return jsonify(db.stats())
+
+# Disponibilidad del servicio y de su base de datos (start_services.sh espera a este endpoint)
+register_health(app, limiter, lambda: (schema.get(), db.query_one('SELECT 1')))
+
 if __name__ == '__main__':
-    app.run(port=5003, debug=True)
+    run(app, 5003)
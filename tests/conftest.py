@@ -0,0 +1,29 @@
+import os
+import sys
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Los módulos leen su configuración al importarse: valores de prueba antes de importar nada.
+# El almacenamiento del rate limit se crea explícitamente en cada test (nunca ratelimit.db del repo)
+os.environ.setdefault('RATELIMIT_STORAGE_URI', 'memory://')
+os.environ.setdefault('RATELIMIT_ENABLED', 'false')
+os.environ.setdefault('SECRET_KEY', 'test-secret')
+os.environ.setdefault('MONGO_URI', 'mongodb://127.0.0.1:1')
+os.environ.setdefault('MONGO_TIMEOUT_MS', '100')
+os.environ.setdefault('LOG_CONSOLE', 'false')
+
+# Módulos planos de cada servicio, como al arrancarlo desde su carpeta
+# (cada servicio tiene su app.py: esos se cargan por ruta con load_service_app)
+for service_dir in ('logs_service', 'auth_service', 'api_gateway'):
+    sys.path.insert(0, os.path.join(BASE_DIR, service_dir))
+sys.path.insert(0, BASE_DIR)
+
+
+def load_service_app(service_dir, module_name, **env):
+    """Carga el app.py de un servicio por ruta con otro nombre (todos se llaman app.py)"""
+    import importlib.util
+    os.environ.update(env)
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(BASE_DIR, service_dir, 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
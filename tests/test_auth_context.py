@@ -0,0 +1,47 @@
+import time
+
+import jwt
+
+from auth_context import GATEWAY_EXP_HEADER, GATEWAY_USER_HEADER, TokenVerifier
+
+SECRET_KEY = 'test-secret'
+
+
+def token(**claims):
+    return jwt.encode(claims, SECRET_KEY, algorithm='HS256')
+
+
+def test_valid_token_is_decoded_once():
+    verifier = TokenVerifier(SECRET_KEY)
+    value = token(username='ana', exp=int(time.time()) + 60)
+    assert verifier.verify(value)['username'] == 'ana'
+    assert verifier.verify(value)['username'] == 'ana'
+    assert verifier.stats()['misses'] == 1
+    assert verifier.stats()['hits'] == 1
+
+
+def test_invalid_token_is_rejected():
+    verifier = TokenVerifier(SECRET_KEY)
+    assert verifier.verify(jwt.encode({'username': 'ana'}, 'otra-clave', algorithm='HS256')) is None
+    assert verifier.verify(token(username='ana', exp=int(time.time()) - 10)) is None
+    assert verifier.stats()['invalid'] == 2
+
+
+def test_cache_entry_expires_with_the_token():
+    verifier = TokenVerifier(SECRET_KEY, ttl=300)
+    value = token(username='ana', exp=int(time.time()) + 1)
+    assert verifier.verify(value) is not None
+    time.sleep(1.1)
+    assert verifier.verify(value) is None
+
+
+def test_identity_headers_carry_the_expiry():
+    exp = int(time.time()) + 60
+    headers = TokenVerifier(SECRET_KEY).identity_headers({'username': 'ana', 'user_id': 1, 'exp': exp})
+    assert headers[GATEWAY_USER_HEADER] == 'ana'
+    assert headers[GATEWAY_EXP_HEADER] == str(exp)
+
+
+def test_token_without_exp_is_not_delegated():
+    # El servicio decodificará el JWT él mismo
+    assert TokenVerifier(SECRET_KEY).identity_headers({'username': 'ana', 'user_id': 1}) == {}
@@ -0,0 +1,98 @@
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+import qr_render
+from conftest import load_service_app
+
+
+@pytest.fixture(scope='module')
+def auth_app(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp('auth-service')
+    # El User Service real, servido en un hilo
+    users = load_service_app('user_service', 'auth_test_user_app', USER_DB_FILE=str(tmp / 'users.db'))
+    server = make_server('127.0.0.1', 0, users.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    module = load_service_app('auth_service', 'auth_app', AUTH_DB_FILE=str(tmp / 'auth.db'),
+                              USER_SERVICE_URL=f"http://127.0.0.1:{server.server_port}",
+                              OTP_QR_MODE='lazy')
+    yield module
+    server.shutdown()
+
+
+@pytest.fixture
+def client(auth_app):
+    return auth_app.app.test_client()
+
+
+def register(client, name):
+    response = client.post('/register', json={'username': name, 'email': f'{name}@example.com', 'password': 'pw'})
+    assert response.status_code == 201
+    return response.get_json()
+
+
+# ===== QR del OTP bajo demanda =====
+
+def test_lazy_register_returns_only_a_reference(client):
+    body = register(client, 'qr-ref')
+    assert 'otp_qr' not in body
+    assert body['otp_qr_url'] == f"/auth/otp-qr/{body['otp_qr_ref']}"
+
+
+def test_qr_is_rendered_cached_and_revalidated(client, auth_app):
+    ref = register(client, 'qr-png')['otp_qr_ref']
+    first = client.get(f'/otp-qr/{ref}')
+    assert first.status_code == 200
+    assert first.mimetype == 'image/png'
+    assert first.data.startswith(b'\x89PNG')
+    assert first.headers['Cache-Control'].startswith('private')
+
+    user_id = auth_app.read_qr_ref(ref)[0]
+    assert (user_id, 'png') in auth_app.qr_cache
+    assert client.get(f'/otp-qr/{ref}', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    svg = client.get(f'/otp-qr/{ref}', query_string={'format': 'svg'})
+    assert svg.mimetype == 'image/svg+xml'
+    assert svg.headers['ETag'] != first.headers['ETag']
+    assert client.get(f'/otp-qr/{ref}', query_string={'format': 'gif'}).status_code == 400
+
+
+def test_tampered_or_expired_reference_is_rejected(client, auth_app, monkeypatch):
+    ref = register(client, 'qr-bad')['otp_qr_ref']
+    payload, signature = ref.split('.')
+    assert client.get(f"/otp-qr/{payload}.{signature[::-1]}").status_code == 404
+    assert client.get('/otp-qr/no-es-una-referencia').status_code == 404
+
+    monkeypatch.setattr(auth_app, 'OTP_QR_REF_TTL', -1)
+    expired = auth_app.make_qr_ref(1, 'qr-bad')
+    assert client.get(f'/otp-qr/{expired}').status_code == 404
+
+
+def test_concurrent_renders_share_one_pool():
+    futures = []
+    def render():
+        futures.append(qr_render.submit('otpauth://totp/x?secret=ABC', 'svg'))
+    threads = [threading.Thread(target=render) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(future.result(timeout=60).startswith(b'<?xml') for future in futures)
+    pool = qr_render._pool
+    qr_render.submit('otpauth://totp/y?secret=DEF', 'png').result(timeout=60)
+    assert qr_render._pool is pool
+
+
+# ===== Login con OTP =====
+
+def test_otp_code_cannot_be_used_twice(client, auth_app):
+    import pyotp
+    user = register(client, 'otp-login')['user']
+    code = pyotp.TOTP(auth_app.load_otp_secret(user['id'])).now()
+    credentials = {'identifier': 'otp-login', 'password': 'pw', 'otp': code}
+    assert client.post('/login', json=credentials).status_code == 200
+    second = client.post('/login', json=credentials)
+    assert second.status_code == 401
+    assert second.get_json()['error'] == 'Código OTP ya utilizado'
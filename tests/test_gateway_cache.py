@@ -0,0 +1,164 @@
+import importlib.util
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jwt
+import pytest
+
+from conftest import BASE_DIR
+from response_cache import ResponseCache
+
+SECRET_KEY = os.environ['SECRET_KEY']
+
+
+def bearer(user_id, username='ana'):
+    token = jwt.encode({'username': username, 'user_id': user_id, 'exp': int(time.time()) + 3600},
+                       SECRET_KEY, algorithm='HS256')
+    return {'Authorization': f'Bearer {token}'}
+
+
+class TaskService(BaseHTTPRequestHandler):
+    """Servicio mínimo (tareas, usuarios y registro): cuenta las peticiones y cambia de versión en cada escritura"""
+
+    requests = []
+    version = 1
+
+    def do_GET(self):
+        TaskService.requests.append(('GET', self.path, self.headers.get('If-None-Match')))
+        self.reply(200, {"version": TaskService.version})
+
+    def do_POST(self):
+        TaskService.requests.append(('POST', self.path, None))
+        TaskService.version += 1
+        self.reply(201, {"version": TaskService.version})
+
+    def reply(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def gateway(tmp_path_factory):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), TaskService)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logs = tmp_path_factory.mktemp('gateway-logs')
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.update({
+        'TASK_SERVICE_URL': url,
+        'USER_SERVICE_URL': url,
+        'AUTH_SERVICE_URL': url,
+        'LOG_FILE': str(logs / 'api_gateway.log'),
+        'LOG_SPILL_FILE': str(logs / 'mongo_spill.jsonl'),
+    })
+    # Cada servicio tiene su app.py: el del gateway se carga por ruta con otro nombre
+    spec = importlib.util.spec_from_file_location('gateway_app', os.path.join(BASE_DIR, 'api_gateway', 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    yield module
+    server.shutdown()
+
+
+@pytest.fixture
+def client(gateway):
+    gateway.response_cache = ResponseCache()
+    TaskService.requests.clear()
+    client = gateway.app.test_client()
+    # /tasks se cachea por usuario: las peticiones llevan un token con user_id
+    client.environ_base['HTTP_AUTHORIZATION'] = bearer(1)['Authorization']
+    return client
+
+
+def upstream_gets(prefix='/tasks'):
+    return [r for r in TaskService.requests if r[0] == 'GET' and r[1].startswith(prefix)]
+
+
+def test_second_get_is_served_from_cache(client):
+    first = client.get('/tasks')
+    assert first.status_code == 200
+    assert first.headers['X-Cache'] == 'MISS'
+    second = client.get('/tasks')
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.get_json() == first.get_json()
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert len(upstream_gets()) == 1
+
+
+def test_matching_if_none_match_returns_304(client):
+    etag = client.get('/tasks').headers['ETag']
+    response = client.get('/tasks', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+    assert len(upstream_gets()) == 1
+
+
+def test_other_etag_returns_the_body(client):
+    client.get('/tasks')
+    response = client.get('/tasks', headers={'If-None-Match': '"otra-version"'})
+    assert response.status_code == 200
+    assert response.get_json()['version'] == TaskService.version
+
+
+def test_revalidation_is_not_forwarded_on_a_miss(client):
+    # En un fallo de caché el gateway pide el cuerpo completo: el 304 lo decide él
+    response = client.get('/tasks', headers={'If-None-Match': '"x"'})
+    assert response.status_code == 200
+    assert upstream_gets()[0][2] is None
+
+
+def test_write_invalidates_the_namespace(client):
+    before = client.get('/tasks')
+    assert client.post('/tasks', json={}).status_code == 201
+    after = client.get('/tasks')
+    assert after.headers['X-Cache'] == 'MISS'
+    assert after.headers['ETag'] != before.headers['ETag']
+    assert client.get('/tasks', headers={'If-None-Match': before.headers['ETag']}).status_code == 200
+    assert len(upstream_gets()) == 2
+
+
+def test_no_cache_skips_the_cached_copy(client):
+    client.get('/tasks')
+    response = client.get('/tasks', headers={'Cache-Control': 'no-cache'})
+    assert response.headers['X-Cache'] == 'MISS'
+    assert len(upstream_gets()) == 2
+
+
+def test_users_do_not_share_cached_tasks(client):
+    client.get('/tasks')
+    other = client.get('/tasks', headers=bearer(2, 'luis'))
+    assert other.headers['X-Cache'] == 'MISS'
+    assert len(upstream_gets()) == 2
+
+
+def test_write_only_invalidates_the_writer(client):
+    client.get('/tasks')
+    client.get('/tasks', headers=bearer(2, 'luis'))
+    assert client.post('/tasks', json={}, headers=bearer(2, 'luis')).status_code == 201
+    assert client.get('/tasks').headers['X-Cache'] == 'HIT'
+    assert client.get('/tasks', headers=bearer(2, 'luis')).headers['X-Cache'] == 'MISS'
+
+
+def test_token_without_user_id_is_not_cached(client):
+    token = jwt.encode({'username': 'ana', 'exp': int(time.time()) + 3600}, SECRET_KEY, algorithm='HS256')
+    headers = {'Authorization': f'Bearer {token}'}
+    client.get('/tasks', headers=headers)
+    assert 'X-Cache' not in client.get('/tasks', headers=headers).headers
+    assert len(upstream_gets()) == 2
+
+
+def test_register_invalidates_the_user_list(client):
+    assert client.get('/user/users').headers['X-Cache'] == 'MISS'
+    assert client.get('/user/users').headers['X-Cache'] == 'HIT'
+    assert client.post('/auth/register', json={}).status_code == 201
+    assert client.get('/user/users').headers['X-Cache'] == 'MISS'
+    assert len(upstream_gets('/users')) == 2
@@ -0,0 +1,119 @@
+import fcntl
+import logging
+import threading
+
+import mongomock
+import pytest
+from pymongo.errors import ServerSelectionTimeoutError
+
+from log_shipper import LogShipper
+
+
+class Mongo:
+    """Colección de mongomock que se puede "caer" y que falla tras N inserciones"""
+
+    def __init__(self):
+        self.collection = mongomock.MongoClient().db.logs
+        self.down = False
+        self.fail_after = None
+
+    def connect(self):
+        if self.down:
+            raise ServerSelectionTimeoutError('mongo caído')
+        if self.fail_after is not None:
+            if self.fail_after == 0:
+                raise ServerSelectionTimeoutError('mongo caído a mitad del reenvío')
+            self.fail_after -= 1
+        return self.collection
+
+
+@pytest.fixture
+def mongo():
+    return Mongo()
+
+
+@pytest.fixture
+def spill_file(tmp_path):
+    return str(tmp_path / 'mongo_spill.jsonl')
+
+
+def shipper(mongo, spill_file, batch_size=2):
+    return LogShipper(mongo.connect, logging.getLogger('test-log-shipper'),
+                      batch_size=batch_size, spill_file=spill_file)
+
+
+def docs(start, count):
+    return [{'n': n} for n in range(start, start + count)]
+
+
+def shipped(mongo):
+    return sorted(doc['n'] for doc in mongo.collection.find())
+
+
+def test_batch_is_spilled_while_mongo_is_down_and_replayed_later(mongo, spill_file):
+    worker = shipper(mongo, spill_file)
+    mongo.down = True
+    worker._ship(docs(0, 3))
+    assert worker.stats()['spilled'] == 3
+    assert worker.stats()['spill_pending']
+
+    mongo.down = False
+    worker._retry_after = 0
+    worker._ship(docs(3, 1))
+    assert shipped(mongo) == [0, 1, 2, 3]
+    assert worker.stats()['replayed'] == 3
+    assert not worker.stats()['spill_pending']
+
+
+def test_interrupted_replay_does_not_duplicate(mongo, spill_file):
+    worker = shipper(mongo, spill_file, batch_size=2)
+    mongo.down = True
+    worker._ship(docs(0, 5))
+
+    # El primer lote del reenvío llega; Mongo cae antes del segundo
+    mongo.down = False
+    mongo.fail_after = 1
+    worker._replay_spill()
+    assert shipped(mongo) == [0, 1]
+    assert worker.stats()['spill_pending']
+
+    mongo.fail_after = None
+    worker._replay_spill()
+    assert shipped(mongo) == [0, 1, 2, 3, 4]
+    assert worker.stats()['duplicates_skipped'] == 2
+    assert not worker.stats()['spill_pending']
+
+
+def test_only_one_worker_replays(mongo, spill_file):
+    worker = shipper(mongo, spill_file)
+    mongo.down = True
+    worker._ship(docs(0, 2))
+    mongo.down = False
+
+    # Otro worker tiene el bloqueo de reenvío: este no toca el archivo
+    with open(spill_file + '.replay.lock', 'a') as other:
+        fcntl.flock(other, fcntl.LOCK_EX)
+        worker._replay_spill()
+        assert shipped(mongo) == []
+    worker._replay_spill()
+    assert shipped(mongo) == [0, 1]
+
+
+def test_concurrent_spills_keep_every_line(mongo, spill_file):
+    workers = [shipper(mongo, spill_file, batch_size=50) for _ in range(4)]
+    mongo.down = True
+
+    def spill(worker, start):
+        for offset in range(0, 500, 50):
+            worker._spill(docs(start + offset, 50))
+
+    threads = [threading.Thread(target=spill, args=(worker, i * 500)) for i, worker in enumerate(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    mongo.down = False
+    workers[0]._replay_spill()
+    assert shipped(mongo) == list(range(2000))
+    assert workers[0].stats()['malformed_spill_lines'] == 0
@@ -0,0 +1,41 @@
+import gzip
+import logging
+import os
+
+from log_writer import RotatingLogFileHandler
+
+
+def record(message):
+    return logging.LogRecord('gateway', logging.INFO, __file__, 0, message, None, None)
+
+
+def emit(handler, message):
+    handler.handle(record(message))
+
+
+def test_rotates_by_size_and_compresses(tmp_path):
+    path = str(tmp_path / 'gateway.log')
+    handler = RotatingLogFileHandler(path, max_bytes=10, interval=0, backup_count=2, compress=True)
+    for n in range(4):
+        emit(handler, f"linea {n} con más de diez bytes")
+    handler.close()
+    assert sorted(os.listdir(tmp_path)) == ['gateway.log', 'gateway.log.1.gz', 'gateway.log.2.gz']
+    with gzip.open(path + '.1.gz', 'rt', encoding='utf-8') as f:
+        assert f.read() == 'linea 2 con más de diez bytes\n'
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == 'linea 3 con más de diez bytes\n'
+
+
+def test_time_rollover_without_a_file_keeps_the_record(tmp_path):
+    path = str(tmp_path / 'gateway.log')
+    handler = RotatingLogFileHandler(path, max_bytes=0, interval=60, backup_count=2, compress=True)
+    # Toca rotar antes de que se haya escrito nada (el archivo se abre en la primera escritura)
+    handler.rollover_at = 0
+    errors = []
+    handler.handleError = errors.append
+    emit(handler, 'primera')
+    handler.close()
+    assert errors == []
+    assert os.listdir(tmp_path) == ['gateway.log']
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == 'primera\n'
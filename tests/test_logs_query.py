@@ -0,0 +1,115 @@
+import json
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+from pymongo.errors import AutoReconnect
+
+from conftest import load_service_app
+
+BASE = datetime(2026, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture(scope='module')
+def logs_app():
+    return load_service_app('logs_service', 'logs_app')
+
+
+@pytest.fixture
+def logs(logs_app, monkeypatch):
+    collection = mongomock.MongoClient().Logs.Logs
+    collection.insert_many([
+        {"timestamp": BASE + timedelta(seconds=n), "method": "GET", "path": path, "service": "gateway",
+         "user": user, "status": status, "duration_ms": duration}
+        for n, (path, user, status, duration) in enumerate([
+            ('/tasks', 'ana', 200, 12.5),
+            ('/tasks', 'luis', 500, 830.25),
+            ('/user/users', 'ana', 200, 3.0),
+            ('/tasks', 'ana', 502, 1200.0),
+        ])
+    ])
+    monkeypatch.setattr(logs_app.mongo, 'factory', lambda: logs_app.MongoStore(None, collection, None))
+    monkeypatch.setattr(logs_app.mongo, '_ready', False)
+    return collection
+
+
+@pytest.fixture
+def client(logs_app, logs):
+    return logs_app.app.test_client()
+
+
+def lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_streams_one_document_per_line(client):
+    response = client.get('/logs/query')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.headers['Cache-Control'] == 'no-store'
+    documents = lines(response)
+    assert [d['duration_ms'] for d in documents] == [12.5, 830.25, 3.0, 1200.0]
+    # Fechas en UTC con milisegundos y sin _id
+    assert documents[0]['timestamp'] == '2026-01-01T12:00:00.000Z'
+    assert all('_id' not in d for d in documents)
+
+
+def test_filters_and_projection(client):
+    response = client.get('/logs/query?path=/tasks&status=500,502&min_duration_ms=1000&fields=user,status')
+    assert lines(response) == [{"user": "ana", "status": 502}]
+
+
+def test_time_range_order_and_limit(client):
+    response = client.get('/logs/query?from=2026-01-01T12:00:01Z&to=2026-01-01T12:00:03&order=desc&limit=1'
+                          '&fields=path')
+    assert lines(response) == [{"path": "/user/users"}]
+
+
+def test_output_is_written_in_chunks(logs_app, client, monkeypatch):
+    monkeypatch.setattr(logs_app, 'QUERY_CHUNK_SIZE', 1)
+    response = client.get('/logs/query?fields=status&batch_size=2')
+    chunks = [chunk for chunk in response.response if chunk]
+    assert len(chunks) == 4
+    assert [json.loads(chunk)['status'] for chunk in chunks] == [200, 500, 200, 502]
+
+
+class InterruptedCursor:
+    """Cursor que pierde la conexión después del primer documento"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def sort(self, *args):
+        self.cursor = self.cursor.sort(*args)
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def __iter__(self):
+        yield next(iter(self.cursor))
+        raise AutoReconnect('conexión perdida')
+
+    def close(self):
+        self.cursor.close()
+
+
+def test_interrupted_cursor_ends_with_an_error_line(client, logs, monkeypatch):
+    find = logs.find
+    monkeypatch.setattr(logs, 'find', lambda *args: InterruptedCursor(find(*args)))
+    documents = lines(client.get('/logs/query?fields=status'))
+    assert documents == [{"status": 200}, {"error": "Consulta interrumpida", "detalle": "conexión perdida"}]
+
+
+@pytest.mark.parametrize('query', [
+    'fields=user,password',
+    'status=error',
+    'min_duration_ms=lento',
+    'from=ayer',
+    'batch_size=0',
+    'limit=-1',
+])
+def test_invalid_parameters_return_400(client, query):
+    response = client.get('/logs/query?' + query)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
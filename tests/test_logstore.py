@@ -0,0 +1,36 @@
+import importlib
+
+import mongomock
+import pytest
+
+from common import logstore
+
+
+@pytest.fixture
+def db(monkeypatch):
+    # mongomock no implementa options(): una colección normal (no time-series) devuelve {}
+    monkeypatch.setattr(mongomock.collection.Collection, 'options', lambda self: {}, raising=False)
+    return mongomock.MongoClient()['Logs']
+
+
+def ttl_of(db):
+    return db['Logs'].index_information()[logstore.TIMESTAMP_INDEX].get('expireAfterSeconds')
+
+
+def test_retention_is_off_by_default(monkeypatch, db):
+    monkeypatch.delenv('LOGS_RETENTION_DAYS', raising=False)
+    importlib.reload(logstore)
+    assert logstore.retention_seconds() is None
+    logstore.prepare_logs_collection(db)
+    # Sin caducidad: ningún log se borra mientras no se active
+    assert ttl_of(db) is None
+    assert logstore.QUERY_INDEX in db['Logs'].index_information()
+
+
+def test_retention_is_applied_and_removed(monkeypatch, db):
+    monkeypatch.setattr(logstore, 'LOGS_RETENTION_DAYS', 30)
+    logstore.prepare_logs_collection(db)
+    assert ttl_of(db) == 30 * 86400
+    monkeypatch.setattr(logstore, 'LOGS_RETENTION_DAYS', 0)
+    logstore.prepare_logs_collection(db)
+    assert ttl_of(db) is None
@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+from common.storage import Database
+from otp_cache import ReplayGuard
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'auth.db')
+    with Database(path).transaction() as tx:
+        ReplayGuard.create_table(tx)
+    return path
+
+
+def current_step():
+    return int(time.time() // 30)
+
+
+def test_code_cannot_be_reused(db_path):
+    guard = ReplayGuard(Database(db_path))
+    step = current_step()
+    assert guard.accept(1, step)
+    assert not guard.accept(1, step)
+    assert guard.stats()['rejected_replays'] == 1
+
+
+def test_older_step_is_rejected_after_a_newer_one(db_path):
+    guard = ReplayGuard(Database(db_path))
+    step = current_step()
+    assert guard.accept(1, step)
+    assert not guard.accept(1, step - 1)
+    assert guard.accept(1, step + 1)
+
+
+def test_users_are_independent(db_path):
+    guard = ReplayGuard(Database(db_path))
+    step = current_step()
+    assert guard.accept(1, step)
+    assert guard.accept(2, step)
+
+
+def test_replay_is_rejected_by_another_worker(db_path):
+    # Cada worker abre su propia conexión a auth.db
+    first = ReplayGuard(Database(db_path))
+    second = ReplayGuard(Database(db_path))
+    step = current_step()
+    assert first.accept(1, step)
+    assert not second.accept(1, step)
+
+
+def test_expired_steps_are_not_tracked(db_path):
+    guard = ReplayGuard(Database(db_path), valid_window=1)
+    assert guard.accept(1, current_step() - 10)
+    assert guard.accept(2, current_step())
+    assert guard.stats()['tracked_users'] == 1
+    # La fila antigua no impide un código nuevo del mismo usuario
+    assert guard.accept(1, current_step())
@@ -0,0 +1,65 @@
+import base64
+
+import pytest
+
+from common.pagination import PAGE_SIZE_MAX, decode_cursor, encode_cursor, page_params, split_page
+from conftest import load_service_app
+
+
+def raw_cursor(text):
+    return base64.urlsafe_b64encode(text.encode()).decode().rstrip('=')
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(42)) == 42
+
+
+@pytest.mark.parametrize('cursor', ['%%%', raw_cursor('[]'), raw_cursor('{"id": "7"}'), raw_cursor('{"id": true}')])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_page_params():
+    assert page_params({}) == (100, 0)
+    assert page_params({'limit': '10', 'cursor': encode_cursor(5)}) == (10, 5)
+    assert page_params({'limit': str(PAGE_SIZE_MAX + 1)})[0] == PAGE_SIZE_MAX
+    for limit in ('0', 'diez'):
+        with pytest.raises(ValueError):
+            page_params({'limit': limit})
+
+
+def test_split_page_returns_cursor_only_when_there_is_more():
+    rows = [(1,), (2,), (3,)]
+    assert split_page(rows, 2) == ([(1,), (2,)], encode_cursor(2))
+    assert split_page(rows, 3) == (rows, None)
+
+
+@pytest.fixture(scope='module')
+def users(tmp_path_factory):
+    db_file = tmp_path_factory.mktemp('user-service') / 'users.db'
+    module = load_service_app('user_service', 'user_app', USER_DB_FILE=str(db_file))
+    client = module.app.test_client()
+    for i in range(5):
+        client.post('/users', json={'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'x'})
+    return client
+
+
+def test_users_are_listed_page_by_page(users):
+    seen, cursor = [], None
+    while True:
+        response = users.get('/users', query_string={'limit': 2, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        body = response.get_json()
+        seen += [user['username'] for user in body['users']]
+        cursor = body['next_cursor']
+        assert response.headers.get('X-Next-Cursor') == cursor
+        if not cursor:
+            break
+    assert seen == [f'user{i}' for i in range(5)]
+
+
+def test_users_filter_and_bad_cursor(users):
+    body = users.get('/users', query_string={'email': 'user3@example.com'}).get_json()
+    assert [user['username'] for user in body['users']] == ['user3']
+    assert users.get('/users', query_string={'cursor': 'no-es-un-cursor'}).status_code == 400
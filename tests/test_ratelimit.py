@@ -0,0 +1,110 @@
+import time
+
+import pytest
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter, MovingWindowRateLimiter
+
+from common.ratelimit import SQLiteStorage
+
+STRATEGIES = {'fixed-window': FixedWindowRateLimiter, 'moving-window': MovingWindowRateLimiter}
+
+
+@pytest.fixture
+def uri(tmp_path):
+    return f"sqlite:///{tmp_path / 'ratelimit.db'}"
+
+
+@pytest.mark.parametrize('batch_ms', [0, 50])
+@pytest.mark.parametrize('strategy', sorted(STRATEGIES))
+def test_limit_is_enforced(uri, strategy, batch_ms):
+    limiter = STRATEGIES[strategy](SQLiteStorage(uri, batch_ms=batch_ms))
+    item = parse('3 per minute')
+    assert [limiter.hit(item, 'svc', 'alice') for _ in range(5)] == [True, True, True, False, False]
+    # Otra clave tiene su propio contador
+    assert limiter.hit(item, 'svc', 'bob')
+
+
+def test_storage_is_registered_for_sqlite_uri(uri):
+    assert isinstance(storage_from_string(uri), SQLiteStorage)
+
+
+@pytest.mark.parametrize('strategy', sorted(STRATEGIES))
+def test_limit_is_shared_between_processes(uri, strategy):
+    # Dos instancias sobre el mismo archivo = dos workers
+    first = STRATEGIES[strategy](SQLiteStorage(uri, batch_ms=0))
+    second = STRATEGIES[strategy](SQLiteStorage(uri, batch_ms=0))
+    item = parse('4 per minute')
+    assert all(first.hit(item, 'svc', 'alice') for _ in range(2))
+    assert all(second.hit(item, 'svc', 'alice') for _ in range(2))
+    assert not first.hit(item, 'svc', 'alice')
+    assert not second.hit(item, 'svc', 'alice')
+
+
+def test_fixed_window_batch_is_visible_after_flush(uri):
+    batched = SQLiteStorage(uri, batch_ms=60000)
+    other = SQLiteStorage(uri, batch_ms=0)
+    for _ in range(3):
+        batched.incr('k', 60)
+    assert batched.get('k') == 3
+    # El primer incremento se escribe al momento; el resto queda en memoria
+    assert other.get('k') == 1
+    batched.flush()
+    assert other.get('k') == 3
+
+
+def test_fixed_window_resets_after_expiry(uri):
+    storage = SQLiteStorage(uri, batch_ms=0)
+    assert storage.incr('k', 0.2) == 1
+    assert storage.incr('k', 0.2) == 2
+    time.sleep(0.25)
+    assert storage.incr('k', 0.2) == 1
+
+
+def test_moving_window_batch_syncs_before_rejecting(uri):
+    batched = SQLiteStorage(uri, batch_ms=60000)
+    other = SQLiteStorage(uri, batch_ms=0)
+    assert other.acquire_entry('k', 3, 60)
+    # La instancia con lotes no conoce aún la entrada de la otra, pero al llegar
+    # al límite según su cuenta local consulta SQLite antes de rechazar
+    assert batched.acquire_entry('k', 3, 60)
+    assert batched.acquire_entry('k', 3, 60)
+    assert not batched.acquire_entry('k', 3, 60)
+    assert other.get_moving_window('k', 3, 60)[1] == 3
+
+
+def test_moving_window_includes_pending_entries(uri):
+    batched = SQLiteStorage(uri, batch_ms=60000)
+    for _ in range(3):
+        assert batched.acquire_entry('k', 10, 60)
+    assert batched.get_moving_window('k', 10, 60)[1] == 3
+    other = SQLiteStorage(uri, batch_ms=0)
+    assert other.get_moving_window('k', 10, 60)[1] == 1
+    batched.flush()
+    assert other.get_moving_window('k', 10, 60)[1] == 3
+
+
+def test_moving_window_slides(uri):
+    storage = SQLiteStorage(uri, batch_ms=0)
+    assert storage.acquire_entry('k', 2, 0.2)
+    assert storage.acquire_entry('k', 2, 0.2)
+    assert not storage.acquire_entry('k', 2, 0.2)
+    time.sleep(0.25)
+    assert storage.acquire_entry('k', 2, 0.2)
+
+
+def test_amount_above_limit_is_rejected(uri):
+    storage = SQLiteStorage(uri, batch_ms=0)
+    assert not storage.acquire_entry('k', 2, 60, amount=3)
+    assert storage.acquire_entry('k', 2, 60, amount=2)
+
+
+def test_clear_and_reset(uri):
+    storage = SQLiteStorage(uri, batch_ms=50)
+    storage.incr('a', 60)
+    storage.acquire_entry('b', 5, 60)
+    storage.clear('a')
+    assert storage.get('a') == 0
+    assert storage.get_moving_window('b', 5, 60)[1] == 1
+    storage.reset()
+    assert storage.get_moving_window('b', 5, 60)[1] == 0
@@ -0,0 +1,56 @@
+import pytest
+
+from registry import RouteTrie, Service
+
+
+@pytest.fixture
+def trie():
+    return RouteTrie([
+        {"prefix": "/auth", "endpoint": "auth"},
+        {"prefix": "/tasks", "endpoint": "tasks"},
+        {"prefix": "/logs", "endpoint": "logs"},
+        {"prefix": "/logs/stats/v2", "endpoint": "logs_stats"},
+    ])
+
+
+@pytest.mark.parametrize('path, endpoint', [
+    ('/tasks', 'tasks'),
+    ('/tasks/', 'tasks'),
+    ('/tasks/42/comments', 'tasks'),
+    ('tasks', 'tasks'),
+    ('/logs/total', 'logs'),
+    ('/logs/stats', 'logs'),
+    ('/logs/stats/v2/daily', 'logs_stats'),
+])
+def test_longest_prefix_wins(trie, path, endpoint):
+    assert trie.match(path)['endpoint'] == endpoint
+
+
+@pytest.mark.parametrize('path', ['/', '', '/task', '/tasksx', '/users/1', '/authx/login'])
+def test_matches_whole_segments_only(trie, path):
+    assert trie.match(path) is None
+
+
+def test_root_prefix_is_the_fallback(trie):
+    trie.insert('/', {"endpoint": "root"})
+    assert trie.match('/unknown')['endpoint'] == 'root'
+    assert trie.match('/tasks/1')['endpoint'] == 'tasks'
+
+
+def test_round_robin_alternates():
+    service = Service('svc', ['http://a', 'http://b'], 'round_robin')
+    urls = []
+    for _ in range(4):
+        instance = service.acquire()
+        urls.append(instance.url)
+        service.release(instance, failed=False)
+    assert urls == ['http://a', 'http://b', 'http://a', 'http://b']
+
+
+def test_failing_instance_is_ejected():
+    service = Service('svc', ['http://a', 'http://b'], 'round_robin', max_failures=2, eject_seconds=60)
+    for _ in range(4):
+        instance = service.acquire()
+        service.release(instance, failed=instance.url == 'http://a')
+    assert service.stats()['instances'][0]['healthy'] is False
+    assert {service.acquire().url for _ in range(4)} == {'http://b'}
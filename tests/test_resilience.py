@@ -0,0 +1,109 @@
+import time
+
+import pytest
+
+from resilience import CircuitBreaker, CircuitOpenError, RetryBudget
+
+OPEN_SECONDS = 0.05
+
+
+@pytest.fixture
+def breaker():
+    return CircuitBreaker('svc', window=4, min_calls=4, failure_rate=0.5, slow_call_ms=100,
+                          slow_rate=0.75, open_seconds=OPEN_SECONDS, half_open_calls=1, max_in_flight=3)
+
+
+def call(breaker, failed=False, duration_ms=1):
+    probe = breaker.before_call()
+    breaker.after_call(failed, duration_ms, probe)
+    return probe
+
+
+def trip(breaker):
+    for _ in range(4):
+        call(breaker, failed=True)
+    assert breaker.stats()['state'] == 'open'
+
+
+def test_stays_closed_below_failure_rate(breaker):
+    for failed in (True, False, False, False, True, False):
+        call(breaker, failed=failed)
+    assert breaker.stats()['state'] == 'closed'
+
+
+def test_needs_min_calls_before_opening(breaker):
+    for _ in range(3):
+        call(breaker, failed=True)
+    assert breaker.stats()['state'] == 'closed'
+
+
+def test_opens_on_failures_and_rejects(breaker):
+    trip(breaker)
+    with pytest.raises(CircuitOpenError) as e:
+        breaker.before_call()
+    assert e.value.reason == 'circuito abierto'
+    assert 0 < e.value.retry_after <= OPEN_SECONDS
+    assert breaker.stats()['rejected'] == 1
+
+
+def test_opens_on_slow_calls(breaker):
+    for _ in range(4):
+        call(breaker, duration_ms=500)
+    assert breaker.stats()['state'] == 'open'
+
+
+def test_half_open_allows_one_probe(breaker):
+    trip(breaker)
+    time.sleep(OPEN_SECONDS)
+    probe = breaker.before_call()
+    assert probe is not None
+    assert breaker.stats()['state'] == 'half_open'
+    with pytest.raises(CircuitOpenError) as e:
+        breaker.before_call()
+    assert e.value.reason == 'circuito en prueba'
+    breaker.after_call(False, 1, probe)
+    assert breaker.stats()['state'] == 'closed'
+
+
+def test_failed_probe_opens_again(breaker):
+    trip(breaker)
+    time.sleep(OPEN_SECONDS)
+    call(breaker, failed=True)
+    assert breaker.stats()['state'] == 'open'
+    assert breaker.stats()['times_opened'] == 2
+
+
+def test_call_admitted_while_closed_is_not_a_probe(breaker):
+    old = breaker.before_call()
+    assert old is None
+    for _ in range(4):
+        call(breaker, failed=True)
+    time.sleep(OPEN_SECONDS)
+    probe = breaker.before_call()
+    # La llamada antigua termina durante la prueba: ni libera el hueco ni cierra el circuito
+    breaker.after_call(False, 1, old)
+    assert breaker.stats()['state'] == 'half_open'
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.after_call(False, 1, probe)
+    assert breaker.stats()['state'] == 'closed'
+
+
+def test_rejects_above_max_in_flight(breaker):
+    probes = [breaker.before_call() for _ in range(3)]
+    with pytest.raises(CircuitOpenError) as e:
+        breaker.before_call()
+    assert e.value.reason == 'demasiadas peticiones en curso'
+    for probe in probes:
+        breaker.after_call(False, 1, probe)
+    assert breaker.stats()['in_flight'] == 0
+
+
+def test_retry_budget_limits_retries():
+    budget = RetryBudget(ratio=0.1, min_per_second=0, window=10)
+    for _ in range(20):
+        budget.record_request()
+    assert budget.try_retry()
+    assert budget.try_retry()
+    assert not budget.try_retry()
+    assert budget.stats()['denied'] == 1
@@ -0,0 +1,91 @@
+import subprocess
+import sys
+
+import response_cache
+from conftest import BASE_DIR
+from response_cache import ResponseCache, SharedGenerations, body_etag
+
+HEADERS = [('Content-Type', 'application/json')]
+
+
+def test_put_and_get():
+    cache = ResponseCache()
+    generation = cache.generation('tasks')
+    entry = cache.put('k', 'tasks', generation, 200, HEADERS, b'[1]', ttl=60)
+    assert entry.etag == body_etag(b'[1]')
+    assert cache.get('k').body == b'[1]'
+    assert cache.stats()['hits'] == 1
+
+
+def test_upstream_etag_is_kept():
+    cache = ResponseCache()
+    entry = cache.put('k', 'tasks', 0, 200, HEADERS + [('ETag', '"v1"')], b'[]', ttl=60)
+    assert entry.etag == '"v1"'
+    # La cabecera se vuelve a poner al responder, no se guarda duplicada
+    assert all(name.lower() != 'etag' for name, _ in entry.headers)
+
+
+def test_expired_entry_is_a_miss():
+    cache = ResponseCache()
+    cache.put('k', 'tasks', 0, 200, HEADERS, b'[]', ttl=0)
+    assert cache.get('k') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_invalidate_removes_only_its_namespace():
+    cache = ResponseCache()
+    cache.put('t', 'tasks', 0, 200, HEADERS, b'[]', ttl=60)
+    cache.put('u', 'users', 0, 200, HEADERS, b'{}', ttl=60)
+    cache.invalidate('tasks')
+    assert cache.get('t') is None
+    assert cache.get('u') is not None
+    assert cache.stats()['bytes'] == 2
+
+
+def test_response_read_before_invalidation_is_not_stored():
+    cache = ResponseCache()
+    generation = cache.generation('tasks')
+    # Una escritura termina mientras la lectura estaba en vuelo
+    cache.invalidate('tasks')
+    entry = cache.put('k', 'tasks', generation, 200, HEADERS, b'[old]', ttl=60)
+    assert entry.body == b'[old]'
+    assert cache.get('k') is None
+    cache.put('k', 'tasks', cache.generation('tasks'), 200, HEADERS, b'[new]', ttl=60)
+    assert cache.get('k').body == b'[new]'
+
+
+def test_evicts_least_recently_used_by_size():
+    cache = ResponseCache(max_bytes=10, max_entry_bytes=10)
+    cache.put('a', 'ns', 0, 200, HEADERS, b'aaaa', ttl=60)
+    cache.put('b', 'ns', 0, 200, HEADERS, b'bbbb', ttl=60)
+    cache.get('a')
+    cache.put('c', 'ns', 0, 200, HEADERS, b'cccc', ttl=60)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_oversized_entry_is_not_stored():
+    cache = ResponseCache(max_bytes=100, max_entry_bytes=4)
+    entry = cache.put('k', 'ns', 0, 200, HEADERS, b'12345', ttl=60)
+    assert entry.body == b'12345'
+    assert cache.get('k') is None
+
+
+def test_invalidation_in_another_process_is_seen(tmp_path):
+    uri = f"sqlite:///{tmp_path / 'generations.db'}"
+    cache = ResponseCache(generations=SharedGenerations(uri))
+    cache.put('k', 'tasks', cache.generation('tasks'), 200, HEADERS, b'[]', ttl=60)
+    assert cache.get('k') is not None
+    # Otro worker atiende la escritura
+    script = ('import sys; sys.path[:0] = [sys.argv[1], sys.argv[1] + "/api_gateway"]; '
+              'from response_cache import SharedGenerations; SharedGenerations(sys.argv[2]).bump("tasks")')
+    subprocess.run([sys.executable, '-c', script, BASE_DIR, uri], check=True)
+    assert cache.get('k') is None
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_memory_generations_disable_the_cache_with_several_workers(monkeypatch, tmp_path):
+    monkeypatch.setattr(response_cache, 'MULTIPLE_WORKERS', True)
+    assert not ResponseCache(generations=SharedGenerations('memory://')).enabled
+    assert ResponseCache(generations=SharedGenerations(f"sqlite:///{tmp_path / 'g.db'}")).enabled
@@ -0,0 +1,130 @@
+import random
+import struct
+import threading
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+from bson import ObjectId
+
+import rollups as rollups_module
+from rollups import LogRollups
+
+PATHS = ('/tasks', '/users', '/auth/login')
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().logs_db
+
+
+@pytest.fixture
+def rollups(db, monkeypatch):
+    monkeypatch.setattr(rollups_module, 'ROLLUP_READ_BACKOFF', 0)
+    return LogRollups(db.logs, db.rollups, db.rollup_state)
+
+
+def insert_logs(db, count, first=0, seed=0):
+    """Logs de hace dos horas (fuera del margen ROLLUP_LAG_SECONDS) con _id crecientes"""
+    rng = random.Random(seed)
+    base = datetime.utcnow().replace(microsecond=0) - timedelta(hours=2)
+    documents = []
+    for n in range(first, first + count):
+        moment = base + timedelta(seconds=n)
+        documents.append({
+            "_id": ObjectId(struct.pack('>I', int(moment.timestamp())) + n.to_bytes(8, 'big')),
+            "timestamp": moment,
+            "service": "gateway",
+            "path": rng.choice(PATHS),
+            "status": rng.choice((200, 200, 404, 500)),
+            "duration_ms": rng.choice((rng.uniform(1, 500), 'n/a')),
+        })
+    db.logs.insert_many(documents)
+
+
+def counts(totals):
+    return {key: stats["count"] for key, stats in totals.items()}
+
+
+def test_reads_aggregate_logs_until_something_is_folded(db, rollups, monkeypatch):
+    insert_logs(db, 50)
+    def no_tail(*args, **kwargs):
+        raise AssertionError('sin marca de agua no se recorren los logs en Python')
+    monkeypatch.setattr(rollups, '_tail', no_tail)
+    assert counts(rollups.totals())[None] == 50
+    assert rollups.histograms()[None].count == db.logs.count_documents({"duration_ms": {"$type": "number"}})
+
+
+def test_folded_buckets_match_direct_aggregation(db, rollups):
+    insert_logs(db, 300)
+    expected = rollups.totals(group_by='path')
+    expected_hist = rollups.histograms(group_by='status')
+    assert rollups.refresh(force=True) == 300
+    assert rollups.watermark() is not None
+    folded = rollups.totals(group_by='path')
+    assert counts(folded) == counts(expected)
+    for path in PATHS:
+        assert folded[path]["sum_ms"] == pytest.approx(expected[path]["sum_ms"])
+        assert folded[path]["max_ms"] == expected[path]["max_ms"]
+    assert {k: v.counts for k, v in rollups.histograms(group_by='status').items()} == \
+        {k: v.counts for k, v in expected_hist.items()}
+
+
+def test_repeated_batch_is_not_counted_twice(db, rollups, monkeypatch):
+    insert_logs(db, 100)
+    apply = rollups._apply
+    def crash_after_apply(buckets, end):
+        apply(buckets, end)
+        raise RuntimeError('caída antes de guardar la marca de agua')
+    monkeypatch.setattr(rollups, '_apply', crash_after_apply)
+    with pytest.raises(RuntimeError):
+        rollups.refresh(force=True)
+
+    monkeypatch.setattr(rollups, '_apply', apply)
+    rollups.refresh(force=True)
+    assert sum(doc["count"] for doc in db.rollups.find({"granularity": "hour"})) == 100
+    assert counts(rollups.totals())[None] == 100
+
+
+def test_read_during_a_fold_does_not_double_count(db, rollups, monkeypatch):
+    monkeypatch.setattr(rollups_module, 'ROLLUP_READ_ATTEMPTS', 2)
+    insert_logs(db, 100)
+    rollups.refresh(force=True)
+    insert_logs(db, 100, first=100)
+
+    # El lote ya está en los buckets pero la marca de agua todavía no avanzó
+    applied, resume = threading.Event(), threading.Event()
+    apply = rollups._apply
+    def slow_apply(buckets, end):
+        apply(buckets, end)
+        applied.set()
+        resume.wait(5)
+    monkeypatch.setattr(rollups, '_apply', slow_apply)
+    fold = threading.Thread(target=rollups.refresh, kwargs={'force': True})
+    fold.start()
+    assert applied.wait(5)
+    try:
+        assert counts(rollups.totals())[None] == 200
+        assert rollups.histograms()[None].count == db.logs.count_documents({"duration_ms": {"$type": "number"}})
+    finally:
+        resume.set()
+        fold.join()
+    assert counts(rollups.totals())[None] == 200
+    assert rollups.watermark() == max(doc["_id"] for doc in db.logs.find())
+
+
+def test_fold_finishing_during_the_read_is_not_counted_twice(db, rollups, monkeypatch):
+    monkeypatch.setattr(rollups_module, 'ROLLUP_READ_ATTEMPTS', 1)
+    insert_logs(db, 100)
+    rollups.refresh(force=True)
+    insert_logs(db, 100, first=100)
+
+    # Otro proceso consolida el resto entre la lectura del estado y la de los buckets
+    aggregate = rollups.rollups.aggregate
+    other = LogRollups(db.logs, db.rollups, db.rollup_state)
+    def aggregate_after_fold(*args, **kwargs):
+        other.refresh(force=True)
+        return aggregate(*args, **kwargs)
+    monkeypatch.setattr(rollups.rollups, 'aggregate', aggregate_after_fold)
+    assert counts(rollups.totals())[None] == 200
+    assert rollups.watermark() == max(doc["_id"] for doc in db.logs.find())
@@ -0,0 +1,59 @@
+import math
+import random
+
+import pytest
+
+from sketch import DEFAULT_QUANTILES, SKETCH_RELATIVE_ACCURACY, LatencySketch, bucket_bounds, bucket_key, quantile_label
+
+
+def exact_quantile(values, q):
+    # Mismo rango que LatencySketch.quantile: el elemento floor(q * (n - 1))
+    ordered = sorted(values)
+    return ordered[math.floor(q * (len(ordered) - 1))]
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_quantiles_within_relative_accuracy(seed):
+    rng = random.Random(seed)
+    # Latencias con cola larga: de décimas de ms a varios segundos
+    values = [rng.lognormvariate(3, 1.5) + 0.05 for _ in range(20000)]
+    sketch = LatencySketch()
+    for value in values:
+        sketch.add(value)
+    for q in DEFAULT_QUANTILES:
+        exact = exact_quantile(values, q)
+        assert abs(sketch.quantile(q) - exact) / exact <= SKETCH_RELATIVE_ACCURACY + 1e-9
+
+
+def test_value_falls_inside_its_bucket():
+    for value in (0.02, 0.5, 1, 7.3, 250, 12345.6):
+        lower, upper = bucket_bounds(bucket_key(value))
+        assert lower < value <= upper * (1 + 1e-12)
+
+
+def test_merge_equals_adding_everything():
+    rng = random.Random(7)
+    a_values = [rng.uniform(1, 100) for _ in range(500)]
+    b_values = [rng.uniform(50, 500) for _ in range(500)]
+    a, b, both = LatencySketch(), LatencySketch(), LatencySketch()
+    for value in a_values:
+        a.add(value)
+        both.add(value)
+    for value in b_values:
+        b.add(value)
+        both.add(value)
+    assert a.merge(b).counts == both.counts
+    # Los conteos guardados (hist.<idx> en Mongo) reconstruyen el mismo sketch
+    assert LatencySketch(both.counts).quantiles() == both.quantiles()
+
+
+def test_empty_sketch_has_no_quantiles():
+    assert LatencySketch().quantile(0.5) is None
+
+
+def test_tiny_and_negative_values_share_the_first_bucket():
+    assert bucket_key(0) == bucket_key(-5) == bucket_key(0.001)
+
+
+def test_quantile_labels():
+    assert [quantile_label(q) for q in DEFAULT_QUANTILES] == ['p50', 'p90', 'p95', 'p99', 'p999']
@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+from common.storage import Database
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / 'store.db')
+    Database(path).execute('CREATE TABLE item (id INTEGER PRIMARY KEY, name TEXT)')
+    return path
+
+
+def test_connections_use_wal_and_are_reused(path):
+    db = Database(path, pool_size=2)
+    assert db.query_one('PRAGMA journal_mode')[0] == 'wal'
+    for i in range(20):
+        db.execute('INSERT INTO item (name) VALUES (?)', (f'item{i}',))
+    assert db.query_one('SELECT COUNT(*) FROM item')[0] == 20
+    assert db.stats()['connections_created'] == 1
+    assert db.stats()['queries']['INSERT']['count'] == 20
+
+
+def test_transaction_rolls_back_on_error(path):
+    db = Database(path)
+    with pytest.raises(RuntimeError):
+        with db.transaction() as tx:
+            tx.execute('INSERT INTO item (name) VALUES (?)', ('perdido',))
+            raise RuntimeError('fallo')
+    assert db.query_one('SELECT COUNT(*) FROM item')[0] == 0
+    # La conexión vuelve al pool sin transacción abierta
+    db.execute('INSERT INTO item (name) VALUES (?)', ('ok',))
+    assert db.query_one('SELECT COUNT(*) FROM item')[0] == 1
+
+
+def test_busy_writer_is_retried(path):
+    holder = Database(path)
+    writer = Database(path, busy_timeout_ms=0, max_retries=10)
+    locked = threading.Event()
+
+    def hold_write_lock():
+        with holder.transaction() as tx:
+            tx.execute('INSERT INTO item (name) VALUES (?)', ('primero',))
+            locked.set()
+            time.sleep(0.1)
+
+    thread = threading.Thread(target=hold_write_lock)
+    thread.start()
+    locked.wait()
+    writer.execute('INSERT INTO item (name) VALUES (?)', ('segundo',))
+    thread.join()
+    assert writer.stats()['busy_retries'] > 0
+    assert writer.query_one('SELECT COUNT(*) FROM item')[0] == 2
+
+
+def test_busy_error_after_max_retries(path):
+    holder = Database(path)
+    writer = Database(path, busy_timeout_ms=0, max_retries=0)
+    with holder.transaction():
+        with pytest.raises(Exception, match='locked'):
+            writer.execute('INSERT INTO item (name) VALUES (?)', ('x',))
+    assert writer.stats()['busy_errors'] == 1
+
+
+def test_pool_is_not_shared_after_fork(path):
+    db = Database(path)
+    db.query_one('SELECT 1')
+    assert db.stats()['idle_connections'] == 1
+    db._pid = -1    # como en un worker recién creado con fork
+    db.query_one('SELECT 1')
+    assert db.stats()['connections_created'] == 2
@@ -0,0 +1,217 @@
+import hashlib
+import hmac
+import time
+
+import jwt
+import pytest
+
+from conftest import load_service_app
+
+SECRET_KEY = 'test-secret'
+
+
+@pytest.fixture(scope='module')
+def task_app(tmp_path_factory):
+    db_file = tmp_path_factory.mktemp('task-service') / 'tasks.db'
+    module = load_service_app('task_service', 'task_app', TASK_DB_FILE=str(db_file))
+    module.app.config['TESTING'] = True
+    return module
+
+
+@pytest.fixture
+def client(task_app):
+    return task_app.app.test_client()
+
+
+def bearer(username, exp_in=3600):
+    token = jwt.encode({'username': username, 'user_id': 1, 'exp': int(time.time()) + exp_in},
+                       SECRET_KEY, algorithm='HS256')
+    return {'Authorization': f'Bearer {token}'}
+
+
+def gateway_headers(username, exp, user_id='1', key=SECRET_KEY):
+    message = f"{username}|{user_id}|{exp}".encode()
+    return {
+        'X-Gateway-User': username,
+        'X-Gateway-User-Id': user_id,
+        'X-Gateway-Token-Exp': exp,
+        'X-Gateway-Signature': hmac.new(key.encode(), message, hashlib.sha256).hexdigest(),
+    }
+
+
+# ===== Identidad firmada por el gateway =====
+
+def test_signed_identity_is_trusted(client):
+    response = client.get('/tasks', headers=gateway_headers('ana', str(time.time() + 60)))
+    assert response.status_code == 200
+
+
+def test_bad_signature_falls_back_to_jwt(client):
+    headers = gateway_headers('ana', str(time.time() + 60), key='otra-clave')
+    assert client.get('/tasks', headers=headers).status_code == 401
+    headers.update(bearer('ana'))
+    assert client.get('/tasks', headers=headers).status_code == 200
+
+
+@pytest.mark.parametrize('exp', ['', 'nunca'])
+def test_identity_without_exp_is_ignored(client, exp):
+    headers = gateway_headers('ana', exp)
+    assert client.get('/tasks', headers=headers).status_code == 401
+    headers.update(bearer('ana'))
+    assert client.get('/tasks', headers=headers).status_code == 200
+
+
+def test_expired_identity_is_rejected(client):
+    headers = gateway_headers('ana', str(time.time() - 1))
+    assert client.get('/tasks', headers=headers).status_code == 401
+
+
+# ===== Listado paginado por cursor =====
+
+def test_tasks_are_listed_page_by_page(client):
+    headers = bearer('paginado')
+    for i in range(5):
+        status = 'done' if i % 2 else 'pending'
+        client.post('/tasks', headers=headers, json={'description': f'tarea {i}', 'status': status})
+
+    seen, cursor = [], None
+    while True:
+        response = client.get('/tasks', headers=headers, query_string={'limit': 2, **({'cursor': cursor} if cursor else {})})
+        seen += [task['description'] for task in response.get_json()]
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+    assert seen == [f'tarea {i}' for i in range(5)]
+
+    done = client.get('/tasks', headers=headers, query_string={'status': 'done'}).get_json()
+    assert [task['description'] for task in done] == ['tarea 1', 'tarea 3']
+    # Solo las tareas del usuario
+    assert client.get('/tasks', headers=bearer('otro')).get_json() == []
+
+
+# ===== Operaciones en lote =====
+
+def test_bulk_create_reports_each_item(client):
+    headers = bearer('lote')
+    response = client.post('/tasks/bulk', headers=headers, json={'tasks': [
+        {'description': 'a'}, {'deadline': '2030-01-01'}, {'description': 'b', 'isalive': 'sí'},
+    ]})
+    assert response.status_code == 207
+    body = response.get_json()
+    assert [r['status'] for r in body['results']] == ['created', 'error', 'error']
+    assert body['succeeded'] == 1
+    task_id = body['results'][0]['id']
+    assert client.get(f'/tasks/{task_id}').get_json()['description'] == 'a'
+
+
+def test_bulk_update_rejects_boolean_and_foreign_ids(client):
+    headers = bearer('lote-update')
+    created = client.post('/tasks/bulk', headers=headers, json={'tasks': [{'description': 'x'}]}).get_json()
+    task_id = created['results'][0]['id']
+    other = client.post('/tasks/bulk', headers=bearer('ajeno'), json={'tasks': [{'description': 'y'}]}).get_json()
+    foreign_id = other['results'][0]['id']
+
+    response = client.patch('/tasks/bulk', headers=headers, json={'tasks': [
+        {'id': task_id, 'status': 'done'},
+        {'id': True, 'status': 'done'},
+        {'id': str(task_id), 'status': 'done'},
+        {'id': foreign_id, 'status': 'done'},
+    ]})
+    assert response.status_code == 207
+    results = response.get_json()['results']
+    assert [r['status'] for r in results] == ['updated', 'error', 'error', 'error']
+    assert results[1]['error'] == 'Falta el id de la tarea'
+    assert results[3]['error'] == 'Tarea no encontrada'
+    assert client.get(f'/tasks/{task_id}').get_json()['status'] == 'done'
+    assert client.get(f'/tasks/{foreign_id}').get_json()['status'] == 'pending'
+
+
+def test_bulk_delete_rejects_boolean_ids(client):
+    headers = bearer('lote-delete')
+    created = client.post('/tasks/bulk', headers=headers, json={'tasks': [{'description': 'x'}]}).get_json()
+    task_id = created['results'][0]['id']
+
+    response = client.delete('/tasks/bulk', headers=headers, json={'ids': [task_id, True, 'uno', 10 ** 9]})
+    assert response.status_code == 207
+    results = response.get_json()['results']
+    assert [r['status'] for r in results] == ['deleted', 'error', 'error', 'error']
+    assert [r.get('error') for r in results[1:]] == ['Id inválido', 'Id inválido', 'Tarea no encontrada']
+    assert client.get(f'/tasks/{task_id}').status_code == 404
+
+
+@pytest.mark.parametrize('body, status', [({'ids': []}, 400), ({'ids': 'x'}, 400), ({'ids': [True]}, 400)])
+def test_bulk_delete_invalid_batches(client, body, status):
+    assert client.delete('/tasks/bulk', headers=bearer('lote-delete'), json=body).status_code == status
+
+
+# ===== Resumen con contadores mantenidos por triggers =====
+
+def summary(client, username, as_of='2026-06-01'):
+    response = client.get(f'/tasks/summary?as_of={as_of}', headers=bearer(username))
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def recount(task_app, username, as_of='2026-06-01'):
+    """Los mismos totales contados directamente sobre la tabla task"""
+    rows = task_app.db.query_all('SELECT status, isalive, deadline FROM task WHERE created_by = ?', (username,))
+    return {
+        "total": len(rows),
+        "alive": sum(1 for _, isalive, _ in rows if isalive),
+        "pending": sum(1 for status, _, _ in rows if status == 'pending'),
+        "done": sum(1 for status, _, _ in rows if status == 'done'),
+        "overdue": sum(1 for status, isalive, deadline in rows
+                       if deadline and deadline < as_of and status != 'done' and isalive),
+    }
+
+
+def test_summary_follows_every_kind_of_write(task_app, client):
+    headers = bearer('resumen')
+    first = client.post('/tasks', headers=headers, json={'description': 'a', 'deadline': '2026-01-01'})
+    task_id = first.get_json()['id']
+    created = client.post('/tasks/bulk', headers=headers, json={'tasks': [
+        {'description': 'b', 'deadline': '2026-02-01'},
+        {'description': 'c', 'deadline': '2027-01-01'},
+        {'description': 'd', 'status': 'done', 'deadline': '2026-01-01'},
+    ]}).get_json()
+    ids = [r['id'] for r in created['results']]
+    assert summary(client, 'resumen')['overdue'] == 2
+
+    client.put(f'/tasks/{task_id}', json={'status': 'done'})
+    client.patch('/tasks/bulk', headers=headers, json={'tasks': [{'id': ids[0], 'isalive': False}]})
+    client.delete(f'/tasks/{ids[1]}')
+    # Otro usuario no cambia los contadores
+    client.post('/tasks', headers=bearer('resumen-otro'), json={'description': 'x', 'deadline': '2026-01-01'})
+
+    body = summary(client, 'resumen')
+    assert {name: body[name] for name in ('total', 'alive', 'pending', 'done', 'overdue')} == \
+        {"total": 3, "alive": 2, "pending": 1, "done": 2, "overdue": 0}
+    assert body['by_status'] == {"pending": {"total": 1, "alive": 0}, "done": {"total": 2, "alive": 2}}
+    assert {name: body[name] for name in ('total', 'alive', 'pending', 'done', 'overdue')} == \
+        recount(task_app, 'resumen')
+
+    client.delete('/tasks/bulk', headers=headers, json={'ids': [task_id, ids[0], ids[2]]})
+    assert summary(client, 'resumen')['total'] == 0
+    assert summary(client, 'resumen')['by_status'] == {}
+
+
+def test_summary_is_rebuilt_from_existing_tasks(task_app, client):
+    headers = bearer('resumen-previo')
+    client.post('/tasks/bulk', headers=headers, json={'tasks': [
+        {'description': 'a'}, {'description': 'b', 'status': 'done'}, {'description': 'c', 'isalive': False},
+    ]})
+    # Base anterior a los contadores: sin triggers ni tabla de resumen
+    with task_app.db.transaction() as tx:
+        for trigger in ('insert', 'update', 'delete'):
+            tx.execute(f'DROP TRIGGER task_summary_{trigger}')
+        tx.execute('DROP TABLE task_summary')
+        task_app.init_summary(tx)
+    body = summary(client, 'resumen-previo')
+    assert {name: body[name] for name in ('total', 'alive', 'pending', 'done', 'overdue')} == \
+        recount(task_app, 'resumen-previo')
+    assert body['total'] == 3 and body['alive'] == 2
+
+
+def test_summary_rejects_an_invalid_date(client):
+    response = client.get('/tasks/summary?as_of=mañana', headers=bearer('resumen'))
+    assert response.status_code == 400
@@ -1,65 +1,117 @@
 from flask import Flask, request, jsonify
-import sqlite3
-from flask_limiter import Limiter
+import os
+import sys
 from flask_limiter.util import get_remote_address
 
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+from common.storage import Database
+from common.pagination import page_params, split_page, NEXT_CURSOR_HEADER
+from common.ratelimit import create_limiter
+from common import metrics
+from common.server import register_health, require_resources, run
+from common.lazy import LazyResource
+
 app = Flask(__name__)
-DB_FILE = 'users.db'
+DB_FILE = os.getenv('USER_DB_FILE', 'users.db')
+db = Database(DB_FILE)
 
 # Inicializar rate limiter
-limiter = Limiter(
+limiter = create_limiter(
+    app,
     get_remote_address,
-    app=app,
-    default_limits=["200 per day", "50 per hour"]
+    default_limits=["200 per day", "50 per hour"],
+    key_prefix='user-service'
 )
+# Métricas Prometheus en /metrics y profiler en /debug/profile
+metrics.init_app(app, 'user-service', limiter)
 
 # Inicializar DB y crear tabla si no existe
 def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            email TEXT NOT NULL UNIQUE,
-            password TEXT NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-init_db()
-
-# Ruta: Listar todos los usuarios
+    with db.transaction() as tx:
+        tx.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL,
+                email TEXT NOT NULL UNIQUE,
+                password TEXT NOT NULL
+            )
+        ''')
+        # email ya tiene índice por UNIQUE; username se busca en el login
+        tx.execute('CREATE INDEX IF NOT EXISTS idx_users_username ON users (username)')
+
+# El esquema se crea en la primera petición (y se reintenta si falla), no al importar
+schema = LazyResource('user-schema', init_db)
+require_resources(app, schema)
+
+def row_to_user(row):
+    return {
+        "id": row[0],
+        "username": row[1],
+        "email": row[2],
+        "password": row[3]
+    }
+
+# Ruta: Listar usuarios paginados por cursor (?limit=&cursor=&username=&email=)
 @app.route('/users', methods=['GET'])
 @limiter.limit("10 per minute")
 def get_users():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM users')
-    rows = cursor.fetchall()
-    conn.close()
-
-    users = []
-    for row in rows:
-        users.append({
-            "id": row[0],
-            "username": row[1],
-            "email": row[2],
-            "password": row[3]  
-        })
-
-    return jsonify({"users": users})
+    try:
+        limit, after_id = page_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conditions = ['id > ?']
+    params = [after_id]
+    for field in ('username', 'email'):
+        if request.args.get(field) is not None:
+            conditions.append(f'{field} = ?')
+            params.append(request.args[field])
+    params.append(limit + 1)
+
+    rows = db.query_all(f'''
+        SELECT id, username, email, password FROM users
+        WHERE {' AND '.join(conditions)}
+        ORDER BY id
+        LIMIT ?
+    ''', params)
+    rows, next_cursor = split_page(rows, limit)
+
+    response = jsonify({"users": [row_to_user(row) for row in rows], "next_cursor": next_cursor})
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
+
+# Ruta: Buscar usuarios por email, username o identificador (email o username)
+# Usa los índices de email y username en vez de recorrer toda la tabla
+@app.route('/users/lookup', methods=['GET'])
+@limiter.limit("300 per minute")  # Todas las consultas llegan desde el Auth Service
+def lookup_users():
+    email = request.args.get('email')
+    username = request.args.get('username')
+    identifier = request.args.get('identifier')
+
+    if identifier is not None:
+        rows = db.query_all('''
+            SELECT id, username, email, password FROM users WHERE email = ?
+            UNION
+            SELECT id, username, email, password FROM users WHERE username = ?
+        ''', (identifier, identifier))
+    elif email is not None:
+        rows = db.query_all('SELECT id, username, email, password FROM users WHERE email = ?', (email,))
+    elif username is not None:
+        rows = db.query_all('SELECT id, username, email, password FROM users WHERE username = ?', (username,))
+    else:
+        return jsonify({"error": "Se requiere email, username o identifier"}), 400
+
+    return jsonify({"users": [row_to_user(row) for row in rows]})
 
 # Ruta: Obtener un usuario por ID
 @app.route('/users/<int:user_id>', methods=['GET'])
 @limiter.limit("10 per minute")
 def get_user(user_id):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
-    row = cursor.fetchone()
-    conn.close()
+    row = db.query_one('SELECT * FROM users WHERE id = ?', (user_id,))
 
     if row:
         user = {
@@ -80,15 +132,11 @@ def create_user():
     if not data or 'username' not in data or 'email' not in data or 'password' not in data:
         return jsonify({"error": "username, email y password requeridos"}), 400
 
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
+    cursor = db.execute('''
         INSERT INTO users (username, email, password)
         VALUES (?, ?, ?)
     ''', (data['username'], data['email'], data['password']))
-    conn.commit()
     user_id = cursor.lastrowid
-    conn.close()
 
     return jsonify({
         "message": "Usuario creado",
@@ -106,14 +154,7 @@ def create_user():
 def update_user(user_id):
     data = request.get_json()
 
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
-    if not cursor.fetchone():
-        conn.close()
-        return jsonify({"error": "Usuario no encontrado"}), 404
-
-    cursor.execute('''
+    cursor = db.execute('''
         UPDATE users SET
             username = COALESCE(?, username),
             email = COALESCE(?, email),
@@ -125,8 +166,8 @@ def update_user(user_id):
         data.get('password'),
         user_id
     ))
-    conn.commit()
-    conn.close()
+    if cursor.rowcount == 0:
+        return jsonify({"error": "Usuario no encontrado"}), 404
 
     return jsonify({"message": "Usuario actualizado"}), 200
 
@@ -134,17 +175,22 @@ def update_user(user_id):
 @app.route('/users/<int:user_id>', methods=['DELETE'])
 @limiter.limit("5 per minute")
 def delete_user(user_id):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM users WHERE id = ?', (user_id,))
-    conn.commit()
+    cursor = db.execute('DELETE FROM users WHERE id = ?', (user_id,))
     deleted = cursor.rowcount
-    conn.close()
 
     if deleted == 0:
         return jsonify({"error": "Usuario no encontrado"}), 404
 
     return jsonify({"message": "Usuario eliminado"}), 200
 
+# Ruta: Estadísticas de la base de datos (consultas y latencias)
+@app.route('/storage/stats', methods=['GET'])
+@metrics.internal_endpoint(limiter)
+def storage_stats():
+    return jsonify(db.stats())
+
+# Disponibilidad del servicio y de su base de datos (start_services.sh espera a este endpoint)
+register_health(app, limiter, lambda: (schema.get(), db.query_one('SELECT 1')))
+
 if __name__ == '__main__':
-    app.run(port=5002, debug=True)
+    run(app, 5002)